@@ -0,0 +1,126 @@
+# fixtures.py
+# 벤치마크용 합성 MIDI 파일을 만듭니다.
+#
+# 저장소의 example.mid(짧은 피아노/바이올린/드럼 패턴)를 원하는 길이가 될 때까지
+# 반복해 이어 붙입니다. music21로 만들면 몇 시간 길이는 너무 오래 걸리므로 mido로 직접 씁니다.
+# 만든 파일은 benchmarks/fixtures/에 저장되고 다음 실행 때 재사용됩니다.
+#
+# 사용 예:
+#   python benchmarks/fixtures.py --minutes 1 10 60 480
+
+import os
+import argparse
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EXAMPLE_MIDI = os.path.join(ROOT_DIR, 'example.mid')
+FIXTURE_DIR = os.path.join(ROOT_DIR, 'benchmarks', 'fixtures')
+DEFAULT_MINUTES = [1, 10, 60, 480]  # 1분 ~ 8시간
+
+
+def _absolute_events(track):
+    events = []
+    position = 0
+    for message in track:
+        position += message.time
+        events.append((position, message))
+    return events
+
+
+def _pattern_ticks(midi_file, events_by_track):
+    # 패턴 길이 = 마지막 이벤트 위치를 마디(4박) 단위로 올림
+    last = max((position for events in events_by_track for position, _ in events), default=0)
+    bar = midi_file.ticks_per_beat * 4
+    return max(bar, -(-last // bar) * bar)
+
+
+def _bpm(events_by_track):
+    import mido
+
+    for events in events_by_track:
+        for _, message in events:
+            if message.type == 'set_tempo':
+                return mido.tempo2bpm(message.tempo)
+    return 120.0
+
+
+def make_midi_fixture(minutes, source_path=EXAMPLE_MIDI, fixture_dir=FIXTURE_DIR):
+    """
+    source_path의 패턴을 반복해 minutes 분 길이의 MIDI 파일을 만듭니다 (이미 있으면 재사용).
+
+    Returns:
+        dict: path, minutes, notes(note_on 수), bpm
+    """
+    import mido
+
+    source = mido.MidiFile(source_path)
+    events_by_track = [_absolute_events(track) for track in source.tracks]
+    pattern_ticks = _pattern_ticks(source, events_by_track)
+    bpm = _bpm(events_by_track)
+    pattern_minutes = pattern_ticks / source.ticks_per_beat / bpm
+    repeats = max(1, int(round(minutes / pattern_minutes)))
+
+    notes_per_pattern = sum(1 for events in events_by_track for _, message in events
+                            if message.type == 'note_on' and message.velocity > 0)
+    info = {'minutes': minutes, 'notes': notes_per_pattern * repeats, 'bpm': bpm}
+
+    os.makedirs(fixture_dir, exist_ok=True)
+    path = os.path.join(fixture_dir, f"synthetic_{minutes}min.mid")
+    info['path'] = path
+    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(source_path):
+        return info
+
+    output = mido.MidiFile(type=source.type, ticks_per_beat=source.ticks_per_beat)
+    for events in events_by_track:
+        # 템포/악기 같은 메타 정보는 한 번만, 음표 이벤트는 패턴 길이만큼 밀어 가며 반복
+        header = [(position, message) for position, message in events
+                  if (message.is_meta and message.type != 'end_of_track') or message.type == 'program_change']
+        body = [(position, message) for position, message in events
+                if not message.is_meta and message.type != 'program_change']
+        timeline = list(header)
+        for repeat in range(repeats):
+            offset = repeat * pattern_ticks
+            timeline.extend((position + offset, message) for position, message in body)
+
+        track = mido.MidiTrack()
+        previous = 0
+        for position, message in sorted(timeline, key=lambda item: item[0]):
+            track.append(message.copy(time=position - previous))
+            previous = position
+        track.append(mido.MetaMessage('end_of_track', time=max(0, repeats * pattern_ticks - previous)))
+        output.tracks.append(track)
+
+    tmp_path = f"{path}.tmp"
+    output.save(tmp_path)
+    os.replace(tmp_path, path)
+    return info
+
+
+def example_fixture():
+    """
+    원본 example.mid 자체를 가장 작은 fixture로 사용합니다.
+    """
+    import mido
+
+    source = mido.MidiFile(EXAMPLE_MIDI)
+    events_by_track = [_absolute_events(track) for track in source.tracks]
+    notes = sum(1 for events in events_by_track for _, message in events
+                if message.type == 'note_on' and message.velocity > 0)
+    return {'path': EXAMPLE_MIDI, 'minutes': round(source.length / 60.0, 3), 'notes': notes,
+            'bpm': _bpm(events_by_track)}
+
+
+def build_fixtures(minutes_list=DEFAULT_MINUTES):
+    """
+    example.mid와 minutes_list 길이의 fixture 정보 목록을 반환합니다 (작은 것부터).
+    """
+    return [example_fixture()] + [make_midi_fixture(minutes) for minutes in sorted(minutes_list)]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='벤치마크용 합성 MIDI 생성')
+    parser.add_argument('--minutes', nargs='+', type=int, default=DEFAULT_MINUTES)
+    args = parser.parse_args()
+
+    for fixture in build_fixtures(args.minutes):
+        size_kb = os.path.getsize(fixture['path']) / 1024
+        print(f"{os.path.basename(fixture['path'])}: {fixture['minutes']}분, 음표 {fixture['notes']}개, {size_kb:.0f}KB")
@@ -0,0 +1,97 @@
+# model_benchmark.py
+# MusicGen 모델 크기/CPU 추론 정밀도별 로딩 시간, 생성 속도, 품질을 비교합니다.
+#
+# 품질은 같은 시드로 생성한 fp32 결과를 기준으로 로그 스펙트럼 거리와 RMS 차이로 비교합니다.
+# (값이 작을수록 fp32와 가까움)
+#
+# 사용 예:
+#   python benchmarks/model_benchmark.py --sizes small --precisions fp32 int8 --seconds 10
+
+import sys
+import os
+import time
+import argparse
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT_DIR, 'scripts'))
+sys.path.append(os.path.join(ROOT_DIR, 'modules'))
+
+import numpy as np
+
+import utils
+from model_loader import load_musicgen, MODEL_SIZES, PRECISIONS
+
+
+def log_spectrum(audio, n_fft=2048, hop=512):
+    frames = np.lib.stride_tricks.sliding_window_view(audio, n_fft)[::hop]
+    spectrum = np.abs(np.fft.rfft(frames * np.hanning(n_fft), axis=1))
+    return np.log10(spectrum + 1e-6)
+
+
+def compare_to_reference(audio, reference):
+    length = min(len(audio), len(reference))
+    audio, reference = audio[:length], reference[:length]
+    spectral_distance = float(np.mean(np.abs(log_spectrum(audio) - log_spectrum(reference))))
+    rms = float(np.sqrt(np.mean(audio ** 2)))
+    reference_rms = float(np.sqrt(np.mean(reference ** 2)))
+    return {
+        'log_spectral_distance': round(spectral_distance, 4),
+        'rms_db_difference': round(float(20 * np.log10((rms + 1e-9) / (reference_rms + 1e-9))), 2),
+    }
+
+
+def benchmark_mode(model_size, precision, seconds, prompt, seed, cache_dir):
+    import torch
+
+    # 1회차: 캐시 생성(또는 재사용), 2회차: 캐시에서 로딩
+    start = time.time()
+    load_musicgen(model_size, duration=seconds, precision=precision, cache_dir=cache_dir)
+    first_load = time.time() - start
+    start = time.time()
+    model = load_musicgen(model_size, duration=seconds, precision=precision, cache_dir=cache_dir)
+    cached_load = time.time() - start
+
+    torch.manual_seed(seed)
+    start = time.time()
+    wav = model.generate([prompt])
+    generate_seconds = time.time() - start
+
+    audio = wav[0].mean(dim=0).float().cpu().numpy()
+    return {
+        'model_size': model_size,
+        'precision': precision,
+        'first_load_seconds': round(first_load, 2),
+        'cached_load_seconds': round(cached_load, 2),
+        'generate_seconds': round(generate_seconds, 2),
+        'real_time_factor': round(generate_seconds / seconds, 3),
+    }, audio
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='MusicGen 모델/정밀도 비교 벤치마크')
+    parser.add_argument('--sizes', nargs='+', default=MODEL_SIZES, choices=MODEL_SIZES)
+    parser.add_argument('--precisions', nargs='+', default=PRECISIONS, choices=PRECISIONS)
+    parser.add_argument('--seconds', type=int, default=10, help='생성할 오디오 길이(초)')
+    parser.add_argument('--prompt', default='calm ambient piano, slow tempo, soft pads')
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--cache-dir', default=None, help='가중치 캐시 폴더 (기본값: 기본 위치)')
+    parser.add_argument('--output', default=os.path.join(ROOT_DIR, 'benchmarks', 'results',
+                                                         f"model_benchmark_{utils.get_current_timestamp()}.json"))
+    args = parser.parse_args()
+
+    results = []
+    for model_size in args.sizes:
+        reference = None
+        # fp32를 먼저 실행해 품질 비교 기준으로 사용
+        for precision in sorted(args.precisions, key=lambda p: p != 'fp32'):
+            print(f"--- {model_size} / {precision} ---")
+            result, audio = benchmark_mode(model_size, precision, args.seconds, args.prompt, args.seed, args.cache_dir)
+            if precision == 'fp32':
+                reference = audio
+            elif reference is not None:
+                result.update(compare_to_reference(audio, reference))
+            print(result)
+            results.append(result)
+
+    utils.save_json({'seconds': args.seconds, 'prompt': args.prompt, 'seed': args.seed, 'results': results},
+                    args.output)
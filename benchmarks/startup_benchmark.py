@@ -0,0 +1,94 @@
+# startup_benchmark.py
+# GUI 시작 성능 측정: 프로세스 시작 → 첫 화면 그리기(time-to-first-paint),
+# 프로세스 시작 → 백그라운드 모델 로딩 완료(time-to-model-ready).
+#
+# 사용 예:
+#   python benchmarks/startup_benchmark.py --runs 5
+#   python benchmarks/startup_benchmark.py --runs 3 --no-model      (모델 로딩 제외)
+#
+# 디스플레이가 없는 서버에서는 QT_QPA_PLATFORM=offscreen 으로 실행합니다.
+
+import sys
+import os
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_child(start_time, wait_model, model_timeout):
+    """
+    자식 프로세스: GUI를 띄우고 측정값을 JSON 한 줄로 출력합니다.
+    """
+    sys.path.insert(0, ROOT_DIR)
+    import_start = time.time()
+    import sleep_music_generator_gui as gui
+    from PyQt5.QtWidgets import QApplication
+    from PyQt5.QtCore import QObject, QEvent, QTimer
+
+    result = {'import_seconds': round(time.time() - import_start, 3)}
+    app = QApplication(sys.argv)
+
+    class PaintWatcher(QObject):
+        def eventFilter(self, obj, event):
+            if event.type() == QEvent.Paint and 'first_paint_seconds' not in result:
+                result['first_paint_seconds'] = round(time.time() - start_time, 3)
+                if not wait_model:
+                    QTimer.singleShot(0, app.quit)
+            return False
+
+    watcher = PaintWatcher()
+    app.installEventFilter(watcher)
+    window = gui.SleepMusicGenerator(preload_model=wait_model)
+
+    def on_model_ready():
+        result['model_ready_seconds'] = round(time.time() - start_time, 3)
+        app.quit()
+
+    window.model_ready_signal.connect(on_model_ready)
+    QTimer.singleShot(int(model_timeout * 1000), app.quit)  # 모델 로딩 실패/지연 시 종료
+    app.exec_()
+    print(json.dumps(result))
+
+
+def run_benchmark(runs, wait_model, model_timeout):
+    env = dict(os.environ)
+    if not os.environ.get('DISPLAY'):
+        env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    samples = []
+    for idx in range(runs):
+        command = [sys.executable, os.path.abspath(__file__), '--child',
+                   '--start-time', repr(time.time()), '--model-timeout', str(model_timeout)]
+        if not wait_model:
+            command.append('--no-model')
+        output = subprocess.run(command, stdout=subprocess.PIPE, env=env, check=True, text=True).stdout
+        sample = json.loads(output.strip().splitlines()[-1])
+        print(f"[{idx + 1}/{runs}] {sample}")
+        samples.append(sample)
+
+    summary = {}
+    for key in ('import_seconds', 'first_paint_seconds', 'model_ready_seconds'):
+        values = [sample[key] for sample in samples if key in sample]
+        if values:
+            summary[key] = {'median': round(statistics.median(values), 3),
+                            'min': min(values), 'max': max(values)}
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='GUI 시작 시간 벤치마크')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--no-model', action='store_true', help='모델 미리 로딩을 측정하지 않음')
+    parser.add_argument('--model-timeout', type=float, default=600.0, help='모델 로딩 대기 최대 시간(초)')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--start-time', type=float, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.start_time or time.time(), not args.no_model, args.model_timeout)
+    else:
+        summary = run_benchmark(args.runs, not args.no_model, args.model_timeout)
+        print(json.dumps(summary, indent=4))
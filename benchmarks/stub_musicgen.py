@@ -0,0 +1,70 @@
+# stub_musicgen.py
+# GPU/모델 가중치 없이 파이프라인을 벤치마크하기 위한 MusicGen 대역(stub).
+#
+# pipeline.generate_segment를 NumPy로 만든 잔잔한 합성음(사인파 화음 + 약한 잡음)을
+# WAV로 쓰는 함수로 바꿉니다. 같은 시드면 같은 오디오가 나오며, real_time_factor를 주면
+# 실제 모델처럼 (세그먼트 길이 × RTF)초 동안 기다려 생성 시간을 흉내 냅니다.
+
+import os
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT_DIR, 'modules'))
+
+import numpy as np
+
+import audio_io
+
+STUB_SAMPLE_RATE = 32000  # MusicGen 출력과 같은 32kHz 모노
+
+
+def synthesize(seconds, seed, sample_rate=STUB_SAMPLE_RATE):
+    """
+    seconds 길이의 [frames, 1] float32 합성음을 만듭니다.
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    root = rng.choice([130.81, 146.83, 174.61, 196.0, 220.0])
+    audio = np.zeros_like(t)
+    for ratio, level in ((1.0, 0.2), (1.25, 0.12), (1.5, 0.1), (2.0, 0.05)):
+        audio += level * np.sin(2 * np.pi * root * ratio * t + rng.uniform(0, 2 * np.pi))
+    audio *= 0.6 + 0.4 * np.sin(2 * np.pi * rng.uniform(0.02, 0.1) * t)  # 느린 음량 변화
+    audio += rng.normal(0.0, 0.005, len(t))
+    return (audio * 10 ** (rng.uniform(-6, 0) / 20)).astype(np.float32)[:, None]
+
+
+def install(pipeline_module, real_time_factor=0.0, sample_rate=STUB_SAMPLE_RATE):
+    """
+    pipeline 모듈의 generate_segment를 대역으로 바꿉니다.
+
+    Returns:
+        callable: 원래 함수로 되돌리는 함수.
+    """
+    original = pipeline_module.generate_segment
+
+    def generate_segment(model, prompt_text, filepath, seed, duration=None):
+        seconds = duration or 120
+        start = time.perf_counter()
+        audio = synthesize(seconds, seed, sample_rate)
+        audio_io.write_wav(filepath, audio, sample_rate)
+        remaining = seconds * real_time_factor - (time.perf_counter() - start)
+        if remaining > 0:
+            time.sleep(remaining)
+
+    pipeline_module.generate_segment = generate_segment
+
+    def restore():
+        pipeline_module.generate_segment = original
+
+    return restore
+
+
+def stub_pipeline(pipeline_module, real_time_factor=0.0, **pipeline_options):
+    """
+    대역 생성 함수를 설치하고 모델 로딩을 건너뛰는 SleepMusicPipeline을 만듭니다.
+    """
+    install(pipeline_module, real_time_factor)
+    pipeline = pipeline_module.SleepMusicPipeline(**pipeline_options)
+    pipeline.load_model = lambda: None
+    return pipeline
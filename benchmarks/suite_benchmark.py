@@ -0,0 +1,257 @@
+# suite_benchmark.py
+# 분석 → 생성 → 렌더링 → 후처리 전체 벤치마크 모음.
+#
+# - analyzer:        midi_analyzer의 각 함수 × 합성 MIDI fixture(example.mid ~ 8시간)
+# - music_generator: generate_music_and_convert_to_mp3를 여러 TARGET_DURATION_MINUTES로 실행
+# - pipeline:        MusicGen 대역(stub_musicgen)으로 세그먼트 생성 후 검사/정규화/적합성/ffmpeg 단계별 실행
+#
+# 각 측정은 별도 자식 프로세스에서 실행해 단계별 최대 메모리(peak RSS)를 따로 잽니다.
+# 결과는 benchmarks/results/suite_<시각>.json에 커밋 해시와 함께 저장되며,
+# --compare로 이전 결과와 비교해 느려진 항목을 표시합니다.
+#
+# 사용 예:
+#   python benchmarks/suite_benchmark.py
+#   python benchmarks/suite_benchmark.py --groups analyzer --fixture-minutes 1 10
+#   python benchmarks/suite_benchmark.py --groups pipeline --pipeline-hours 0.5 8
+#   python benchmarks/suite_benchmark.py --compare benchmarks/results/suite_20250101_120000.json
+
+import sys
+import os
+import io
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import contextlib
+import subprocess
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT_DIR, 'scripts'))
+sys.path.append(os.path.join(ROOT_DIR, 'modules'))
+sys.path.append(os.path.join(ROOT_DIR, 'benchmarks'))
+
+import utils
+
+GROUPS = ['analyzer', 'music_generator', 'pipeline']
+ANALYZER_FUNCTIONS = [
+    'get_midi_bpm',
+    'get_midi_key_and_scale',
+    'get_midi_chord_progression',
+    'get_midi_melody_patterns',
+    'get_midi_instrument_info',
+    'get_midi_dynamics',
+    'get_midi_density',
+]
+PIPELINE_BENCH_STAGES = ['generate', 'scan', 'normalize', 'verify', 'convert', 'concat_stage', 'concat_final', 'video']
+FFMPEG_STAGES = {'convert', 'concat_stage', 'concat_final', 'video'}
+REGRESSION_RATIO = 1.2  # 이전보다 20% 이상 느리면 표시
+
+
+def peak_rss_mb():
+    """
+    이 프로세스와 끝난 자식 프로세스(ffmpeg 등)의 최대 메모리 사용량(MB).
+    resource 모듈이 없는 Windows에서는 None.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None, None
+    scale = 1024 ** 2 if sys.platform == 'darwin' else 1024  # macOS는 바이트, Linux는 KB
+    self_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    children_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale
+    return round(self_rss, 1), round(children_rss, 1)
+
+
+def run_case(case):
+    """
+    자식 프로세스: 측정 1건을 실행하고 결과 dict를 반환합니다.
+    모듈들이 출력하는 DEBUG 로그는 측정을 흐리지 않도록 버립니다.
+    """
+    group = case['group']
+    quiet = io.StringIO()
+
+    if group == 'analyzer':
+        import midi_analyzer
+        func = getattr(midi_analyzer, case['function'])
+        with contextlib.redirect_stdout(quiet):
+            start = time.perf_counter()
+            result = func(case['fixture']['path'])
+            seconds = time.perf_counter() - start
+        ok = result not in (None, [], {}, (None, None))
+        throughput = {'notes_per_second': round(case['fixture']['notes'] / seconds, 1)}
+
+    elif group == 'music_generator':
+        import music_generator
+        music_generator.TARGET_DURATION_MINUTES = case['minutes']
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # 결과 파일을 modules/ 대신 임시 폴더에 쓰도록 모듈 위치를 바꿔 둠
+            music_generator.__file__ = os.path.join(tmp_dir, 'music_generator.py')
+            with contextlib.redirect_stdout(quiet):
+                start = time.perf_counter()
+                music_generator.generate_music_and_convert_to_mp3()
+                seconds = time.perf_counter() - start
+            ok = os.path.exists(os.path.join(tmp_dir, 'generated_music_temp.mid'))
+        throughput = {'music_minutes_per_second': round(case['minutes'] / seconds, 3)}
+
+    elif group == 'pipeline':
+        import pipeline as pipeline_module
+        from stub_musicgen import stub_pipeline
+        pipeline = stub_pipeline(pipeline_module, case.get('real_time_factor', 0.0),
+                                 log=lambda message: None, segment_seconds=case['segment_seconds'])
+        folder = case['folder']
+        stage = case['stage']
+        start = time.perf_counter()
+        if stage == 'generate':
+            ok = pipeline.generate_music('stub ambient pads', folder, case['hours'])
+        elif stage == 'video':
+            ok = pipeline.make_mp4_video(folder, case['image_path'])
+        else:
+            ok = pipeline.run({'output_folder': folder}, stages=[stage])
+        seconds = time.perf_counter() - start
+        throughput = {'audio_seconds_per_second': round(case['hours'] * 3600 / seconds, 1)}
+
+    else:
+        raise ValueError(f"알 수 없는 그룹입니다: {group}")
+
+    self_rss, children_rss = peak_rss_mb()
+    return {
+        'name': case['name'],
+        'group': group,
+        'ok': bool(ok),
+        'seconds': round(seconds, 3),
+        'peak_rss_mb': self_rss,
+        'children_peak_rss_mb': children_rss,
+        **throughput,
+    }
+
+
+def run_in_child(case, timeout):
+    command = [sys.executable, os.path.abspath(__file__), '--child', json.dumps(case)]
+    try:
+        completed = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                                   timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return {'name': case['name'], 'group': case['group'], 'ok': False, 'error': f'timeout ({timeout}s)'}
+    lines = completed.stdout.strip().splitlines()
+    if completed.returncode != 0 or not lines:
+        error = (completed.stderr.strip().splitlines() or ['unknown error'])[-1]
+        return {'name': case['name'], 'group': case['group'], 'ok': False, 'error': error}
+    return json.loads(lines[-1])
+
+
+def make_background_image(folder):
+    image_path = os.path.join(folder, 'background.png')
+    subprocess.run(['ffmpeg', '-y', '-f', 'lavfi', '-i', 'color=c=black:s=640x360', '-frames:v', '1', image_path],
+                   stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+    return image_path
+
+
+def build_cases(args, work_dir):
+    cases = []
+    if 'analyzer' in args.groups:
+        from fixtures import build_fixtures
+        for fixture in build_fixtures(args.fixture_minutes):
+            label = os.path.splitext(os.path.basename(fixture['path']))[0]
+            for function in ANALYZER_FUNCTIONS:
+                cases.append({'group': 'analyzer', 'name': f"analyzer/{function}/{label}",
+                              'function': function, 'fixture': fixture})
+
+    if 'music_generator' in args.groups:
+        for minutes in args.generator_minutes:
+            cases.append({'group': 'music_generator', 'name': f"music_generator/{minutes}min", 'minutes': minutes})
+
+    if 'pipeline' in args.groups:
+        has_ffmpeg = shutil.which('ffmpeg') is not None
+        if not has_ffmpeg:
+            print('ffmpeg를 찾을 수 없어 변환/이어붙이기/영상 단계는 건너뜁니다.')
+        for hours in args.pipeline_hours:
+            folder = os.path.join(work_dir, f"night_{hours}h")
+            os.makedirs(folder, exist_ok=True)
+            image_path = make_background_image(work_dir) if has_ffmpeg else None
+            for stage in PIPELINE_BENCH_STAGES:
+                if stage in FFMPEG_STAGES and not has_ffmpeg:
+                    continue
+                cases.append({'group': 'pipeline', 'name': f"pipeline/{hours}h/{stage}", 'stage': stage,
+                              'hours': hours, 'folder': folder, 'image_path': image_path,
+                              'segment_seconds': args.segment_seconds,
+                              'real_time_factor': args.real_time_factor})
+    return cases
+
+
+def compare(results, previous_path):
+    """
+    이전 결과와 항목별 소요 시간을 비교해 출력합니다.
+
+    Returns:
+        list: REGRESSION_RATIO 이상 느려진 항목 이름.
+    """
+    previous = {case['name']: case for case in utils.load_json(previous_path).get('cases', [])}
+    regressions = []
+    print(f"\n--- 이전 결과와 비교 ({os.path.basename(previous_path)}) ---")
+    for case in results:
+        old = previous.get(case['name'])
+        if not old or 'seconds' not in old or 'seconds' not in case:
+            continue
+        ratio = case['seconds'] / max(old['seconds'], 1e-6)
+        mark = '  ← 느려짐' if ratio >= REGRESSION_RATIO else ''
+        print(f"{case['name']}: {old['seconds']}s → {case['seconds']}s (x{ratio:.2f}){mark}")
+        if mark:
+            regressions.append(case['name'])
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR, stdout=subprocess.PIPE,
+                              stderr=subprocess.PIPE, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='분석/생성/렌더링/후처리 벤치마크 모음')
+    parser.add_argument('--groups', nargs='+', default=GROUPS, choices=GROUPS)
+    parser.add_argument('--fixture-minutes', nargs='+', type=int, default=[1, 10, 60, 480],
+                        help='example.mid 외에 만들 합성 MIDI 길이(분)')
+    parser.add_argument('--generator-minutes', nargs='+', type=int, default=[1, 10, 30],
+                        help='music_generator.TARGET_DURATION_MINUTES 값들')
+    parser.add_argument('--pipeline-hours', nargs='+', type=float, default=[0.5, 2.0],
+                        help='대역 MusicGen으로 만들 수면 음악 길이(시간)')
+    parser.add_argument('--segment-seconds', type=int, default=120)
+    parser.add_argument('--real-time-factor', type=float, default=0.0,
+                        help='대역 생성이 기다릴 시간 비율 (0이면 바로 생성)')
+    parser.add_argument('--timeout', type=float, default=1800.0, help='측정 1건의 최대 시간(초)')
+    parser.add_argument('--compare', default=None, help='비교할 이전 결과 JSON')
+    parser.add_argument('--output', default=os.path.join(ROOT_DIR, 'benchmarks', 'results',
+                                                         f"suite_{utils.get_current_timestamp()}.json"))
+    parser.add_argument('--child', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_case(json.loads(args.child))))
+        sys.exit(0)
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix='sleepgen_bench_') as work_dir:
+        cases = build_cases(args, work_dir)
+        for idx, case in enumerate(cases, start=1):
+            result = run_in_child(case, args.timeout)
+            results.append(result)
+            summary = f"{result['seconds']}s, RSS {result.get('peak_rss_mb')}MB" if 'seconds' in result \
+                else result.get('error')
+            print(f"[{idx}/{len(cases)}] {case['name']}: {summary}")
+
+    utils.save_json({
+        'commit': git_commit(),
+        'timestamp': utils.get_current_timestamp(),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'options': {key: value for key, value in vars(args).items() if key not in ('child', 'output', 'compare')},
+        'cases': results,
+    }, args.output)
+
+    if args.compare:
+        regressions = compare(results, args.compare)
+        sys.exit(1 if regressions else 0)
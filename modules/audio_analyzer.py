@@ -0,0 +1,265 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# midi_analyzer의 밀도/다이내믹스를 오디오에서 측정합니다.
+# STFT 2048/512 (32kHz 기준 약 16ms 간격)로 스펙트럴 플럭스를 구하고, 블록 단위로 흘려 넣으므로
+# 세그먼트 길이와 상관없이 메모리 사용량이 일정합니다.
+N_FFT = 2048
+HOP = 512
+FLUX_COMPRESSION = 100.0         # log(1 + C|X|) 압축
+ONSET_PEAK_SECONDS = 0.05        # 이 범위 안에서 가장 큰 플럭스만 onset
+ONSET_CONTEXT_SECONDS = 0.5      # 주변 평균보다 충분히 커야 onset
+ONSET_RATIO = 1.3                # 주변 평균의 이 배수를 넘어야 onset (잔잔한 노이즈/패드 제외)
+DENSITY_WINDOW_SECONDS = 10.0    # onset 밀도 곡선 간격
+DYNAMICS_WINDOW_SECONDS = 1.0    # RMS 곡선 간격
+TEMPO_RANGE_BPM = (40.0, 180.0)
+TEMPO_MIN_CONFIDENCE = 0.3       # 박이 뚜렷하지 않은 앰비언트는 템포 검사 생략
+TEMPO_MIN_ONSETS = 8             # onset이 이보다 적으면 템포를 추정하지 않음
+
+# 구간별 목표 (깊은 NREM일수록 성기고 고르게, 깨어날 때 가장 촘촘하게)
+STAGE_TARGETS = {
+    'SleepOnset': {'max_onset_density': 1.5, 'max_tempo_bpm': 80.0, 'max_dynamic_range_db': 14.0},
+    'NREM': {'max_onset_density': 0.5, 'max_tempo_bpm': 65.0, 'max_dynamic_range_db': 10.0},
+    'REM': {'max_onset_density': 1.0, 'max_tempo_bpm': 75.0, 'max_dynamic_range_db': 12.0},
+    'WakeUp': {'max_onset_density': 2.5, 'max_tempo_bpm': 100.0, 'max_dynamic_range_db': 18.0},
+}
+# 뒤 주기의 NREM은 잠이 얕아지므로 허용 밀도를 주기마다 조금씩 올림 (REM 기준을 넘지 않음)
+NREM_CYCLE_DENSITY_STEP = 0.1
+
+
+def _moving_mean(values, size):
+    size = max(1, min(size, len(values))) | 1
+    padded = np.pad(values, size // 2, mode='edge')
+    cumsum = np.concatenate([[0.0], np.cumsum(padded)])
+    return (cumsum[size:] - cumsum[:-size]) / size
+
+
+def db_to_velocity(rms_db):
+    """
+    RMS(dBFS)를 MIDI 벨로시티 상당값으로 바꿉니다 (dB = 40 log10(v / 127) 관례).
+    """
+    return np.clip(127.0 * 10.0 ** (np.asarray(rms_db) / 40.0), 0.0, 127.0)
+
+
+class AudioFeatureMeter:
+    """
+    블록을 차례로 넣으면 스펙트럴 플럭스와 프레임 에너지를 누적하는 스트리밍 측정기.
+    블록 경계에 걸친 프레임은 남은 샘플과 다음 블록을 이어서 계산합니다.
+    """
+
+    def __init__(self, sample_rate, n_fft=N_FFT, hop=HOP):
+        self.sample_rate = sample_rate
+        self.n_fft = n_fft
+        self.hop = hop
+        self.window = np.hanning(n_fft).astype(np.float32)
+        self.flux = []
+        self.energy = []
+        self._rest = np.zeros(0, dtype=np.float32)
+        self._previous = None
+
+    def add(self, audio):
+        mono = audio.mean(axis=1) if audio.ndim == 2 else audio
+        buffer = np.concatenate([self._rest, np.asarray(mono, dtype=np.float32)])
+        if len(buffer) < self.n_fft:
+            self._rest = buffer
+            return
+        count = (len(buffer) - self.n_fft) // self.hop + 1
+        frames = np.lib.stride_tricks.sliding_window_view(buffer, self.n_fft)[::self.hop][:count]
+        magnitude = np.log1p(FLUX_COMPRESSION * np.abs(np.fft.rfft(frames * self.window, axis=1)))
+
+        previous = magnitude[:1] if self._previous is None else self._previous[None, :]
+        rise = magnitude - np.concatenate([previous, magnitude[:-1]])
+        self.flux.append(np.maximum(rise, 0.0).sum(axis=1))
+        self.energy.append(np.einsum('ij,ij->i', frames, frames) / self.n_fft)
+        self._previous = magnitude[-1]
+        self._rest = buffer[count * self.hop:]
+
+    def result(self):
+        """
+        Returns:
+            dict: onset_density(/초), tempo_bpm, tempo_confidence, rms_db, dynamic_range_db,
+                velocity_equivalent, density_curve, rms_curve, seconds
+        """
+        flux = np.concatenate(self.flux) if self.flux else np.zeros(0)
+        energy = np.concatenate(self.energy) if self.energy else np.zeros(0)
+        frame_seconds = self.hop / self.sample_rate
+        seconds = len(flux) * frame_seconds
+        if len(flux) < 3:
+            return {'onset_density': 0.0, 'tempo_bpm': None, 'tempo_confidence': 0.0, 'rms_db': None,
+                    'dynamic_range_db': 0.0, 'velocity_equivalent': 0.0, 'density_curve': [], 'rms_curve': [],
+                    'seconds': round(seconds, 2)}
+
+        onsets = self._pick_onsets(flux, frame_seconds)
+        tempo_bpm, confidence = self._tempo(flux, frame_seconds) if len(onsets) >= TEMPO_MIN_ONSETS else (None, 0.0)
+
+        density_frames = max(1, int(round(DENSITY_WINDOW_SECONDS / frame_seconds)))
+        density_counts = np.bincount(onsets // density_frames, minlength=-(-len(flux) // density_frames))
+        density_curve = density_counts / DENSITY_WINDOW_SECONDS
+
+        dynamics_frames = max(1, int(round(DYNAMICS_WINDOW_SECONDS / frame_seconds)))
+        usable = len(energy) // dynamics_frames * dynamics_frames or len(energy)
+        window_energy = energy[:usable].reshape(-1, min(dynamics_frames, usable)).mean(axis=1)
+        rms_curve = 10.0 * np.log10(np.maximum(window_energy, 1e-12))
+        audible = rms_curve[rms_curve > -70.0]
+        rms_db = float(10.0 * np.log10(max(energy.mean(), 1e-12)))
+        dynamic_range = float(np.percentile(audible, 95) - np.percentile(audible, 5)) if len(audible) else 0.0
+
+        return {
+            'onset_density': round(len(onsets) / max(seconds, 1e-9), 3),
+            'tempo_bpm': round(tempo_bpm, 1) if tempo_bpm else None,
+            'tempo_confidence': round(confidence, 3),
+            'rms_db': round(rms_db, 2),
+            'dynamic_range_db': round(dynamic_range, 2),
+            'velocity_equivalent': round(float(db_to_velocity(rms_db)), 1),
+            'density_curve': np.round(density_curve, 3).tolist(),
+            'rms_curve': np.round(rms_curve, 1).tolist(),
+            'seconds': round(seconds, 2),
+        }
+
+    @staticmethod
+    def _pick_onsets(flux, frame_seconds):
+        """
+        주변에서 가장 크고, 주변 평균보다 충분히 큰 플럭스 프레임을 onset으로 고릅니다.
+        """
+        peak = max(1, int(round(ONSET_PEAK_SECONDS / frame_seconds)))
+        context = max(3, int(round(ONSET_CONTEXT_SECONDS / frame_seconds)))
+        padded = np.pad(flux, peak, mode='constant', constant_values=-np.inf)
+        local_max = np.lib.stride_tricks.sliding_window_view(padded, 2 * peak + 1).max(axis=1)
+        threshold = ONSET_RATIO * _moving_mean(flux, 2 * context + 1)
+        return np.flatnonzero((flux >= local_max) & (flux > threshold) & (flux > 0))
+
+    @staticmethod
+    def _tempo(flux, frame_seconds):
+        """
+        플럭스 자기상관(FFT)에서 TEMPO_RANGE_BPM 안의 가장 강한 주기를 템포로 봅니다.
+
+        Returns:
+            tuple: (BPM 또는 None, 신뢰도 = 자기상관 최고점 / 0지연 값)
+        """
+        centered = flux - flux.mean()
+        size = 1 << int(np.ceil(np.log2(2 * len(centered))))
+        spectrum = np.fft.rfft(centered, size)
+        autocorr = np.fft.irfft(spectrum.real ** 2 + spectrum.imag ** 2, size)[:len(centered)]
+        if autocorr[0] <= 0:
+            return None, 0.0
+        low = int(np.floor(60.0 / TEMPO_RANGE_BPM[1] / frame_seconds))
+        high = min(int(np.ceil(60.0 / TEMPO_RANGE_BPM[0] / frame_seconds)), len(autocorr) - 1)
+        if high <= low:
+            return None, 0.0
+        lag = low + int(np.argmax(autocorr[low:high + 1]))
+        return 60.0 / (lag * frame_seconds), float(autocorr[lag] / autocorr[0])
+
+
+def analyze_blocks(blocks, sample_rate):
+    """
+    오디오 블록들을 흘려 넣어 밀도/템포/다이내믹스를 측정합니다.
+    """
+    meter = AudioFeatureMeter(sample_rate)
+    for block in blocks:
+        meter.add(block)
+    return meter.result()
+
+
+def stage_targets(stage):
+    """
+    구간('NREM2' 등)의 목표값 dict.
+    """
+    family = stage.rstrip('0123456789')
+    cycle = int(stage[len(family):] or 0)
+    targets = dict(STAGE_TARGETS.get(family, STAGE_TARGETS['NREM']))
+    if family == 'NREM' and cycle > 1:
+        targets['max_onset_density'] = min(targets['max_onset_density'] + NREM_CYCLE_DENSITY_STEP * (cycle - 1),
+                                           STAGE_TARGETS['REM']['max_onset_density'])
+    return targets
+
+
+def check_stage(result, stage):
+    """
+    측정값을 구간 목표와 비교합니다.
+
+    Returns:
+        dict: 검사 이름 → True(통과)/False. 템포는 박이 뚜렷할 때만 검사합니다.
+    """
+    targets = stage_targets(stage)
+    checks = {
+        'onset_density': result['onset_density'] <= targets['max_onset_density'],
+        'dynamic_range': result['dynamic_range_db'] <= targets['max_dynamic_range_db'],
+    }
+    if result['tempo_bpm'] and result['tempo_confidence'] >= TEMPO_MIN_CONFIDENCE:
+        checks['tempo'] = result['tempo_bpm'] <= targets['max_tempo_bpm']
+    return checks
+
+
+def check_wake_rising(segments, plan):
+    """
+    깨어나는 구간에서 onset 밀도가 점점 늘어나는지 (기울기 >= 0, 마지막 NREM보다 촘촘한지) 확인합니다.
+
+    Returns:
+        bool or None: WakeUp 구간이 없으면 None.
+    """
+    wake = [segments[name]['onset_density'] for name, stage, _ in plan
+            if stage.rstrip('0123456789') == 'WakeUp' and name in segments]
+    if not wake:
+        return None
+    nrem = [segments[name]['onset_density'] for name, stage, _ in plan
+            if stage.startswith('NREM') and name in segments]
+    slope = np.polyfit(np.arange(len(wake)), wake, 1)[0] if len(wake) > 1 else 0.0
+    return bool(slope >= 0 and (not nrem or np.mean(wake) >= nrem[-1]))
+
+
+def verify_segments(jobs, max_workers=None, on_done=None):
+    """
+    여러 세그먼트를 스레드 풀에서 병렬로 측정/검사합니다 (NumPy FFT/파일 I/O는 GIL을 놓음).
+
+    Args:
+        jobs (list): [(이름, 구간명, read_blocks 생성 함수, sample_rate), ...]
+        on_done (callable): 세그먼트 하나가 끝날 때마다 on_done(이름, 결과) 호출.
+
+    Returns:
+        tuple: ({이름: 결과}, 실시간 대비 배속)
+    """
+    def work(job):
+        name, stage, make_blocks, sample_rate = job
+        result = analyze_blocks(make_blocks(), sample_rate)
+        result['stage'] = stage
+        result['checks'] = check_stage(result, stage)
+        result['conforms'] = all(result['checks'].values())
+        return name, result
+
+    results = {}
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+        for name, result in executor.map(work, jobs):
+            results[name] = result
+            if on_done:
+                on_done(name, result)
+    elapsed = time.perf_counter() - start
+    audio_seconds = sum(result['seconds'] for result in results.values())
+    return results, round(audio_seconds / max(elapsed, 1e-9), 1)
+
+
+if __name__ == '__main__':
+    # --- 간단한 동작 확인: 60 BPM 클릭 + 잔잔한 패드 ---
+    sr = 32000
+    t = np.arange(sr * 120) / sr
+    rng = np.random.default_rng(0)
+    pad = 0.1 * np.sin(2 * np.pi * 220 * t) + rng.normal(0, 0.002, len(t))
+    clicks = np.zeros_like(t)
+    for beat in np.arange(0, 120, 1.0):  # 60 BPM
+        idx = int(beat * sr)
+        clicks[idx:idx + 800] += 0.5 * np.exp(-np.arange(800) / 120) * rng.normal(0, 1, 800)
+    audio = (pad + clicks).astype(np.float32)
+
+    start = time.perf_counter()
+    result = analyze_blocks((audio[i:i + 100000] for i in range(0, len(audio), 100000)), sr)
+    seconds = time.perf_counter() - start
+    print(f"onset 밀도 {result['onset_density']}/초 (예상 1.0), 템포 {result['tempo_bpm']} BPM "
+          f"(신뢰도 {result['tempo_confidence']}), RMS {result['rms_db']} dB, 벨로시티 상당 {result['velocity_equivalent']}")
+    print(f"120초 분석 {seconds:.2f}초 (실시간 대비 {120 / seconds:.0f}배)")
+    for stage in ('NREM1', 'NREM3', 'WakeUp'):
+        print(f"  {stage}: {check_stage(result, stage)}")
+    calm = analyze_blocks([pad.astype(np.float32)], sr)
+    print(f"패드만: onset 밀도 {calm['onset_density']}/초, 검사 {check_stage(calm, 'NREM1')}")
@@ -0,0 +1,209 @@
+import os
+import struct
+
+import numpy as np
+
+# WAV format 태그
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+def read_wav_info(filepath):
+    """
+    WAV 헤더를 읽어 포맷 정보와 데이터 위치를 반환합니다.
+
+    torchaudio.save 기본값인 32-bit float WAV와 16/24/32-bit PCM WAV를 지원합니다
+    (표준 wave 모듈은 float WAV를 읽지 못합니다).
+
+    Returns:
+        dict: sample_rate, channels, bits, format, data_offset, num_frames
+    """
+    with open(filepath, 'rb') as f:
+        riff, _, wave_id = struct.unpack('<4sI4s', f.read(12))
+        if riff != b'RIFF' or wave_id != b'WAVE':
+            raise ValueError(f"WAV 파일이 아닙니다: {filepath}")
+
+        info = {}
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                break
+            chunk_id, chunk_size = struct.unpack('<4sI', header)
+            if chunk_id == b'fmt ':
+                fmt = f.read(chunk_size)
+                audio_format, channels, sample_rate, _, _, bits = struct.unpack('<HHIIHH', fmt[:16])
+                if audio_format == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+                    audio_format = struct.unpack('<H', fmt[24:26])[0]
+                info.update(format=audio_format, channels=channels, sample_rate=sample_rate, bits=bits)
+            elif chunk_id == b'data':
+                info['data_offset'] = f.tell()
+                info['data_size'] = chunk_size
+                break
+            else:
+                f.seek(chunk_size + (chunk_size & 1), os.SEEK_CUR)
+
+    if 'format' not in info or 'data_offset' not in info:
+        raise ValueError(f"WAV 헤더를 해석할 수 없습니다: {filepath}")
+    # 스트리밍으로 쓰다 중단된 파일은 data 크기가 0xFFFFFFFF일 수 있어 실제 파일 크기로 보정
+    data_size = min(info['data_size'], os.path.getsize(filepath) - info['data_offset'])
+    info['num_frames'] = data_size // (info['channels'] * info['bits'] // 8)
+    return info
+
+
+def _sample_dtype(info):
+    if info['format'] == WAVE_FORMAT_IEEE_FLOAT:
+        return np.dtype('<f4') if info['bits'] == 32 else np.dtype('<f8')
+    if info['bits'] == 16:
+        return np.dtype('<i2')
+    if info['bits'] == 32:
+        return np.dtype('<i4')
+    if info['bits'] == 24:
+        return None  # 24-bit는 바이트 단위로 직접 변환
+    raise ValueError(f"지원하지 않는 WAV 비트 수입니다: {info['bits']}")
+
+
+def _to_float(raw, info):
+    if info['format'] == WAVE_FORMAT_IEEE_FLOAT:
+        return raw.astype(np.float32, copy=False)
+    return raw.astype(np.float32) / float(2 ** (info['bits'] - 1))
+
+
+def read_wav(filepath, start_frame=0, num_frames=None):
+    """
+    WAV 파일(또는 그 일부)을 float32 배열로 읽습니다.
+
+    Args:
+        filepath (str): WAV 파일 경로.
+        start_frame (int): 읽기 시작할 프레임 위치.
+        num_frames (int): 읽을 프레임 수 (기본값: 끝까지).
+
+    Returns:
+        tuple: (audio [frames, channels] float32, sample_rate)
+    """
+    info = read_wav_info(filepath)
+    channels = info['channels']
+    start_frame = min(start_frame, info['num_frames'])
+    if num_frames is None:
+        num_frames = info['num_frames'] - start_frame
+    num_frames = max(0, min(num_frames, info['num_frames'] - start_frame))
+
+    bytes_per_frame = channels * info['bits'] // 8
+    dtype = _sample_dtype(info)
+    with open(filepath, 'rb') as f:
+        f.seek(info['data_offset'] + start_frame * bytes_per_frame)
+        data = f.read(num_frames * bytes_per_frame)
+
+    if dtype is None:  # 24-bit PCM
+        raw = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3)
+        values = (raw[:, 0].astype(np.int32) | (raw[:, 1].astype(np.int32) << 8)
+                  | (raw[:, 2].astype(np.int32) << 16))
+        values = np.where(values >= 2 ** 23, values - 2 ** 24, values)
+        audio = values.astype(np.float32) / float(2 ** 23)
+    else:
+        audio = _to_float(np.frombuffer(data, dtype=dtype), info)
+    return audio.reshape(-1, channels), info['sample_rate']
+
+
+def iter_wav_blocks(filepath, block_frames):
+    """
+    WAV 파일을 block_frames 프레임씩 나눠 읽는 제너레이터 (긴 파일도 메모리 사용량 일정).
+
+    Yields:
+        tuple: (시작 프레임, audio [frames, channels] float32, sample_rate)
+    """
+    info = read_wav_info(filepath)
+    for start in range(0, info['num_frames'], block_frames):
+        audio, sample_rate = read_wav(filepath, start, block_frames)
+        yield start, audio, sample_rate
+
+
+def write_wav(filepath, audio, sample_rate, bits=32):
+    """
+    float 배열을 WAV 파일로 저장합니다. 임시 파일에 쓴 뒤 교체합니다.
+
+    Args:
+        filepath (str): 저장할 경로.
+        audio (np.ndarray): [frames] 또는 [frames, channels] float 배열 (-1.0 ~ 1.0).
+        sample_rate (int): 샘플레이트.
+        bits (int): 32이면 IEEE float(torchaudio 기본과 동일), 16이면 16-bit PCM.
+    """
+    audio = _as_frames(audio)
+    data = _encode_samples(audio, bits)
+    tmp_filepath = f"{filepath}.tmp"
+    with open(tmp_filepath, 'wb') as f:
+        f.write(_wav_header(len(data), audio.shape[1], sample_rate, bits))
+        f.write(data)
+    os.replace(tmp_filepath, filepath)
+
+
+def write_wav_blocks(filepath, blocks, sample_rate, bits=32):
+    """
+    블록 흐름을 WAV 파일로 이어 씁니다 (몇 시간 길이도 전체를 메모리에 올리지 않음).
+    길이를 모르므로 헤더를 먼저 쓰고, 끝난 뒤 크기 필드를 고쳐 씁니다.
+
+    Returns:
+        int: 기록한 프레임 수.
+    """
+    tmp_filepath = f"{filepath}.tmp"
+    frames, channels, data_bytes = 0, None, 0
+    with open(tmp_filepath, 'wb') as f:
+        for block in blocks:
+            block = _as_frames(block)
+            if channels is None:
+                channels = block.shape[1]
+                f.write(_wav_header(0, channels, sample_rate, bits))
+            data = _encode_samples(block, bits)
+            f.write(data)
+            frames += len(block)
+            data_bytes += len(data)
+        if channels is None:
+            channels = 1
+            f.write(_wav_header(0, channels, sample_rate, bits))
+        f.seek(0)
+        f.write(_wav_header(data_bytes, channels, sample_rate, bits))
+    os.replace(tmp_filepath, filepath)
+    return frames
+
+
+def _as_frames(audio):
+    audio = np.asarray(audio, dtype=np.float32)
+    return audio[:, None] if audio.ndim == 1 else audio
+
+
+def _encode_samples(audio, bits):
+    if bits == 32:
+        return audio.astype('<f4').tobytes()
+    if bits == 16:
+        return (np.clip(audio, -1.0, 1.0) * 32767.0).round().astype('<i2').tobytes()
+    raise ValueError(f"지원하지 않는 비트 수입니다: {bits}")
+
+
+def _wav_header(data_bytes, channels, sample_rate, bits):
+    audio_format = WAVE_FORMAT_IEEE_FLOAT if bits == 32 else WAVE_FORMAT_PCM
+    block_align = channels * bits // 8
+    header = struct.pack('<4sI4s', b'RIFF', 36 + data_bytes, b'WAVE')
+    header += struct.pack('<4sIHHIIHH', b'fmt ', 16, audio_format, channels, sample_rate,
+                          sample_rate * block_align, block_align, bits)
+    return header + struct.pack('<4sI', b'data', data_bytes)
+
+
+if __name__ == '__main__':
+    # --- 간단한 동작 확인 ---
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        sr = 32000
+        t = np.arange(sr) / sr
+        tone = np.stack([0.5 * np.sin(2 * np.pi * 440 * t)] * 2, axis=1)
+        for bits in (32, 16):
+            path = os.path.join(tmp_dir, f"tone_{bits}.wav")
+            write_wav(path, tone, sr, bits=bits)
+            audio, rate = read_wav(path)
+            print(f"{bits}-bit: shape={audio.shape}, sr={rate}, 최대 오차={np.abs(audio - tone).max():.6f}")
+        blocks = sum(1 for _ in iter_wav_blocks(path, 8000))
+        print(f"블록 읽기: {blocks}개")
+        path = os.path.join(tmp_dir, "tone_blocks.wav")
+        write_wav_blocks(path, (tone[start:start + 7000] for start in range(0, len(tone), 7000)), sr)
+        audio, rate = read_wav(path)
+        print(f"블록 쓰기: shape={audio.shape}, 최대 오차={np.abs(audio - tone).max():.6f}")
@@ -0,0 +1,332 @@
+import os
+import sys
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# scripts 폴더(utils.py)를 임포트 경로에 추가
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+
+import utils
+import audio_io
+from job_manifest import JobManifest
+from pcm_store import PcmStore
+from hls_stream import HlsStream
+from pipeline import (SleepMusicPipeline, PIPELINE_STAGES, cached_segment, cache_generated_segment, generate_batch,
+                      segment_details, segment_seed)
+from rng import RNG_SCHEME
+from stage_planner import build_schedule, schedule_to_plan, stage_options_from
+
+DEFAULT_BATCH_SIZE = 4
+DEFAULT_ENCODE_WORKERS = 2
+DEFAULT_POSTPROCESS_WORKERS = 1
+# 길이가 이 간격(초) 안에서 비슷한 세그먼트는 같은 배치로 묶어 가장 긴 길이로 생성한 뒤 잘라 씀
+DEFAULT_DURATION_STEP = 10
+
+
+def job_specs_from(config):
+    """
+    배치 설정의 'jobs' 목록을 작업 설정 목록으로 펼칩니다.
+    각 작업은 최상위 설정(모델 옵션, 구간 설계 옵션, stages 등)을 물려받고 자기 값으로 덮어씁니다.
+    """
+    shared = {key: value for key, value in config.items() if key != 'jobs'}
+    return [{**shared, **job} for job in config.get('jobs', [])]
+
+
+def interleave_batches(job_tasks, batch_size, duration_step=DEFAULT_DURATION_STEP):
+    """
+    작업별 세그먼트 목록을 번갈아(작업1의 1번, 작업2의 1번, ..., 작업1의 2번, ...) 꺼내
+    길이(seconds)를 duration_step초 단위로 올림한 값이 같은 것끼리 batch_size개씩 묶습니다.
+    모든 작업이 고르게 진행되고, 구간마다 조금씩 다른 세그먼트 길이도 한 배치로 생성됩니다.
+
+    Returns:
+        list: 배치(세그먼트 dict 목록) 목록. 마지막에는 덜 찬 배치가 남을 수 있습니다.
+    """
+    order = sorted(((idx, job_idx, task) for job_idx, tasks in enumerate(job_tasks)
+                    for idx, task in enumerate(tasks)), key=lambda item: item[:2])
+    buckets = {}
+    batches = []
+    for _, _, task in order:
+        key = -(-task['seconds'] // duration_step) * duration_step
+        bucket = buckets.setdefault(key, [])
+        bucket.append(task)
+        if len(bucket) == batch_size:
+            batches.append(bucket)
+            buckets[key] = []
+    batches.extend(bucket for bucket in buckets.values() if bucket)
+    return batches
+
+
+class BatchRunner:
+    """
+    여러 밤(작업 설정)을 모델 하나로 함께 만드는 배치 실행기.
+
+    모든 작업의 세그먼트를 번갈아 모아 길이가 비슷한 것끼리 batch_size개씩 한 번의 model.generate로
+    생성하므로, 처리량이 작업 수가 아니라 배치 크기에 따라 늘어납니다. 추론은 호출한 스레드에서 하고,
+    WAV 쓰기/캐시/PCM 저장소/매니페스트 기록은 encode_workers개의 스레드에서, 세그먼트가 모두 끝난
+    작업의 후처리(정규화, 변환, 이어붙이기, 영상)는 별도의 postprocess_workers개 스레드에서 추론과
+    동시에 진행합니다. 후처리가 몇 분씩 걸려도 세그먼트 쓰기가 밀려 추론이 멈추지 않습니다.
+    결과와 매니페스트는 작업마다 자기 output_folder에 남으므로 중단된 배치도 이어서 실행됩니다.
+
+    세그먼트 시드는 단독 실행과 같고, 배치는 첫 세그먼트의 시드로 생성합니다. 1개짜리 배치는 단독
+    생성과 같은 결과가 되지만, 여러 개를 묶은 배치의 세그먼트는 혼자 다시 생성하면 결과가 달라집니다.
+    'loop' 합성 모드는 지원하지 않으며 모든 세그먼트를 생성합니다.
+
+    Args:
+        log (callable): 로그 함수 (기본값: print).
+        progress (callable): 전체 세그먼트 진행률(0~100 int)을 받는 함수.
+        batch_size (int): model.generate 한 번에 만들 세그먼트 수.
+        encode_workers (int): WAV 쓰기 스레드 수.
+        postprocess_workers (int): 작업 후처리 스레드 수.
+        duration_step (int): 한 배치로 묶을 세그먼트 길이 간격(초). 배치는 가장 긴 세그먼트 길이로
+            생성하고 각 세그먼트 길이에 맞게 잘라 씁니다.
+        **pipeline_options: SleepMusicPipeline 옵션 (model_size, segment_seconds, precision,
+            model_cache_dir, segment_cache, reuse_stages, pcm_store, progressive). 모든 작업이 공유합니다.
+    """
+
+    def __init__(self, log=None, progress=None, batch_size=DEFAULT_BATCH_SIZE, encode_workers=DEFAULT_ENCODE_WORKERS,
+                 duration_step=DEFAULT_DURATION_STEP, postprocess_workers=DEFAULT_POSTPROCESS_WORKERS,
+                 **pipeline_options):
+        self.log = log or print
+        self.progress = progress or (lambda value: None)
+        self.batch_size = max(1, int(batch_size))
+        self.encode_workers = max(1, int(encode_workers))
+        self.postprocess_workers = max(1, int(postprocess_workers))
+        self.duration_step = max(1, int(duration_step))
+        self.pipeline_options = pipeline_options
+        self.pipeline = SleepMusicPipeline(log=self.log, **pipeline_options)  # 모델 로딩을 모든 작업이 공유
+        self.model_id = f'{self.pipeline.model_size}-{self.pipeline.precision}'
+        self._lock = threading.Lock()
+        self._done_segments = 0
+        self._total_segments = 0
+
+    def run(self, specs):
+        """
+        작업 설정 목록을 함께 실행합니다.
+
+        Args:
+            specs (list): prompt, output_folder, duration_hours, seed, stages, background_image,
+                구간 설계 옵션을 가진 작업 설정 목록.
+
+        Returns:
+            dict: output_folder → 성공 여부.
+        """
+        results = {}
+        jobs = []
+        for spec in specs:
+            job = self._prepare_job(spec)
+            if job is None:
+                results[spec.get('output_folder')] = False
+            else:
+                jobs.append(job)
+
+        batches = interleave_batches([job['tasks'] for job in jobs], self.batch_size, self.duration_step)
+        self._done_segments = 0
+        self._total_segments = sum(len(batch) for batch in batches)
+        self.log(f'작업 {len(jobs)}개의 세그먼트 {self._total_segments}개를 배치 {len(batches)}개로 생성합니다 '
+                 f'(배치 크기 {self.batch_size}).')
+
+        with ThreadPoolExecutor(max_workers=self.encode_workers) as executor, \
+                ThreadPoolExecutor(max_workers=self.postprocess_workers) as post_executor:
+            postprocess = {}
+            for job in jobs:
+                if job['remaining'] == 0:
+                    postprocess[job['folder']] = post_executor.submit(self._postprocess, job)
+
+            inflight = set()
+            for idx, batch in enumerate(batches, start=1):
+                live = [task for task in batch if task['job']['ok']]
+                if not live:
+                    continue
+                seed = live[0]['seed']
+                try:
+                    clips, sample_rate = generate_batch(self.pipeline.load_model(),
+                                                        [task['job']['prompt'] for task in live], seed,
+                                                        max(task['seconds'] for task in live))
+                except Exception as e:
+                    traceback.print_exc()
+                    for task in live:
+                        self._fail(task['job'], f"{task['filename']} 생성 실패: {e}")
+                    continue
+                self.log(f"[배치 {idx}/{len(batches)}] {len(live)}개 생성 완료 "
+                         f"({', '.join(sorted({task['job']['name'] for task in live}))})")
+
+                for task, audio in zip(live, clips):
+                    audio = audio[:int(task['seconds'] * sample_rate)]
+                    inflight.add(executor.submit(self._write_segment, task, audio, sample_rate, seed, len(live),
+                                                 post_executor, postprocess))
+                # 쓰기가 추론을 못 따라가면 오디오가 메모리에 쌓이지 않도록 기다림 (후처리는 이 대기와 무관)
+                while len(inflight) > 2 * self.batch_size:
+                    _, inflight = wait(inflight, return_when=FIRST_COMPLETED)
+
+            wait(inflight)
+            if self.pipeline.segment_cache is not None:
+                self.pipeline.segment_cache.flush()  # 세그먼트마다 쓰지 않고 생성이 끝난 뒤 한 번 기록
+            for job in jobs:
+                future = postprocess.get(job['folder'])
+                results[job['folder']] = bool(job['ok'] and future is not None and future.result())
+
+        failed = [folder for folder, ok in results.items() if not ok]
+        if failed:
+            self.log(f"❗ 실패한 작업 {len(failed)}개: {', '.join(str(folder) for folder in failed)}")
+        else:
+            self.log(f'✅ 배치 작업 {len(results)}개 완료!')
+        return results
+
+    def _prepare_job(self, spec):
+        """
+        작업 하나의 일정표/매니페스트를 준비하고, 캐시로 채울 수 없는 세그먼트만 생성 목록에 남깁니다.
+        """
+        prompt = (spec.get('prompt') or '').strip()
+        folder = spec.get('output_folder')
+        if not prompt or not folder:
+            self.log(f'❗ prompt와 output_folder는 필수입니다: {folder}')
+            return None
+        os.makedirs(folder, exist_ok=True)
+
+        schedule = build_schedule(float(spec.get('duration_hours', 8)) * 60, self.pipeline.segment_seconds,
+                                  **stage_options_from(spec))
+        plan = schedule_to_plan(schedule)
+        manifest, resumed = JobManifest.load_or_create(folder, prompt, spec.get('seed'), plan,
+                                                       rng_scheme=RNG_SCHEME)
+        store = PcmStore(folder) if self.pipeline.pcm_store else None
+        job = {
+            'name': os.path.basename(os.path.normpath(folder)),
+            'spec': spec,
+            'prompt': prompt,
+            'folder': folder,
+            'manifest': manifest,
+            'store': store,
+            'stream': HlsStream(folder, plan, store=store, log=self.log) if self.pipeline.progressive else None,
+            'lock': threading.Lock(),  # 매니페스트/PCM 저장소는 작업마다 한 스레드씩 기록
+            'tasks': [],
+            'ok': True,
+        }
+
+        for counter, (filename, section, seconds) in enumerate(plan, start=1):
+            filepath = os.path.join(folder, filename)
+            if manifest.is_task_done('generate', filename, filepath):
+                if job['stream'] is not None:
+                    job['stream'].add(filename)
+                continue
+            seed = segment_seed(manifest, counter)
+            source, cache_key = cached_segment(prompt, filepath, section, seed, self.model_id, seconds,
+                                               cache=self.pipeline.segment_cache,
+                                               reuse_stages=self.pipeline.reuse_stages, job_id=manifest.seed)
+            if source:
+                self._record(job, filename, section, segment_details(seed, seconds, self.model_id, source, cache_key))
+                continue
+            job['tasks'].append({'job': job, 'counter': counter, 'filename': filename, 'section': section,
+                                 'seconds': seconds, 'seed': seed})
+
+        job['remaining'] = len(job['tasks'])
+        self.log(f"[{job['name']}] 세그먼트 {len(job['tasks'])}/{len(plan)}개 생성 대기 "
+                 f"({'이어서 진행' if resumed else '새 작업'}, 시드 {manifest.seed})")
+        return job
+
+    def _record(self, job, filename, section, details):
+        filepath = os.path.join(job['folder'], filename)
+        with job['lock']:
+            job['manifest'].mark_task_done('generate', filename, filepath, details=details)
+            if job['store'] is not None:
+                job['store'].put_wav(filename, filepath, stage=section)
+        if job['stream'] is not None:
+            job['stream'].add(filename)  # 앞 세그먼트가 아직 없으면 스트림이 순서대로 기다림
+
+    def _write_segment(self, task, audio, sample_rate, batch_seed, batch_size, post_executor, postprocess):
+        """
+        인코딩 스레드: 생성된 세그먼트 1개를 저장/기록하고, 작업의 마지막 세그먼트면 후처리 스레드에 예약합니다.
+        """
+        job = task['job']
+        filepath = os.path.join(job['folder'], task['filename'])
+        try:
+            audio_io.write_wav(filepath, audio, sample_rate)
+            cache_generated_segment(self.pipeline.segment_cache, job['prompt'], filepath, task['section'],
+                                    task['seed'], self.model_id, task['seconds'], job_id=job['manifest'].seed)
+            self._record(job, task['filename'], task['section'],
+                         {'seed': task['seed'], 'duration': task['seconds'], 'model': self.model_id,
+                          'source': 'generated' if batch_size == 1 else 'batch',
+                          'batch_seed': batch_seed, 'batch_size': batch_size})
+        except Exception as e:
+            traceback.print_exc()
+            self._fail(job, f"{task['filename']} 저장 실패: {e}")
+            return
+
+        with job['lock']:
+            job['remaining'] -= 1
+            finished = job['remaining'] == 0 and job['ok']
+        with self._lock:
+            self._done_segments += 1
+            self.progress(int((self._done_segments/self._total_segments)*100))
+            if finished:
+                postprocess[job['folder']] = post_executor.submit(self._postprocess, job)
+
+    def _fail(self, job, message):
+        job['ok'] = False
+        self.log(f"❗ [{job['name']}] {message}")
+
+    def _postprocess(self, job):
+        """
+        세그먼트가 모두 준비된 작업의 나머지 단계(생성 제외)를 실행합니다.
+        """
+        spec = job['spec']
+        if job['stream'] is not None and job['stream'].close():
+            self.log(f"[{job['name']}] 스트림 재생목록 완성: {job['stream'].playlist_path}")
+        stages = [stage for stage in (spec.get('stages') or PIPELINE_STAGES) if stage != 'generate']
+        if not spec.get('background_image') and 'video' in stages:
+            stages.remove('video')
+        if not stages:
+            return True
+        self.log(f"[{job['name']}] 세그먼트 생성 완료, 후처리 시작: {', '.join(stages)}")
+        pipeline = SleepMusicPipeline(log=lambda message, name=job['name']: self.log(f'[{name}] {message}'),
+                                      **self.pipeline_options)
+        pipeline.load_model = self.pipeline.load_model  # 검사 단계의 재생성도 같은 모델 사용
+        try:
+            return pipeline.run(spec, stages=stages)
+        except Exception as e:
+            traceback.print_exc()
+            self._fail(job, f'후처리 실패: {e}')
+            return False
+
+
+def run_batch(config, log=None, progress=None):
+    """
+    배치 설정(dict, 최상위 공유 옵션 + 'jobs' 목록)을 실행합니다.
+
+    Returns:
+        dict: output_folder → 성공 여부.
+    """
+    from segment_cache import SegmentCache
+
+    segment_cache = None
+    if config.get('segment_cache_dir'):
+        max_bytes = int(float(config.get('segment_cache_max_gb', 20)) * 1024 ** 3)
+        segment_cache = SegmentCache(config['segment_cache_dir'], max_bytes=max_bytes)
+    runner = BatchRunner(log=log, progress=progress,
+                         batch_size=int(config.get('batch_size', DEFAULT_BATCH_SIZE)),
+                         encode_workers=int(config.get('encode_workers', DEFAULT_ENCODE_WORKERS)),
+                         postprocess_workers=int(config.get('postprocess_workers', DEFAULT_POSTPROCESS_WORKERS)),
+                         duration_step=int(config.get('batch_duration_step', DEFAULT_DURATION_STEP)),
+                         model_size=config.get('model_size', 'medium'),
+                         segment_seconds=int(config.get('segment_seconds', 120)),
+                         precision=config.get('precision', 'fp32'),
+                         model_cache_dir=config.get('model_cache_dir'),
+                         segment_cache=segment_cache,
+                         reuse_stages=config.get('reuse_stages', []),
+                         pcm_store=bool(config.get('pcm_store', False)),
+                         progressive=bool(config.get('progressive', False)))
+    return runner.run(job_specs_from(config))
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='여러 밤을 한 모델로 함께 생성하는 배치 실행')
+    parser.add_argument('--config', required=True, help="배치 설정 JSON ('jobs' 목록 포함)")
+    args = parser.parse_args()
+    config = utils.load_json(args.config)
+    if config is None:
+        sys.exit(2)
+    results = run_batch(config, log=lambda message: print(f"[{utils.get_current_timestamp('%H:%M:%S')}] {message}",
+                                                           flush=True))
+    sys.exit(0 if results and all(results.values()) else 1)
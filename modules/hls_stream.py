@@ -0,0 +1,272 @@
+import os
+import sys
+import math
+import shutil
+import argparse
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+# scripts 폴더(utils.py)를 임포트 경로에 추가
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+
+import utils
+
+# 세그먼트가 하나 끝날 때마다 작은 AAC 조각(MPEG-TS)으로 인코딩해 HLS 재생목록 뒤에 붙입니다.
+# 밤 전체가 끝나기 전에도 첫 세그먼트 길이만큼만 기다리면 재생할 수 있습니다.
+STREAM_DIRNAME = 'stream'
+PLAYLIST_FILENAME = 'stream.m3u8'
+STREAM_INDEX_FILENAME = 'stream_index.json'
+CHUNK_FILENAME = 'chunk_%05d.ts'
+CHUNK_SECONDS = 6
+STREAM_BITRATE = '128k'
+DEFAULT_STREAM_PORT = 8080
+
+
+class HlsStream:
+    """
+    작업 폴더의 세그먼트를 일정표(plan) 순서대로 HLS 조각으로 이어 붙이는 진행형 출력.
+
+    add()는 생성이 끝난 세그먼트를 알려 주기만 하고 바로 돌아오며, 인코딩은 백그라운드 스레드
+    하나에서 순서대로 진행됩니다. 앞 세그먼트가 아직 없으면 뒤 세그먼트는 기다렸다가 붙습니다.
+    조각 목록은 stream/stream_index.json에 기록되므로 중단된 작업을 이어서 생성하면 스트림도
+    이어서 붙습니다. 스트림에 이미 붙은 세그먼트를 나중에 다시 생성해도 스트림은 바뀌지 않습니다.
+
+    Args:
+        folder (str): 작업 폴더 (folder/stream/에 재생목록과 조각 저장).
+        plan (list): 매니페스트 plan ([파일명, 구간명, 초] 목록).
+        store (PcmStore): 있으면 WAV 대신 PCM 저장소에서 바로 읽어 인코딩.
+        chunk_seconds (int): 조각 1개 길이(초).
+        window (int): 지정하면 재생목록에 최근 window개 조각만 남기는 라이브(슬라이딩) 재생목록,
+            None이면 처음부터 모든 조각을 남기는 EVENT 재생목록.
+    """
+
+    def __init__(self, folder, plan, store=None, chunk_seconds=CHUNK_SECONDS, bitrate=STREAM_BITRATE,
+                 window=None, log=None):
+        self.folder = folder
+        self.order = [entry[0] for entry in plan]
+        self.store = store
+        self.chunk_seconds = chunk_seconds
+        self.bitrate = bitrate
+        self.window = window
+        self.log = log or print
+        self.stream_dir = os.path.join(folder, STREAM_DIRNAME)
+        self.playlist_path = os.path.join(self.stream_dir, PLAYLIST_FILENAME)
+        self.index_path = os.path.join(self.stream_dir, STREAM_INDEX_FILENAME)
+        self.failed = False
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1)  # 조각 번호/타임스탬프가 이어지도록 한 번에 하나씩
+
+        index = utils.load_json(self.index_path) if os.path.exists(self.index_path) else None
+        if not index or index.get('segments') != self.order[:len(index.get('segments', []))]:
+            # 일정표가 바뀐 폴더면 스트림을 처음부터 다시 만듦
+            shutil.rmtree(self.stream_dir, ignore_errors=True)
+            index = {'segments': [], 'chunks': [], 'finished': False}
+        os.makedirs(self.stream_dir, exist_ok=True)
+        self.index = index
+
+    @property
+    def seconds(self):
+        return sum(chunk['duration'] for chunk in self.index['chunks'])
+
+    def add(self, name):
+        """
+        세그먼트 name이 준비되었음을 알립니다 (WAV 또는 PCM 저장소에 기록된 뒤 호출).
+        """
+        with self._lock:
+            if self.failed or name in self.index['segments'] or name not in self.order:
+                return
+            self._pending.add(name)
+        self._executor.submit(self._flush)
+
+    def close(self):
+        """
+        남은 인코딩을 마칩니다. 일정표의 모든 세그먼트가 붙었으면 재생목록을 끝(ENDLIST) 처리합니다.
+
+        Returns:
+            bool: 스트림 완성 여부.
+        """
+        self._executor.shutdown(wait=True)
+        if not self.failed and len(self.index['segments']) == len(self.order) and not self.index['finished']:
+            self.index['finished'] = True
+            self._save()
+        return self.index['finished']
+
+    def _flush(self):
+        while True:
+            with self._lock:
+                position = len(self.index['segments'])
+                if self.failed or position >= len(self.order) or self.order[position] not in self._pending:
+                    return
+                name = self.order[position]
+                self._pending.discard(name)
+            try:
+                chunks = self._encode(name, len(self.index['chunks']), self.seconds)
+            except (OSError, subprocess.CalledProcessError) as e:
+                self.failed = True
+                self.log(f'❗ 스트림 조각 인코딩 실패 ({name}): {e}. 이후 세그먼트는 스트림에 붙이지 않습니다.')
+                return
+            with self._lock:
+                self.index['chunks'].extend(chunks)
+                self.index['segments'].append(name)
+                self._save()
+
+    def _encode(self, name, start_number, offset_seconds):
+        """
+        세그먼트 1개를 chunk_seconds 길이의 MPEG-TS(AAC) 조각으로 인코딩합니다.
+        타임스탬프는 앞 조각들에 이어지도록 offset_seconds만큼 밀어 둡니다.
+
+        Returns:
+            list: [{'file', 'duration', 'segment'}, ...]
+        """
+        list_path = os.path.join(self.stream_dir, '.segment_list.csv')
+        output = [
+            '-codec:a', 'aac', '-b:a', self.bitrate, '-output_ts_offset', f'{offset_seconds:.6f}',
+            '-f', 'segment', '-segment_time', str(self.chunk_seconds), '-segment_format', 'mpegts',
+            '-segment_start_number', str(start_number), '-segment_list', list_path, '-segment_list_type', 'csv',
+            os.path.join(self.stream_dir, CHUNK_FILENAME)
+        ]
+        if self.store is not None and name in self.store:
+            # PCM 저장소가 있으면 WAV 디코딩 없이 memmap 조각을 표준입력으로 흘려보냄
+            command = ['ffmpeg', '-y', '-loglevel', 'error', '-f', 'f32le', '-ar', str(self.store.sample_rate),
+                       '-ac', str(self.store.channels), '-i', 'pipe:0'] + output
+            process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            try:
+                for _, _, block in self.store.iter_blocks([name], 1 << 18):
+                    process.stdin.write(block.tobytes())
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+            _, stderr = process.communicate()
+            if process.returncode != 0:
+                raise subprocess.CalledProcessError(process.returncode, command, stderr=stderr)
+        else:
+            command = ['ffmpeg', '-y', '-loglevel', 'error', '-i', os.path.join(self.folder, name)] + output
+            subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+
+        chunks = []
+        with open(list_path, encoding='utf-8') as f:
+            for line in f:
+                filename, start, end = line.strip().split(',')[:3]
+                chunks.append({'file': filename, 'duration': round(float(end) - float(start), 6), 'segment': name})
+        os.remove(list_path)
+        return chunks
+
+    def _save(self):
+        utils.save_json(self.index, self.index_path, verbose=False)
+        write_playlist(self.playlist_path, self.index['chunks'], self.chunk_seconds, self.index['finished'],
+                       self.window)
+
+
+def write_playlist(playlist_path, chunks, chunk_seconds=CHUNK_SECONDS, finished=False, window=None):
+    """
+    조각 목록으로 m3u8 재생목록을 씁니다. 플레이어가 반쯤 쓴 파일을 읽지 않도록 임시 파일을 교체합니다.
+    """
+    visible = chunks[-window:] if window else chunks
+    target = math.ceil(max([chunk['duration'] for chunk in visible] + [chunk_seconds]))
+    lines = ['#EXTM3U', '#EXT-X-VERSION:3', f'#EXT-X-TARGETDURATION:{target}',
+             f'#EXT-X-MEDIA-SEQUENCE:{len(chunks) - len(visible)}']
+    if not window:
+        lines.append('#EXT-X-PLAYLIST-TYPE:EVENT')
+    for chunk in visible:
+        lines += [f"#EXTINF:{chunk['duration']:.3f},", chunk['file']]
+    if finished:
+        lines.append('#EXT-X-ENDLIST')
+
+    tmp_path = playlist_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(tmp_path, playlist_path)
+
+
+class StreamRequestHandler(SimpleHTTPRequestHandler):
+    """
+    stream 폴더를 그대로 내보내는 정적 파일 핸들러 (HLS MIME 타입, 재생목록 캐시 금지).
+    """
+
+    extensions_map = {**SimpleHTTPRequestHandler.extensions_map,
+                      '.m3u8': 'application/vnd.apple.mpegurl', '.ts': 'video/mp2t'}
+
+    def end_headers(self):
+        if self.path.split('?')[0].endswith('.m3u8'):
+            self.send_header('Cache-Control', 'no-cache')  # 새로 붙은 조각을 바로 보도록
+        self.send_header('Access-Control-Allow-Origin', '*')  # 다른 주소의 웹 플레이어(hls.js)에서 재생
+        super().end_headers()
+
+    def log_message(self, format, *args):
+        pass  # 조각 요청마다 stderr 로그를 남기지 않음
+
+
+def start_server(folder, host='127.0.0.1', port=DEFAULT_STREAM_PORT, log=None):
+    """
+    folder/stream/을 내보내는 HTTP 서버를 백그라운드 스레드에서 시작합니다.
+
+    Returns:
+        ThreadingHTTPServer: server.shutdown()으로 종료.
+    """
+    stream_dir = os.path.join(folder, STREAM_DIRNAME)
+    os.makedirs(stream_dir, exist_ok=True)
+    server = ThreadingHTTPServer((host, port), partial(StreamRequestHandler, directory=stream_dir))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    (log or print)(f'스트림 재생 주소: http://{host}:{server.server_address[1]}/{PLAYLIST_FILENAME}')
+    return server
+
+
+def wait_until_interrupted(*servers):
+    """
+    Ctrl+C까지 기다렸다가 서버(들)를 종료합니다.
+    """
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        print('스트림 서버를 종료합니다...')
+    finally:
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+
+
+def serve(folder, host='127.0.0.1', port=DEFAULT_STREAM_PORT):
+    """
+    스트림을 내보내며 Ctrl+C까지 기다립니다.
+    """
+    wait_until_interrupted(start_server(folder, host, port))
+
+
+def build_stream(folder, window=None):
+    """
+    이미 생성된 작업 폴더의 세그먼트로 스트림을 만들거나 이어서 붙입니다 (생성 중인 폴더에도 사용 가능).
+    """
+    from job_manifest import JobManifest
+    from pcm_store import PcmStore
+
+    manifest = JobManifest.load(folder)
+    plan = [entry for entry in (manifest.plan or []) if len(entry) > 2]
+    store = PcmStore(folder) if PcmStore.exists(folder) else None
+    stream = HlsStream(folder, plan, store=store, window=window)
+    for filename, _, _ in plan:
+        if manifest.is_task_done('generate', filename, os.path.join(folder, filename)):
+            stream.add(filename)
+    finished = stream.close()
+    print(f"조각 {len(stream.index['chunks'])}개 ({stream.seconds / 60:.1f}분), "
+          f"세그먼트 {len(stream.index['segments'])}/{len(plan)}개{' (완성)' if finished else ''}")
+    return finished
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='작업 폴더의 세그먼트를 HLS 스트림으로 내보내기')
+    parser.add_argument('folder', help='작업 폴더 (job_manifest.json이 있는 폴더)')
+    parser.add_argument('--build', action='store_true', help='생성된 세그먼트를 스트림 조각으로 이어 붙이기')
+    parser.add_argument('--serve', action='store_true', help='로컬 HTTP 서버로 스트림 내보내기')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_STREAM_PORT)
+    parser.add_argument('--window', type=int, default=None, help='라이브 재생목록에 남길 최근 조각 수')
+    args = parser.parse_args()
+
+    if args.build:
+        build_stream(args.folder, window=args.window)
+    if args.serve or not args.build:
+        serve(args.folder, args.host, args.port)
@@ -0,0 +1,177 @@
+import os
+import sys
+import hashlib
+import json
+
+# scripts 폴더(utils.py)를 임포트 경로에 추가
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+
+import utils
+
+MANIFEST_FILENAME = 'job_manifest.json'
+MANIFEST_VERSION = 1
+
+
+def _inputs_fingerprint(input_paths):
+    """
+    입력 파일 목록의 (경로, 크기, 수정 시각)으로 지문을 만듭니다.
+    입력이 바뀌면 지문이 달라지므로 이전 결과를 재사용하지 않습니다.
+    """
+    sha = hashlib.sha256()
+    for path in input_paths:
+        try:
+            stat = os.stat(path)
+            sha.update(f"{os.path.basename(path)}|{stat.st_size}|{int(stat.st_mtime)}\n".encode('utf-8'))
+        except OSError:
+            sha.update(f"{os.path.basename(path)}|missing\n".encode('utf-8'))
+    return sha.hexdigest()
+
+
+class JobManifest:
+    """
+    한 번의 수면 음악 생성 작업(저장 폴더 1개)의 진행 상황을 기록하는 매니페스트.
+
+    프롬프트, 시드, 구간 계획과 단계(generate, convert, concat_stage,
+    concat_final, video)별 작업 상태 및 출력 파일 해시를 job_manifest.json에
+    원자적으로 저장합니다. 프로그램이 중간에 종료되어도 완료된 작업은 건너뜁니다.
+    """
+
+    def __init__(self, folder, data):
+        self.folder = folder
+        self.path = os.path.join(folder, MANIFEST_FILENAME)
+        self.data = data
+
+    @classmethod
+    def load(cls, folder):
+        """
+        폴더의 기존 매니페스트를 로드합니다. 없으면 빈 매니페스트를 반환합니다.
+        """
+        path = os.path.join(folder, MANIFEST_FILENAME)
+        data = utils.load_json(path) if os.path.exists(path) else None
+        if not data or data.get('version') != MANIFEST_VERSION:
+            data = {'version': MANIFEST_VERSION, 'job': {}, 'stages': {}}
+        return cls(folder, data)
+
+    @classmethod
+    def load_or_create(cls, folder, prompt, seed, plan, rng_scheme=None):
+        """
+        같은 프롬프트와 구간 계획으로 시작된 매니페스트가 있으면 이어서 사용하고,
+        없거나 내용이 다르면 새 매니페스트를 만듭니다.
+
+        Args:
+            folder (str): 작업 저장 폴더.
+            prompt (str): MusicGen 프롬프트.
+            seed (int or None): 작업 시드. None이면 기존 시드를 재사용하거나 새로 만듭니다.
+            plan (list): [파일명, 구간명, 길이(초)] 목록 (stage_planner.schedule_to_plan).
+            rng_scheme (str): 새 매니페스트에 기록할 하위 시드 생성 방식 (rng.RNG_SCHEME).
+
+        Returns:
+            tuple: (JobManifest, 이어서 진행하는지 여부)
+        """
+        manifest = cls.load(folder)
+        job = manifest.data.get('job', {})
+        resumed = (job.get('prompt') == prompt and job.get('plan') == plan
+                   and (seed is None or job.get('seed') == seed))
+        if not resumed:
+            if seed is None:
+                seed = int.from_bytes(os.urandom(4), 'little') & 0x7fffffff
+            manifest.data = {
+                'version': MANIFEST_VERSION,
+                'job': {
+                    'prompt': prompt,
+                    'seed': seed,
+                    'plan': plan,
+                    'created_at': utils.get_current_timestamp(),
+                },
+                'stages': {},
+            }
+            if rng_scheme:
+                manifest.data['job']['rng'] = rng_scheme
+            manifest.save()
+        return manifest, resumed
+
+    @property
+    def seed(self):
+        return self.data.get('job', {}).get('seed')
+
+    @property
+    def plan(self):
+        return self.data.get('job', {}).get('plan', [])
+
+    @property
+    def rng_scheme(self):
+        return self.data.get('job', {}).get('rng')
+
+    def task(self, stage, key):
+        """
+        기록된 작업 정보(dict)를 반환합니다. 없으면 None.
+        """
+        return self.data['stages'].get(stage, {}).get(key)
+
+    def save(self):
+        utils.save_json(self.data, self.path, verbose=False)
+
+    def is_task_done(self, stage, key, output_path, inputs=None, verify_hash=True):
+        """
+        단계 내 개별 작업(예: 세그먼트 1개 생성)이 이미 완료되었는지 확인합니다.
+
+        출력 파일이 존재하고, 기록된 해시(verify_hash=True일 때)와
+        입력 지문(inputs가 주어졌을 때)이 일치해야 완료로 봅니다.
+        """
+        task = self.data['stages'].get(stage, {}).get(key)
+        if not task or task.get('status') != 'done':
+            return False
+        if not os.path.exists(output_path):
+            return False
+        if os.path.getsize(output_path) != task.get('size'):
+            return False
+        if inputs is not None and task.get('inputs') != _inputs_fingerprint(inputs):
+            return False
+        if verify_hash and utils.get_file_sha256(output_path) != task.get('sha256'):
+            return False
+        return True
+
+    def mark_task_done(self, stage, key, output_path, inputs=None, details=None):
+        """
+        작업 완료를 기록하고 매니페스트를 즉시 저장합니다.
+        details(dict)는 작업 기록에 함께 남깁니다 (예: 세그먼트 시드, 길이, 모델).
+        """
+        task = {
+            'status': 'done',
+            'output': os.path.basename(output_path),
+            'size': os.path.getsize(output_path),
+            'sha256': utils.get_file_sha256(output_path),
+            'finished_at': utils.get_current_timestamp(),
+        }
+        if inputs is not None:
+            task['inputs'] = _inputs_fingerprint(inputs)
+        if details:
+            task.update(details)
+        self.data['stages'].setdefault(stage, {})[key] = task
+        self.save()
+
+    def summary(self):
+        """
+        단계별 완료 작업 수를 반환합니다.
+        """
+        return {stage: sum(1 for t in tasks.values() if t.get('status') == 'done')
+                for stage, tasks in self.data['stages'].items()}
+
+
+if __name__ == '__main__':
+    # --- 간단한 동작 확인 ---
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        plan = [['001_SleepOnset.wav', 'SleepOnset'], ['002_NREM1.wav', 'NREM1']]
+        manifest, resumed = JobManifest.load_or_create(tmp_dir, 'calm piano', None, plan)
+        print(f"새 매니페스트 생성: resumed={resumed}, seed={manifest.seed}")
+
+        out_path = os.path.join(tmp_dir, plan[0][0])
+        with open(out_path, 'wb') as f:
+            f.write(b'RIFF-test')
+        manifest.mark_task_done('generate', plan[0][0], out_path)
+
+        manifest, resumed = JobManifest.load_or_create(tmp_dir, 'calm piano', None, plan)
+        print(f"재시작 후: resumed={resumed}, 완료 여부={manifest.is_task_done('generate', plan[0][0], out_path)}")
+        print(json.dumps(manifest.summary(), ensure_ascii=False))
@@ -0,0 +1,493 @@
+import os
+import sys
+import json
+import heapq
+import uuid
+import argparse
+import threading
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# scripts 폴더(utils.py)를 임포트 경로에 추가
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+
+import utils
+from job_manifest import JobManifest
+from model_loader import load_musicgen
+from segment_cache import SegmentCache
+from pipeline import SleepMusicPipeline, PIPELINE_STAGES, produce_segment, segment_details, segment_seed
+from rng import RNG_SCHEME
+from stage_planner import build_schedule, schedule_to_plan, stage_options_from
+
+# 작업 상태
+TERMINAL_STATUSES = ('done', 'failed', 'cancelled')
+MAX_JOB_EVENTS = 200  # 작업마다 메모리에 남길 최근 이벤트 수 (끝난 작업은 마지막 이벤트만 남김)
+
+
+class JobQueueService:
+    """
+    로컬 작업 큐 서비스.
+
+    작업은 queue_dir/jobs/<job_id>.json 으로 디스크에 저장되므로 서비스가 재시작되어도
+    이어서 처리됩니다. 워커 N개가 각자 MusicGen 모델을 미리 로딩해 두고(warm pool),
+    여러 작업의 세그먼트를 우선순위 순으로 나눠 생성합니다. 세그먼트 생성이 끝난 작업은
+    후처리 스레드에서 나머지 단계(검사/정규화/검증/변환/이어붙이기/영상)를 실행합니다.
+
+    Args:
+        queue_dir (str): 작업 큐 저장 폴더.
+        num_workers (int): 동시에 띄울 모델(워커) 수.
+        model_factory (callable): 워커마다 호출되어 모델을 반환하는 함수 (기본값: load_musicgen).
+        log (callable): 서비스 로그 함수 (기본값: print).
+        model_size (str): 워커 모델 크기 ('small', 'medium').
+        segment_seconds (int): 세그먼트 1개 길이(초). 모든 작업이 같은 모델을 공유하므로 서비스 단위로 고정됩니다.
+        precision (str): CPU 추론 정밀도 ('fp32', 'bf16', 'int8').
+        segment_cache (SegmentCache): 작업들이 함께 쓰는 세그먼트 캐시 (None이면 사용 안 함).
+    """
+
+    def __init__(self, queue_dir, num_workers=1, model_factory=None, log=None,
+                 model_size='medium', segment_seconds=120, precision='fp32', segment_cache=None):
+        self.queue_dir = queue_dir
+        self.jobs_dir = os.path.join(queue_dir, 'jobs')
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        self.num_workers = num_workers
+        self.model_size = model_size
+        self.segment_seconds = segment_seconds
+        self.precision = precision
+        self.model_id = f'{model_size}-{precision}'
+        self.segment_cache = segment_cache
+        self.model_factory = model_factory or (
+            lambda: load_musicgen(model_size, duration=segment_seconds, precision=precision, log=self.log))
+        self.log = log or print
+
+        self._lock = threading.Lock()
+        self._task_ready = threading.Condition(self._lock)
+        self._tasks = []         # (-priority, 제출 순번, 세그먼트 번호, job_id, 파일명, 구간명, 길이(초))
+        self._jobs = {}          # job_id -> 작업 레코드 (디스크와 동일)
+        self._manifests = {}     # job_id -> JobManifest
+        self._pending = {}       # job_id -> 남은 세그먼트 수
+        self._models = []        # 로딩을 마친 워커 모델 (후처리의 세그먼트 재생성도 함께 사용)
+        self._live_workers = 0   # 모델 로딩 중이거나 로딩을 마친 워커 수
+        self._worker_error = None  # 모든 워커가 모델 로딩에 실패했을 때의 오류 메시지
+        self._events = {}        # job_id -> 최근 이벤트 목록
+        self._events_dropped = {}  # job_id -> 앞에서 버린 이벤트 수 (since 번호는 버린 이벤트까지 셈)
+        self._events_changed = threading.Condition()
+        self._postprocess_queue = []
+        self._postprocess_ready = threading.Condition()
+        self._threads = []
+        self._stopping = False
+
+    # --- 작업 관리 ---
+    def submit(self, spec):
+        """
+        작업을 큐에 추가합니다.
+
+        Args:
+            spec (dict): prompt, output_folder, duration_hours, background_image, stages,
+                priority(클수록 먼저), seed, 구간 설계 옵션(cycle_minutes, onset_minutes,
+                wake_minutes, rem_ratio) 키를 가진 작업 설정.
+
+        Returns:
+            str: 작업 ID.
+
+        Raises:
+            ValueError: 필수 키가 없거나 길이/구간 설계 옵션이 올바르지 않은 경우 (저장하기 전에 확인).
+        """
+        if not spec.get('prompt') or not spec.get('output_folder'):
+            raise ValueError('prompt와 output_folder는 필수입니다.')
+        self._job_plan(spec)  # 잘못된 작업이 디스크에 남아 재시작 때 복구를 막지 않도록 먼저 검증
+
+        job_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            seq = max((job['seq'] for job in self._jobs.values()), default=0) + 1
+        job = {
+            'id': job_id,
+            'seq': seq,
+            'spec': spec,
+            'priority': int(spec.get('priority', 0)),
+            'status': 'queued',
+            'submitted_at': utils.get_current_timestamp(),
+            'done_segments': 0,
+            'total_segments': 0,
+            'error': None,
+        }
+        self._save_job(job)
+        self._enqueue_job(job)
+        return job_id
+
+    def cancel(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job['status'] in TERMINAL_STATUSES:
+                return False
+            job['status'] = 'cancelled'
+            self._tasks = [task for task in self._tasks if task[3] != job_id]
+            heapq.heapify(self._tasks)
+            self._save_job(job)
+        self._emit(job_id, 'cancelled', '작업이 취소되었습니다.')
+        return True
+
+    def get_job(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def list_jobs(self):
+        with self._lock:
+            return sorted((dict(job) for job in self._jobs.values()), key=lambda job: job['seq'])
+
+    def events(self, job_id, since=0, timeout=30.0):
+        """
+        since 번째 이후의 진행 이벤트를 차례로 돌려주는 제너레이터.
+        작업이 끝나거나 timeout 동안 새 이벤트가 없으면 종료합니다.
+        """
+        index = since
+        while True:
+            with self._events_changed:
+                events = self._events.get(job_id, [])
+                dropped = self._events_dropped.get(job_id, 0)
+                index = max(index, dropped)  # 이미 버린 이벤트는 건너뜀
+                if index >= dropped + len(events):
+                    if not events or events[-1]['type'] in TERMINAL_STATUSES:
+                        return
+                    if not self._events_changed.wait(timeout):
+                        return
+                    continue
+                new_events = events[index - dropped:]
+            for event in new_events:
+                yield event
+            index += len(new_events)
+
+    # --- 서비스 시작/종료 ---
+    def start(self):
+        """
+        디스크의 미완료 작업을 복구하고 워커/후처리 스레드를 시작합니다.
+        """
+        for filename in sorted(os.listdir(self.jobs_dir)):
+            if not filename.endswith('.json'):
+                continue
+            job = utils.load_json(os.path.join(self.jobs_dir, filename))
+            if not job:
+                continue
+            if job['status'] in TERMINAL_STATUSES:
+                with self._lock:
+                    self._jobs[job['id']] = job
+                continue
+            self.log(f"이전 작업 복구: {job['id']} ({job['status']})")
+            try:
+                self._enqueue_job(job)
+            except Exception as e:
+                # 복구할 수 없는 작업 하나 때문에 서비스 전체가 시작되지 못하는 일이 없도록 실패 처리
+                self.log(f"❗ 작업 {job['id']} 복구 실패: {e}")
+                job.update(status='failed', error=f'복구 실패: {e}')
+                with self._lock:
+                    self._jobs[job['id']] = job
+                    self._save_job(job)
+
+        self._live_workers = self.num_workers
+        for idx in range(self.num_workers):
+            thread = threading.Thread(target=self._worker_loop, args=(idx,), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._postprocess_loop, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def stop(self):
+        self._stopping = True
+        with self._task_ready:
+            self._task_ready.notify_all()
+        with self._postprocess_ready:
+            self._postprocess_ready.notify_all()
+
+    # --- 내부 구현 ---
+    def _save_job(self, job):
+        utils.save_json(job, os.path.join(self.jobs_dir, f"{job['id']}.json"), verbose=False)
+
+    def _emit(self, job_id, event_type, message, **extra):
+        event = {'type': event_type, 'message': message, 'time': utils.get_current_timestamp('%H:%M:%S')}
+        event.update(extra)
+        with self._events_changed:
+            events = self._events.setdefault(job_id, [])
+            events.append(event)
+            # 서비스가 오래 떠 있어도 이벤트가 쌓이지 않도록 끝난 작업은 마지막 이벤트만, 나머지는 최근 것만 남김
+            drop = len(events) - (1 if event_type in TERMINAL_STATUSES else MAX_JOB_EVENTS)
+            if drop > 0:
+                del events[:drop]
+                self._events_dropped[job_id] = self._events_dropped.get(job_id, 0) + drop
+            self._events_changed.notify_all()
+
+    def _job_plan(self, spec):
+        """
+        작업 설정으로 세그먼트 계획([파일명, 구간명, 초] 목록)을 만듭니다. 잘못된 값은 ValueError.
+        """
+        try:
+            schedule = build_schedule(float(spec.get('duration_hours', 8)) * 60, self.segment_seconds,
+                                      **stage_options_from(spec))
+        except TypeError as e:
+            raise ValueError(f'작업 설정이 올바르지 않습니다: {e}')
+        return schedule_to_plan(schedule)
+
+    def _enqueue_job(self, job):
+        spec = job['spec']
+        plan = self._job_plan(spec)
+        folder = spec['output_folder']
+        os.makedirs(folder, exist_ok=True)
+        manifest, _ = JobManifest.load_or_create(folder, spec['prompt'].strip(), spec.get('seed'), plan,
+                                                 rng_scheme=RNG_SCHEME)
+
+        pending = []
+        for counter, (filename, section, seconds) in enumerate(plan, start=1):
+            if not manifest.is_task_done('generate', filename, os.path.join(folder, filename)):
+                pending.append((-job['priority'], job['seq'], counter, job['id'], filename, section, seconds))
+
+        with self._lock:
+            job['total_segments'] = len(plan)
+            job['done_segments'] = len(plan) - len(pending)
+            job['status'] = 'running' if pending else 'postprocessing'
+            self._jobs[job['id']] = job
+            self._manifests[job['id']] = manifest
+            self._pending[job['id']] = len(pending)
+            for task in pending:
+                heapq.heappush(self._tasks, task)
+            self._task_ready.notify_all()
+            self._save_job(job)
+        self._emit(job['id'], 'queued', f"세그먼트 {len(pending)}/{len(plan)}개 대기 중", priority=job['priority'])
+
+        if not pending:
+            self._schedule_postprocess(job['id'])
+        elif self._worker_error:
+            self._fail_job(job['id'], self._worker_error)
+
+    def _next_task(self):
+        with self._task_ready:
+            while not self._tasks and not self._stopping:
+                self._task_ready.wait()
+            if self._stopping:
+                return None
+            return heapq.heappop(self._tasks)
+
+    def _worker_loop(self, worker_idx):
+        self.log(f"[worker {worker_idx}] 모델 로딩 중...")
+        try:
+            model = self.model_factory()
+        except Exception as e:
+            traceback.print_exc()
+            self._worker_failed(worker_idx, e)
+            return
+        with self._lock:
+            self._models.append(model)
+        self.log(f"[worker {worker_idx}] 모델 준비 완료.")
+
+        while True:
+            task = self._next_task()
+            if task is None:
+                return
+            _, _, counter, job_id, filename, section, seconds = task
+            with self._lock:
+                job = self._jobs[job_id]
+                manifest = self._manifests[job_id]
+                if job['status'] != 'running':
+                    continue
+            filepath = os.path.join(job['spec']['output_folder'], filename)
+
+            seed = segment_seed(manifest, counter)
+            try:
+                source, cache_key = produce_segment(lambda: model, job['spec']['prompt'].strip(), filepath, section,
+                                                    seed, self.model_id, seconds, cache=self.segment_cache,
+                                                    reuse_stages=job['spec'].get('reuse_stages', ()),
+                                                    job_id=manifest.seed)
+            except Exception as e:
+                traceback.print_exc()
+                self._fail_job(job_id, f"{filename} 생성 실패: {e}")
+                continue
+
+            with self._lock:
+                manifest.mark_task_done('generate', filename, filepath,
+                                        details=segment_details(seed, seconds, self.model_id, source, cache_key))
+                job['done_segments'] += 1
+                self._pending[job_id] -= 1
+                finished = self._pending[job_id] == 0 and job['status'] == 'running'
+                if finished:
+                    job['status'] = 'postprocessing'
+                self._save_job(job)
+            self._emit(job_id, 'segment', f"[worker {worker_idx}] {filename} 생성 완료",
+                       done=job['done_segments'], total=job['total_segments'])
+            if finished:
+                if self.segment_cache is not None:
+                    self.segment_cache.flush()  # 세그먼트마다 쓰지 않고 작업의 생성이 끝날 때 기록
+                self._schedule_postprocess(job_id)
+
+    def _worker_failed(self, worker_idx, error):
+        """
+        워커의 모델 로딩이 실패했을 때 호출됩니다. 남은 워커가 없으면 대기/진행 중인 작업을
+        모두 실패 처리해, 세그먼트가 영원히 'queued'로 남지 않게 합니다.
+        """
+        message = f"모델 로딩 실패: {error}"
+        self.log(f"❗ [worker {worker_idx}] {message}")
+        with self._lock:
+            self._live_workers -= 1
+            if self._live_workers > 0:
+                return
+            self._worker_error = message
+            job_ids = [job_id for job_id, job in self._jobs.items() if job['status'] == 'running']
+        for job_id in job_ids:
+            self._fail_job(job_id, message)
+
+    def _warm_model(self):
+        """
+        후처리(검사 단계의 세그먼트 재생성)용 모델. 워커가 미리 로딩한 모델을 함께 쓰고,
+        아직 준비된 워커 모델이 없을 때만 서비스 설정으로 새로 로딩합니다.
+        """
+        with self._lock:
+            if self._models:
+                return self._models[0]
+        model = self.model_factory()
+        with self._lock:
+            self._models.append(model)
+        return model
+
+    def _fail_job(self, job_id, message):
+        with self._lock:
+            job = self._jobs[job_id]
+            job['status'] = 'failed'
+            job['error'] = message
+            self._tasks = [task for task in self._tasks if task[3] != job_id]
+            heapq.heapify(self._tasks)
+            self._save_job(job)
+        self._emit(job_id, 'failed', message)
+
+    def _schedule_postprocess(self, job_id):
+        with self._postprocess_ready:
+            self._postprocess_queue.append(job_id)
+            self._postprocess_ready.notify_all()
+
+    def _postprocess_loop(self):
+        while True:
+            with self._postprocess_ready:
+                while not self._postprocess_queue and not self._stopping:
+                    self._postprocess_ready.wait()
+                if self._stopping:
+                    return
+                job_id = self._postprocess_queue.pop(0)
+
+            job = self.get_job(job_id)
+            stages = [stage for stage in (job['spec'].get('stages') or PIPELINE_STAGES) if stage != 'generate']
+            if not job['spec'].get('background_image') and 'video' in stages:
+                stages.remove('video')
+
+            pipeline = SleepMusicPipeline(log=lambda message, job_id=job_id: self._emit(job_id, 'log', message),
+                                          model_size=self.model_size, segment_seconds=self.segment_seconds,
+                                          precision=self.precision, segment_cache=self.segment_cache,
+                                          reuse_stages=job['spec'].get('reuse_stages', ()))
+            pipeline.load_model = self._warm_model  # 검사 단계의 재생성도 워커 모델 사용
+            ok = stages == [] or pipeline.run(job['spec'], stages=stages)
+            if not ok:
+                self._fail_job(job_id, '후처리 단계 실패')
+                continue
+            with self._lock:
+                self._jobs[job_id]['status'] = 'done'
+                self._save_job(self._jobs[job_id])
+            self._emit(job_id, 'done', '✅ 작업 완료')
+
+
+def make_request_handler(service):
+    """
+    JobQueueService에 연결된 HTTP 요청 핸들러 클래스를 만듭니다.
+
+    API:
+        POST /jobs                  작업 제출 (JSON 본문) → {"job_id": ...}
+        GET  /jobs                  작업 목록
+        GET  /jobs/<id>             작업 상태
+        POST /jobs/<id>/cancel      작업 취소
+        GET  /jobs/<id>/events      진행 이벤트 스트림 (줄 단위 JSON, ?since=N)
+    """
+
+    class JobRequestHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status, data):
+            body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            parts = [part for part in url.path.split('/') if part]
+            if parts == ['jobs']:
+                return self._send_json(200, service.list_jobs())
+            if len(parts) == 2 and parts[0] == 'jobs':
+                job = service.get_job(parts[1])
+                return self._send_json(200, job) if job else self._send_json(404, {'error': 'not found'})
+            if len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'events':
+                if service.get_job(parts[1]) is None:
+                    return self._send_json(404, {'error': 'not found'})
+                since = int(parse_qs(url.query).get('since', ['0'])[0])
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-ndjson; charset=utf-8')
+                self.end_headers()
+                try:
+                    for event in service.events(parts[1], since=since):
+                        self.wfile.write((json.dumps(event, ensure_ascii=False) + '\n').encode('utf-8'))
+                        self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                return
+            self._send_json(404, {'error': 'not found'})
+
+        def do_POST(self):
+            parts = [part for part in urlparse(self.path).path.split('/') if part]
+            if parts == ['jobs']:
+                try:
+                    length = int(self.headers.get('Content-Length', 0))
+                    spec = json.loads(self.rfile.read(length).decode('utf-8'))
+                    job_id = service.submit(spec)
+                except (ValueError, json.JSONDecodeError) as e:
+                    return self._send_json(400, {'error': str(e)})
+                return self._send_json(201, {'job_id': job_id})
+            if len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'cancel':
+                return self._send_json(200, {'cancelled': service.cancel(parts[1])})
+            self._send_json(404, {'error': 'not found'})
+
+        def log_message(self, format, *args):
+            pass  # 요청마다 stderr 로그를 남기지 않음
+
+    return JobRequestHandler
+
+
+def serve(queue_dir, num_workers=1, host='127.0.0.1', port=8765, model_factory=None, **model_options):
+    """
+    작업 큐 서비스를 시작하고 localhost HTTP API로 요청을 받습니다 (Ctrl+C로 종료).
+    """
+    service = JobQueueService(queue_dir, num_workers=num_workers, model_factory=model_factory, **model_options)
+    service.start()
+    server = ThreadingHTTPServer((host, port), make_request_handler(service))
+    print(f"작업 큐 서비스 시작: http://{host}:{port} (워커 {num_workers}개, 큐 폴더 {queue_dir})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("서비스를 종료합니다...")
+    finally:
+        service.stop()
+        server.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='수면 음악 작업 큐 서비스')
+    parser.add_argument('--queue-dir', default='./job_queue', help='작업 큐 저장 폴더')
+    parser.add_argument('--workers', type=int, default=1, help='미리 로딩할 모델(워커) 수')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--model-size', default='medium', choices=['small', 'medium'])
+    parser.add_argument('--precision', default='fp32', choices=['fp32', 'bf16', 'int8'])
+    parser.add_argument('--segment-seconds', type=int, default=120)
+    parser.add_argument('--segment-cache-dir', default=None, help='세그먼트 캐시 폴더 (지정 시 캐시 사용)')
+    parser.add_argument('--segment-cache-max-gb', type=float, default=20.0)
+    args = parser.parse_args()
+    segment_cache = None
+    if args.segment_cache_dir:
+        segment_cache = SegmentCache(args.segment_cache_dir, max_bytes=int(args.segment_cache_max_gb * 1024 ** 3))
+    serve(args.queue_dir, num_workers=args.workers, host=args.host, port=args.port,
+          model_size=args.model_size, precision=args.precision, segment_seconds=args.segment_seconds,
+          segment_cache=segment_cache)
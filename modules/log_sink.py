@@ -0,0 +1,162 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+
+DEFAULT_LOG_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'sleep_music_generator', 'logs')
+LOG_FILENAME = 'sleepgen.log'
+MAX_STAGE_TIMINGS = 1000  # 메모리에 남길 최근 단계 기록 수
+
+
+class LogSink:
+    """
+    여러 스레드에서 들어오는 로그/진행률을 모아 두었다가 UI가 주기적으로 가져가게 하는 수집기.
+
+    - 로그는 최대 buffer_size개만 보관하는 링 버퍼에 쌓이고, 넘치면 오래된 것부터 버려집니다
+      (버려진 개수는 drain 때 알려줌). 몇 시간짜리 작업도 메모리 사용량이 일정합니다.
+    - 진행률은 마지막 값만 유지합니다 (UI 갱신 횟수를 타이머 주기로 제한).
+    - 모든 로그는 회전 로그 파일(log_dir/sleepgen.log)에도 기록됩니다.
+    - stage()로 감싼 단계의 소요 시간을 구조화된 기록으로 남깁니다 (최근 max_timings개).
+
+    Qt와 무관하므로 GUI는 QTimer로 drain()을 호출해 한 번에 반영하면 됩니다.
+
+    Args:
+        buffer_size (int): 화면 반영 전까지 보관할 최대 로그 수.
+        log_dir (str): 로그 파일 폴더 (기본값: ~/.cache/sleep_music_generator/logs, None이면 기본값,
+            False면 파일 기록 안 함).
+        max_bytes (int): 로그 파일 하나의 최대 크기.
+        backup_count (int): 보관할 이전 로그 파일 수.
+        echo (bool): 콘솔(print)에도 출력할지 여부.
+        max_timings (int): 보관할 최근 단계 기록 수.
+    """
+
+    def __init__(self, buffer_size=500, log_dir=None, max_bytes=5 * 1024 ** 2, backup_count=3, echo=False,
+                 max_timings=MAX_STAGE_TIMINGS):
+        self._lock = threading.Lock()
+        self._buffer = deque(maxlen=buffer_size)
+        self._dropped = 0
+        self._progress = None
+        self._timings = deque(maxlen=max_timings)
+        self.echo = echo
+
+        self.logger = None
+        self.log_path = None  # 파일 기록을 끄면 None
+        if log_dir is not False:
+            log_dir = log_dir or DEFAULT_LOG_DIR
+            os.makedirs(log_dir, exist_ok=True)
+            self.log_path = os.path.join(log_dir, LOG_FILENAME)
+            self.logger = logging.getLogger(f'sleepgen.{id(self)}')
+            self.logger.setLevel(logging.INFO)
+            self.logger.propagate = False
+            handler = RotatingFileHandler(self.log_path, maxBytes=max_bytes, backupCount=backup_count,
+                                          encoding='utf-8')
+            handler.setFormatter(logging.Formatter('%(asctime)s %(threadName)s %(message)s'))
+            self.logger.addHandler(handler)
+
+    def log(self, message):
+        """
+        로그 1줄을 추가합니다. 어느 스레드에서 호출해도 안전하며 UI를 막지 않습니다.
+        """
+        line = f"{time.strftime('%H:%M:%S')} {message}"
+        with self._lock:
+            if len(self._buffer) == self._buffer.maxlen:
+                self._dropped += 1
+            self._buffer.append(line)
+        if self.logger is not None:
+            self.logger.info(message)
+        if self.echo:
+            print(message)
+
+    def progress(self, value):
+        """
+        진행률(0~100)을 갱신합니다. 다음 drain 때 마지막 값만 반영됩니다.
+        """
+        with self._lock:
+            self._progress = value
+
+    def drain(self):
+        """
+        쌓인 로그와 최신 진행률을 꺼냅니다.
+
+        Returns:
+            tuple: (로그 줄 목록, 버려진 로그 수, 진행률 또는 변화 없으면 None)
+        """
+        with self._lock:
+            lines = list(self._buffer)
+            self._buffer.clear()
+            dropped, self._dropped = self._dropped, 0
+            progress, self._progress = self._progress, None
+        return lines, dropped, progress
+
+    @contextmanager
+    def stage(self, name, **info):
+        """
+        with 블록의 소요 시간을 단계별 기록으로 남깁니다.
+
+        Args:
+            name (str): 단계 이름 (예: 'generate', 'convert').
+            **info: 기록에 함께 남길 값 (폴더 등).
+        """
+        record = {'stage': name, 'started_at': time.strftime('%Y-%m-%d %H:%M:%S'), 'status': 'running'}
+        record.update(info)
+        with self._lock:
+            self._timings.append(record)
+        start = time.perf_counter()
+        try:
+            yield record
+            if record['status'] == 'running':  # 블록 안에서 'failed' 등으로 바꿀 수 있음
+                record['status'] = 'done'
+        except Exception as e:
+            record['status'] = 'error'
+            record['error'] = str(e)
+            raise
+        finally:
+            record['seconds'] = round(time.perf_counter() - start, 2)
+            self.log(f"⏱ {name} 단계 {record['seconds']}초 ({record['status']})")
+
+    def stage_timings(self):
+        """
+        지금까지 기록된 단계별 소요 시간 목록의 복사본을 반환합니다.
+        """
+        with self._lock:
+            return [dict(record) for record in self._timings]
+
+    def close(self):
+        """
+        로그 파일을 닫고 이 수집기의 logger를 logging 등록부에서 지웁니다 (닫은 뒤에는 메모리에만 기록).
+        """
+        if self.logger is not None:
+            for handler in list(self.logger.handlers):
+                handler.close()
+                self.logger.removeHandler(handler)
+            logging.Logger.manager.loggerDict.pop(self.logger.name, None)
+            self.logger = None
+
+
+if __name__ == '__main__':
+    # --- 간단한 동작 확인 ---
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        sink = LogSink(buffer_size=100, log_dir=tmp_dir, max_bytes=64 * 1024)
+
+        def worker(idx):
+            for step in range(5000):
+                sink.log(f"[worker {idx}] step {step}")
+                sink.progress(step * 100 // 5000)
+
+        with sink.stage('generate', folder=tmp_dir):
+            threads = [threading.Thread(target=worker, args=(idx,)) for idx in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        lines, dropped, progress = sink.drain()
+        print(f"버퍼 {len(lines)}줄, 버려진 로그 {dropped}줄, 진행률 {progress}")
+        print(f"로그 파일: {sorted(os.listdir(tmp_dir))}")
+        print(f"단계 기록: {sink.stage_timings()}")
+        sink.close()
@@ -0,0 +1,226 @@
+import numpy as np
+
+
+def _mono(audio):
+    return audio.mean(axis=1) if audio.ndim == 2 else audio
+
+
+def snap_to_zero_crossing(signal, index, search=256):
+    """
+    index 근처(±search)에서 음→양으로 지나는 영점(zero-crossing)으로 위치를 맞춥니다.
+    """
+    lo = max(1, index - search)
+    hi = min(len(signal) - 1, index + search)
+    window = signal[lo - 1:hi]
+    crossings = np.nonzero((window[:-1] < 0) & (window[1:] >= 0))[0] + lo
+    if len(crossings) == 0:
+        return index
+    return int(crossings[np.argmin(np.abs(crossings - index))])
+
+
+def find_loop_points(audio, sample_rate, template_seconds=0.5, min_loop_ratio=0.7, start_seconds=1.0):
+    """
+    클립 안에서 자연스럽게 반복할 수 있는 구간 [loop_start, loop_end)를 찾습니다.
+
+    시작 부분의 짧은 템플릿과 가장 비슷한 위치를 클립 끝부분에서 정규화 상호상관(FFT)으로
+    찾고, 양쪽을 영점(zero-crossing)에 맞춰 이음매의 클릭 잡음을 줄입니다.
+
+    Args:
+        audio (np.ndarray): [frames] 또는 [frames, channels] 오디오.
+        sample_rate (int): 샘플레이트.
+        template_seconds (float): 비교 템플릿 길이(초).
+        min_loop_ratio (float): 루프 길이의 최소 비율 (클립 길이 대비).
+        start_seconds (float): 클립 앞부분의 페이드인 등을 피하기 위한 시작 여유(초).
+
+    Returns:
+        tuple: (loop_start, loop_end, 유사도 0~1)
+    """
+    signal = _mono(audio).astype(np.float64)
+    length = len(signal)
+    template_len = int(template_seconds * sample_rate)
+    loop_start = min(int(start_seconds * sample_rate), max(0, length - template_len * 2))
+    loop_start = snap_to_zero_crossing(signal, loop_start)
+
+    search_from = loop_start + int((length - loop_start) * min_loop_ratio)
+    search_to = length - template_len
+    if template_len <= 0 or search_to <= search_from:
+        return 0, length, 0.0
+
+    template = signal[loop_start:loop_start + template_len]
+    template = template - template.mean()
+    region = signal[search_from:search_to + template_len]
+
+    # 상호상관 (FFT)
+    n_fft = 1 << int(np.ceil(np.log2(len(region) + template_len)))
+    correlation = np.fft.irfft(np.fft.rfft(region, n_fft) * np.conj(np.fft.rfft(template, n_fft)), n_fft)
+    correlation = correlation[:len(region) - template_len + 1]
+
+    # 구간별 에너지로 정규화
+    cumsum = np.concatenate([[0.0], np.cumsum(region ** 2)])
+    cumsum_mean = np.concatenate([[0.0], np.cumsum(region)])
+    window_energy = (cumsum[template_len:] - cumsum[:-template_len]
+                     - (cumsum_mean[template_len:] - cumsum_mean[:-template_len]) ** 2 / template_len)
+    norm = np.sqrt(np.maximum(window_energy, 1e-12) * max(np.sum(template ** 2), 1e-12))
+    score = correlation / norm
+
+    best = int(np.argmax(score))
+    loop_end = snap_to_zero_crossing(signal, search_from + best)
+    return loop_start, loop_end, float(np.clip(score[best], 0.0, 1.0))
+
+
+def vary_clip(audio, rng, max_cents=15.0, max_tilt_db=2.0, periodic=False):
+    """
+    반복이 귀에 띄지 않도록 클립에 작은 음높이/EQ 변화를 줍니다.
+
+    - 음높이: ±max_cents 센트 재샘플링 (길이도 같은 비율로 조금 변함)
+    - EQ: 저역/고역 사이 ±max_tilt_db dB 기울기 (주파수 영역)
+
+    periodic이면 클립을 루프(끝 다음이 처음)로 보고 순환 보간/순환 FFT로 처리하므로,
+    결과를 이어 붙여 반복해도 이음매가 끊기지 않습니다.
+    """
+    audio = audio if audio.ndim == 2 else audio[:, None]
+    cents = rng.uniform(-max_cents, max_cents)
+    ratio = 2.0 ** (cents / 1200.0)
+    frames = len(audio)
+    new_frames = int(frames / ratio)
+    if periodic:
+        ratio = frames / new_frames  # 한 바퀴가 정확히 new_frames가 되도록 (이음매에서 위상이 어긋나지 않음)
+    positions = np.arange(new_frames) * ratio
+    period = frames if periodic else None
+    varied = np.stack([np.interp(positions, np.arange(frames), audio[:, ch], period=period)
+                       for ch in range(audio.shape[1])], axis=1)
+
+    tilt_db = rng.uniform(-max_tilt_db, max_tilt_db)
+    if periodic:
+        n_fft = new_frames  # 순환 필터링 (패딩하면 끝과 처음 사이가 어긋남)
+    else:
+        n_fft = 1 << int(np.ceil(np.log2(len(varied))))  # 2의 거듭제곱 길이로 FFT (임의 길이보다 훨씬 빠름)
+    spectrum = np.fft.rfft(varied, n=n_fft, axis=0)
+    freqs = np.linspace(0.0, 1.0, spectrum.shape[0])
+    gain = 10.0 ** ((tilt_db * (freqs - 0.5)) / 20.0)
+    varied = np.fft.irfft(spectrum * gain[:, None], n=n_fft, axis=0)[:new_frames]
+    return varied.astype(np.float32)
+
+
+def tile_stage(clips, sample_rate, total_frames, rng, crossfade_seconds=4.0, vary=True, loop_repeats=(2, 4)):
+    """
+    클립 풀을 무작위 순서로 이어 붙여 total_frames 길이의 오디오를 블록 단위로 만들어 냅니다.
+
+    각 클립은 find_loop_points로 루프 구간만 잘라 둡니다. 고른 클립은 한 번 변화(vary_clip)를 준 뒤
+    루프 지점에서 제자리 반복(loop_repeats회, 이음매 없이 그대로 이어짐)하고, 다른 클립으로 넘어갈 때만
+    equal-power 크로스페이드로 연결합니다. 바로 앞과 같은 클립으로는 넘어가지 않습니다.
+    전체를 메모리에 만들지 않으므로 몇 시간 길이도 일정한 메모리로 생성됩니다.
+
+    Args:
+        clips (list): [frames, channels] float32 클립 목록.
+        sample_rate (int): 샘플레이트.
+        total_frames (int): 만들 전체 길이(프레임).
+        rng (np.random.Generator): 순서/변화용 난수 생성기 (같은 시드면 같은 결과).
+        crossfade_seconds (float): 클립 사이 크로스페이드 길이(초).
+        vary (bool): 음높이/EQ 미세 변화 적용 여부 (반복 묶음마다 한 번).
+        loop_repeats (tuple): 클립 하나를 연속으로 반복하는 횟수 범위 (최소, 최대).
+
+    Yields:
+        np.ndarray: [frames, channels] float32 블록 (모두 합치면 total_frames).
+    """
+    looped = []
+    for clip in clips:
+        start, end, _ = find_loop_points(clip, sample_rate)
+        looped.append(clip[start:end] if clip.ndim == 2 else clip[start:end, None])
+
+    fade = int(crossfade_seconds * sample_rate)
+    fade = min(fade, min(len(clip) for clip in looped) // 3)
+    t = np.linspace(0.0, np.pi / 2, fade, dtype=np.float32)[:, None] if fade > 0 else None
+    fade_in, fade_out = (np.sin(t), np.cos(t)) if fade > 0 else (None, None)
+
+    emitted = 0
+    tail = None
+    last_idx = -1
+    while emitted < total_frames:
+        choices = [idx for idx in range(len(looped)) if idx != last_idx] or [0]
+        last_idx = int(rng.choice(choices))
+        clip = vary_clip(looped[last_idx], rng, periodic=True) if vary else looped[last_idx].astype(np.float32)
+        repeats = int(rng.integers(loop_repeats[0], loop_repeats[1] + 1))
+
+        for repeat in range(repeats):
+            piece = clip
+            if repeat == 0 and tail is not None and fade > 0:
+                # 다른 클립으로 넘어가는 지점만 크로스페이드
+                piece = piece.copy()
+                piece[:fade] = piece[:fade] * fade_in + tail * fade_out
+            if repeat == repeats - 1 and fade > 0:
+                body, tail = piece[:-fade], piece[-fade:]
+            else:
+                body = piece  # 루프 지점에서 자기 자신으로 이어짐
+                if fade <= 0:
+                    tail = None
+
+            body = body[:total_frames - emitted]
+            emitted += len(body)
+            yield body
+            if emitted >= total_frames:
+                break
+
+    # 루프가 정확히 끝나지 않아도 남은 tail은 버림 (total_frames를 맞추기 위해)
+
+
+def write_tiled_segments(blocks, segment_frames, write_segment):
+    """
+    tile_stage가 만든 블록 흐름을 세그먼트 길이대로 잘라 write_segment(index, audio)에 넘깁니다.
+
+    Args:
+        segment_frames (int or list): 세그먼트 길이(프레임). 목록이면 세그먼트마다 길이가 다릅니다.
+    """
+    buffer = []
+    buffered = 0
+    index = 0
+
+    def frames_for(idx):
+        if isinstance(segment_frames, int):
+            return segment_frames
+        return segment_frames[idx] if idx < len(segment_frames) else None
+
+    for block in blocks:
+        buffer.append(block)
+        buffered += len(block)
+        while frames_for(index) is not None and buffered >= frames_for(index):
+            length = frames_for(index)
+            joined = np.concatenate(buffer, axis=0)
+            write_segment(index, joined[:length])
+            index += 1
+            rest = joined[length:]
+            buffer, buffered = ([rest] if len(rest) else []), len(rest)
+    if buffered and frames_for(index) is not None:
+        write_segment(index, np.concatenate(buffer, axis=0))
+
+
+if __name__ == '__main__':
+    # --- 합성 신호로 간단히 동작 확인 ---
+    import time
+
+    sr = 32000
+    rng = np.random.default_rng(0)
+    t = np.arange(sr * 20) / sr
+    clips = [np.stack([0.3 * np.sin(2 * np.pi * f * t) * (1 + 0.2 * np.sin(2 * np.pi * 0.25 * t))] * 2, axis=1)
+             .astype(np.float32) for f in (220.0, 261.6, 329.6)]
+
+    start, end, score = find_loop_points(clips[0], sr)
+    print(f"루프 구간: {start / sr:.2f}s ~ {end / sr:.2f}s (유사도 {score:.3f})")
+
+    # 루프 지점에서 자기 자신으로 이어지는 이음매가 끊기지 않는지 확인
+    loop = clips[0][start:end]
+    step = np.abs(np.diff(loop, axis=0)).max()
+    tiled = np.concatenate(list(tile_stage(clips[:1], sr, len(loop) * 2, np.random.default_rng(1), vary=False,
+                                           loop_repeats=(3, 3))))
+    seam = np.abs(tiled[len(loop)] - tiled[len(loop) - 1]).max()
+    varied = vary_clip(loop, rng, periodic=True)
+    varied_step = np.abs(np.diff(varied, axis=0)).max()
+    varied_seam = np.abs(varied[0] - varied[-1]).max()
+    print(f"자기 이음매 점프 {seam:.4f} (샘플 간 최대 {step:.4f}), 변화 준 루프 {varied_seam:.4f} "
+          f"(샘플 간 최대 {varied_step:.4f}): "
+          f"{'연속' if seam <= step * 1.01 and varied_seam <= varied_step * 1.01 else '끊김'}")
+
+    start_time = time.time()
+    segments = []
+    write_tiled_segments(tile_stage(clips, sr, sr * 300, rng), sr * 60, lambda idx, audio: segments.append(audio))
+    print(f"5분 타일링: 세그먼트 {len(segments)}개, {time.time() - start_time:.2f}초")
@@ -0,0 +1,290 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import audio_io
+
+# BS.1770 측정 단위: 100ms 단위(hop)로 파워를 구하고 4개(400ms)를 묶어 momentary,
+# 30개(3초)를 묶어 short-term 라우드니스를 계산
+HOP_SECONDS = 0.1
+MOMENTARY_HOPS = 4
+SHORT_TERM_HOPS = 30
+ABSOLUTE_GATE_LUFS = -70.0
+RELATIVE_GATE_LU = -10.0
+
+# 구간별 목표 라우드니스 (LUFS). 깊은 NREM에서 가장 조용하게
+STAGE_TARGET_LUFS = {
+    'SleepOnset': -24.0,
+    'NREM': -30.0,
+    'REM': -27.0,
+    'WakeUp': -22.0,
+}
+# 뒤 주기의 NREM은 잠이 얕아지므로 주기마다 조금씩 올림 (REM 목표를 넘지 않음)
+NREM_CYCLE_STEP_DB = 1.0
+# 구간이 바뀔 때 목표를 서서히 바꾸는 시간(초)
+TRANSITION_SECONDS = 60.0
+PEAK_CEILING_DB = -1.0
+MAX_GAIN_DB = 12.0
+MIN_GAIN_DB = -24.0
+
+
+def k_weighting_response(sample_rate, n_fft):
+    """
+    BS.1770 K-weighting 필터(고역 셸프 + 저역 차단)의 파워 응답 |H(f)|²을 rfft 빈마다 계산합니다.
+    시간 영역 IIR 대신 블록 스펙트럼에 곱해 쓰므로 SciPy 없이 NumPy만으로 계산됩니다.
+    """
+    # 1단계: 고역 셸프 (머리 효과)
+    f0, gain_db, q = 1681.974450955533, 3.999843853973347, 0.7071752369554196
+    k = np.tan(np.pi * f0 / sample_rate)
+    vh = 10.0 ** (gain_db / 20.0)
+    vb = vh ** 0.4996667741545416
+    a0 = 1.0 + k / q + k * k
+    shelf_b = np.array([vh + vb * k / q + k * k, 2.0 * (k * k - vh), vh - vb * k / q + k * k]) / a0
+    shelf_a = np.array([1.0, 2.0 * (k * k - 1.0) / a0, (1.0 - k / q + k * k) / a0])
+
+    # 2단계: 저역 차단 (RLB)
+    f0, q = 38.13547087602444, 0.5003270373238773
+    k = np.tan(np.pi * f0 / sample_rate)
+    a0 = 1.0 + k / q + k * k
+    highpass_b = np.array([1.0, -2.0, 1.0])
+    highpass_a = np.array([1.0, 2.0 * (k * k - 1.0) / a0, (1.0 - k / q + k * k) / a0])
+
+    z = np.exp(-1j * np.pi * np.arange(n_fft // 2 + 1) / (n_fft // 2))  # z^-1
+    response = np.ones_like(z)
+    for b, a in ((shelf_b, shelf_a), (highpass_b, highpass_a)):
+        response *= (b[0] + b[1] * z + b[2] * z * z) / (a[0] + a[1] * z + a[2] * z * z)
+    return np.abs(response) ** 2
+
+
+def power_to_lufs(power):
+    return -0.691 + 10.0 * np.log10(np.maximum(power, 1e-12))
+
+
+def _moving_mean(values, size):
+    if len(values) < size:
+        return np.array([values.mean()]) if len(values) else values
+    cumsum = np.concatenate([[0.0], np.cumsum(values)])
+    return (cumsum[size:] - cumsum[:-size]) / size
+
+
+def gated_loudness(momentary_power):
+    """
+    momentary(400ms) 블록 파워들로 BS.1770 게이팅된 통합 라우드니스(LUFS)를 구합니다.
+    """
+    power = np.asarray(momentary_power, dtype=np.float64)
+    power = power[power_to_lufs(power) > ABSOLUTE_GATE_LUFS]
+    if len(power) == 0:
+        return float(ABSOLUTE_GATE_LUFS)
+    relative_gate = power_to_lufs(power.mean()) + RELATIVE_GATE_LU
+    power = power[power_to_lufs(power) > relative_gate]
+    return float(power_to_lufs(power.mean())) if len(power) else float(ABSOLUTE_GATE_LUFS)
+
+
+class LoudnessMeter:
+    """
+    블록을 차례로 넣으면 100ms 단위 K-weighted 파워와 샘플 피크를 누적하는 스트리밍 측정기.
+    입력 블록 길이는 자유이며, 100ms 단위로 나누어 떨어지지 않는 부분은 다음 블록과 이어서 계산합니다.
+    """
+
+    def __init__(self, sample_rate):
+        self.sample_rate = sample_rate
+        self.hop = int(round(HOP_SECONDS * sample_rate))
+        self.weights = k_weighting_response(sample_rate, self.hop)
+        # Parseval: 양 끝 빈을 제외한 빈은 두 번 세어야 전체 파워가 됨
+        self.weights[1:-1 if self.hop % 2 == 0 else None] *= 2.0
+        self.weights /= float(self.hop) ** 2
+        self.hop_powers = []
+        self.peak = 0.0
+        self._rest = None
+
+    def add(self, audio):
+        audio = audio if audio.ndim == 2 else audio[:, None]
+        if len(audio):
+            self.peak = max(self.peak, float(np.abs(audio).max()))
+        if self._rest is not None:
+            audio = np.concatenate([self._rest, audio], axis=0)
+        usable = len(audio) // self.hop * self.hop
+        self._rest = audio[usable:] if usable < len(audio) else None
+        if usable == 0:
+            return
+        hops = np.asarray(audio[:usable], dtype=np.float32).reshape(-1, self.hop, audio.shape[1])
+        spectrum = np.fft.rfft(hops, axis=1)
+        power = (spectrum.real ** 2 + spectrum.imag ** 2) * self.weights[None, :, None]
+        self.hop_powers.append(power.sum(axis=(1, 2)))  # 채널 가중치 1 (L, R)
+
+    def result(self):
+        """
+        Returns:
+            dict: integrated_lufs, short_term_max_lufs, peak_dbfs, momentary_power(np.ndarray)
+        """
+        hop_powers = np.concatenate(self.hop_powers) if self.hop_powers else np.zeros(0)
+        momentary = _moving_mean(hop_powers, MOMENTARY_HOPS)
+        short_term = _moving_mean(hop_powers, SHORT_TERM_HOPS)
+        return {
+            'integrated_lufs': round(gated_loudness(momentary), 2),
+            'short_term_max_lufs': round(float(power_to_lufs(short_term.max())), 2) if len(short_term) else None,
+            'peak_dbfs': round(float(20.0 * np.log10(max(self.peak, 1e-9))), 2),
+            'momentary_power': momentary,
+        }
+
+
+def stage_target(stage):
+    """
+    구간('NREM2' 등)의 목표 라우드니스(LUFS). NREM은 뒤 주기로 갈수록 조금씩 커집니다 (REM 목표 이하).
+    """
+    family = stage.rstrip('0123456789')
+    cycle = int(stage[len(family):] or 0)
+    target = STAGE_TARGET_LUFS.get(family, STAGE_TARGET_LUFS['NREM'])
+    if family == 'NREM' and cycle > 1:
+        target = min(target + NREM_CYCLE_STEP_DB * (cycle - 1), STAGE_TARGET_LUFS['REM'])
+    return target
+
+
+def build_target_curve(plan, transition_seconds=TRANSITION_SECONDS):
+    """
+    매니페스트 plan([파일명, 구간명, 길이(초)])으로 세그먼트별 (시작 목표, 끝 목표) LUFS를 만듭니다.
+    구간이 바뀌는 지점 뒤 transition_seconds 동안 이전 목표에서 새 목표로 선형으로 넘어갑니다.
+
+    Returns:
+        dict: {파일명: (시작 목표, 끝 목표)}
+    """
+    stages = []  # [구간명, 시작 시각, 목표]
+    position = 0.0
+    for filename, stage, seconds in plan:
+        if not stages or stages[-1][0] != stage:
+            stages.append([stage, position, stage_target(stage)])
+        position += seconds
+
+    def target_at(time_seconds):
+        current = stages[0]
+        previous = None
+        for entry in stages:
+            if entry[1] > time_seconds:
+                break
+            previous, current = current, entry
+        if previous is None or previous is current or transition_seconds <= 0:
+            return current[2]
+        ratio = min(1.0, (time_seconds - current[1]) / transition_seconds)
+        return previous[2] + (current[2] - previous[2]) * ratio
+
+    curve = {}
+    position = 0.0
+    for filename, stage, seconds in plan:
+        curve[filename] = (target_at(position), target_at(position + seconds))
+        position += seconds
+    return curve
+
+
+def normalize_segment(read_blocks, sample_rate, output_path, target):
+    """
+    세그먼트 하나를 한 번만 읽어 측정하고, 목표 라우드니스에 맞춘 게인을 적용해 저장합니다.
+
+    Args:
+        read_blocks (iterable): [frames, channels] 블록들 (WAV 블록 또는 PCM 저장소 memmap 조각).
+        sample_rate (int): 샘플레이트.
+        output_path (str): 정규화된 WAV를 저장할 경로.
+        target (tuple): (시작 목표 LUFS, 끝 목표 LUFS). 세그먼트 안에서 게인이 선형으로 바뀝니다.
+
+    Returns:
+        dict: 측정값과 적용 게인 (momentary_power 포함).
+    """
+    meter = LoudnessMeter(sample_rate)
+    blocks = []
+    for block in read_blocks:
+        meter.add(block)
+        blocks.append(np.asarray(block, dtype=np.float32))
+    measured = meter.result()
+    audio = np.concatenate(blocks, axis=0) if blocks else np.zeros((0, 1), dtype=np.float32)
+
+    # 무음에 가까운 세그먼트는 키우지 않음
+    if measured['integrated_lufs'] <= ABSOLUTE_GATE_LUFS:
+        start_gain = end_gain = 0.0
+    else:
+        start_gain, end_gain = (t - measured['integrated_lufs'] for t in target)
+    ceiling = PEAK_CEILING_DB - measured['peak_dbfs']
+    start_gain, end_gain = (float(np.clip(g, MIN_GAIN_DB, min(MAX_GAIN_DB, ceiling))) for g in (start_gain, end_gain))
+
+    gain = 10.0 ** (np.linspace(start_gain, end_gain, len(audio), dtype=np.float32) / 20.0)
+    audio_io.write_wav(output_path, audio * gain[:, None], sample_rate)
+
+    mean_gain_db = (start_gain + end_gain) / 2.0
+    measured.update(target_lufs=[round(t, 2) for t in target],
+                    gain_db=[round(start_gain, 2), round(end_gain, 2)],
+                    output_lufs=round(measured['integrated_lufs'] + mean_gain_db, 2))
+    measured['momentary_power_after'] = measured['momentary_power'] * 10.0 ** (mean_gain_db / 10.0)
+    return measured
+
+
+def normalize_segments(jobs, max_workers=None, on_done=None):
+    """
+    여러 세그먼트를 스레드 풀에서 병렬로 정규화합니다 (NumPy FFT/파일 I/O는 GIL을 놓음).
+
+    Args:
+        jobs (list): [(이름, read_blocks 생성 함수, sample_rate, output_path, target), ...]
+        max_workers (int): 동시 처리 수 (기본값: CPU 수).
+        on_done (callable): 세그먼트 하나가 끝날 때마다 on_done(이름, 결과) 호출.
+
+    Returns:
+        tuple: ({이름: 결과}, 밤 전체 통합 라우드니스 {'before', 'after'})
+    """
+    results = {}
+
+    def work(job):
+        name, make_blocks, sample_rate, output_path, target = job
+        return name, normalize_segment(make_blocks(), sample_rate, output_path, target)
+
+    with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+        for name, result in executor.map(work, jobs):
+            results[name] = result
+            if on_done:
+                on_done(name, result)
+
+    before = [result.pop('momentary_power') for result in results.values()]
+    after = [result.pop('momentary_power_after') for result in results.values()]
+    night = {
+        'before_lufs': round(gated_loudness(np.concatenate(before)), 2) if before else None,
+        'after_lufs': round(gated_loudness(np.concatenate(after)), 2) if after else None,
+    }
+    return results, night
+
+
+def wav_blocks(filepath, block_frames):
+    """
+    normalize_segments용: WAV 파일을 블록 단위로 읽는 함수를 만듭니다.
+    """
+    return lambda: (audio for _, audio, _ in audio_io.iter_wav_blocks(filepath, block_frames))
+
+
+if __name__ == '__main__':
+    # --- 간단한 동작 확인 ---
+    import tempfile
+    import time
+
+    sr = 32000
+    t = np.arange(sr * 10) / sr
+    # 1kHz 사인파 -20 dBFS (스테레오): K-weighting 기준 약 -20 LUFS 근처여야 함
+    tone = np.stack([0.1 * np.sin(2 * np.pi * 1000 * t)] * 2, axis=1).astype(np.float32)
+    meter = LoudnessMeter(sr)
+    for start in range(0, len(tone), 12345):
+        meter.add(tone[start:start + 12345])
+    print(f"1kHz -20dBFS 스테레오: {meter.result()['integrated_lufs']} LUFS")
+
+    plan = [[f"{idx + 1:03d}_{stage}.wav", stage, 120] for idx, stage in
+            enumerate(['SleepOnset'] * 3 + ['NREM1'] * 10 + ['REM1'] * 3 + ['NREM2'] * 10)]
+    curve = build_target_curve(plan)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        rng = np.random.default_rng(0)
+        jobs = []
+        for idx, (filename, stage, seconds) in enumerate(plan):
+            path = os.path.join(tmp_dir, filename)
+            audio = rng.normal(0, 10 ** (rng.uniform(-30, -10) / 20), (sr * seconds, 2)).astype(np.float32)
+            audio_io.write_wav(path, audio, sr)
+            jobs.append((filename, wav_blocks(path, sr * 10), sr, os.path.join(tmp_dir, f"norm_{filename}"),
+                         curve[filename]))
+        start_time = time.time()
+        results, night = normalize_segments(jobs)
+        print(f"{len(plan)}개 세그먼트({len(plan) * 2}분) 정규화: {time.time() - start_time:.2f}초, 밤 전체 {night}")
+        for filename in (plan[0][0], plan[5][0], plan[14][0], plan[20][0]):
+            print(f"  {filename}: {results[filename]['integrated_lufs']} → {results[filename]['output_lufs']} LUFS "
+                  f"(목표 {results[filename]['target_lufs']})")
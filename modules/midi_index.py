@@ -0,0 +1,529 @@
+import os
+import sys
+import time
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# scripts 폴더(utils.py)를 임포트 경로에 추가
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+
+import utils
+
+VECTORS_FILENAME = 'vectors.f32'
+META_FILENAME = 'meta.bin'
+INDEX_FILENAME = 'features_index.json'
+INDEX_VERSION = 1
+MIDI_EXTENSIONS = ('.mid', '.midi')
+DEFAULT_BPM = 120.0  # 템포 이벤트가 없는 MIDI의 표준 기본값
+DRUM_CHANNEL = 9     # GM 10번 채널 (0부터 셈)
+PITCH_NAMES = ['C', 'C#', 'D', 'E-', 'E', 'F', 'F#', 'G', 'A-', 'A', 'B-', 'B']
+
+# Krumhansl-Schmuckler 조성 프로파일 (music21 score.analyze('key') 기본 방식과 같음)
+MAJOR_PROFILE = np.array([6.35, 2.23, 3.48, 2.33, 4.38, 4.09, 2.52, 5.19, 2.39, 3.66, 2.29, 2.88])
+MINOR_PROFILE = np.array([6.33, 2.68, 3.52, 5.38, 2.60, 3.53, 2.54, 4.75, 3.98, 2.69, 3.34, 3.17])
+
+# 특징 벡터 구성: 그룹마다 L2 정규화 후 가중치를 곱해 이어 붙이고, 전체를 다시 정규화 → 내적 = 코사인 유사도.
+# BPM/밀도 같은 스칼라는 로그 간격 중심값에 대한 RBF로 펼쳐서 가까운 값끼리 겹치게 합니다.
+BPM_CENTERS = np.geomspace(40.0, 200.0, 10)
+DENSITY_CENTERS = np.geomspace(0.25, 8.0, 8)  # 4분음표당 음표 수
+RBF_WIDTH = 0.25                              # 로그 공간 폭
+VELOCITY_BINS = 8
+FEATURE_GROUPS = [
+    ('bpm', len(BPM_CENTERS), 1.0),
+    ('key', 24, 0.5),
+    ('pitch_class', 12, 1.0),
+    ('velocity', VELOCITY_BINS, 1.0),
+    ('density', 2 * len(DENSITY_CENTERS), 1.0),  # 평균 밀도 + 가장 촘촘한 마디 밀도
+    ('programs', 129, 0.7),                      # GM 프로그램 128개 + 드럼
+]
+FEATURE_SLICES = {}
+_offset = 0
+for _name, _size, _ in FEATURE_GROUPS:
+    FEATURE_SLICES[_name] = slice(_offset, _offset + _size)
+    _offset += _size
+FEATURE_DIM = _offset
+
+# 벡터는 [행, FEATURE_DIM] 연속 배열로, 필터용 원래 값은 같은 행 번호의 작은 레코드로 따로 저장
+# (한 레코드에 섞으면 벡터 열이 띄엄띄엄 놓여 조회 때마다 복사가 일어남)
+VECTOR_DTYPE = np.dtype('<f4')
+META_DTYPE = np.dtype([
+    ('bpm', '<f4'),
+    ('key', 'i1'),            # 0~11 장조, 12~23 단조 (으뜸음 + 12 x 단조)
+    ('drums', '?'),
+    ('density', '<f4'),       # 4분음표당 평균 음표 수
+    ('programs', 'u1', (16,)),  # GM 프로그램 128비트 (np.packbits)
+    ('valid', '?'),
+])
+
+
+def _rbf(value, centers):
+    return np.exp(-0.5 * (np.log(max(value, 1e-6) / centers) / RBF_WIDTH) ** 2)
+
+
+def estimate_key(pitch_class_hist):
+    """
+    음높이 분포와 24개 조성 프로파일의 상관계수로 조성을 고릅니다.
+
+    Returns:
+        int: 0~11 장조, 12~23 단조 (으뜸음 + 12 x 단조).
+    """
+    hist = np.asarray(pitch_class_hist, dtype=np.float64)
+    if hist.sum() == 0:
+        return 0
+    rotations = np.arange(12)[None, :] - np.arange(12)[:, None]  # [으뜸음, 음높이] → 프로파일 위치
+    profiles = np.concatenate([MAJOR_PROFILE[rotations % 12], MINOR_PROFILE[rotations % 12]])
+    profiles = profiles - profiles.mean(axis=1, keepdims=True)
+    centered = hist - hist.mean()
+    scores = profiles @ centered / (np.linalg.norm(profiles, axis=1) * np.linalg.norm(centered) + 1e-12)
+    return int(np.argmax(scores))
+
+
+def key_name(key):
+    return f"{PITCH_NAMES[key % 12]} {'minor' if key >= 12 else 'major'}"
+
+
+def extract_features(midi_filepath):
+    """
+    MIDI 파일을 mido로 한 번만 읽어 색인용 특징을 뽑습니다
+    (midi_analyzer처럼 항목마다 music21로 다시 파싱하지 않아 대량 색인에 적합).
+
+    Returns:
+        dict: bpm, key, pitch_class(12), velocity(VELOCITY_BINS), density, peak_density, programs, drums.
+            음표가 없거나 읽을 수 없으면 None.
+    """
+    import mido
+
+    try:
+        midi = mido.MidiFile(midi_filepath)
+    except Exception as e:
+        print(f"MIDI 파일을 읽을 수 없습니다 ({midi_filepath}): {e}")
+        return None
+
+    tempo = None
+    channel_programs = {}
+    onsets, pitches, velocities, channels = [], [], [], []
+    end_tick = 0
+    for track in midi.tracks:
+        tick = 0
+        for msg in track:
+            tick += msg.time
+            if msg.type == 'set_tempo' and tempo is None:
+                tempo = msg.tempo
+            elif msg.type == 'program_change':
+                channel_programs.setdefault(msg.channel, set()).add(msg.program)
+            elif msg.type == 'note_on' and msg.velocity > 0:
+                onsets.append(tick)
+                pitches.append(msg.note)
+                velocities.append(msg.velocity)
+                channels.append(msg.channel)
+        end_tick = max(end_tick, tick)
+    if not onsets:
+        return None
+
+    onsets, pitches = np.array(onsets), np.array(pitches)
+    velocities, channels = np.array(velocities), np.array(channels)
+    pitched = channels != DRUM_CHANNEL
+    pitch_class = np.bincount(pitches[pitched] % 12, minlength=12).astype(np.float64)
+    velocity = np.bincount(np.minimum(velocities * VELOCITY_BINS // 128, VELOCITY_BINS - 1),
+                           minlength=VELOCITY_BINS).astype(np.float64)
+
+    quarter_ticks = midi.ticks_per_beat
+    quarters = max(end_tick, onsets.max() + 1) / quarter_ticks
+    bar_counts = np.bincount(onsets // (4 * quarter_ticks))
+
+    programs = set()
+    for channel in np.unique(channels[pitched]).tolist():
+        programs |= channel_programs.get(channel, {0})  # 프로그램 변경이 없으면 GM 기본값(피아노)
+
+    return {
+        'bpm': round(60_000_000 / tempo, 2) if tempo else DEFAULT_BPM,
+        'key': estimate_key(pitch_class),
+        'pitch_class': (pitch_class / max(pitch_class.sum(), 1)).tolist(),
+        'velocity': (velocity / velocity.sum()).tolist(),
+        'density': round(len(onsets) / quarters, 3),
+        'peak_density': round(bar_counts.max() / 4.0, 3),
+        'programs': sorted(programs),
+        'drums': bool((~pitched).any()),
+    }
+
+
+def feature_vector(features):
+    """
+    extract_features 결과를 길이 FEATURE_DIM의 단위 벡터(float32)로 만듭니다.
+    """
+    groups = {
+        'bpm': _rbf(features['bpm'], BPM_CENTERS),
+        'key': np.eye(24)[features['key']],
+        'pitch_class': np.asarray(features['pitch_class'], dtype=np.float64),
+        'velocity': np.asarray(features['velocity'], dtype=np.float64),
+        'density': np.concatenate([_rbf(features['density'], DENSITY_CENTERS),
+                                   _rbf(features['peak_density'], DENSITY_CENTERS)]),
+        'programs': np.zeros(129),
+    }
+    groups['programs'][list(features['programs'])] = 1.0
+    groups['programs'][128] = float(features['drums'])
+
+    vector = np.zeros(FEATURE_DIM)
+    for name, _, weight in FEATURE_GROUPS:
+        values = groups[name]
+        norm = np.linalg.norm(values)
+        if norm > 0:
+            vector[FEATURE_SLICES[name]] = weight * values / norm
+    return (vector / max(np.linalg.norm(vector), 1e-12)).astype(np.float32)
+
+
+def feature_meta(features):
+    """
+    필터용 META_DTYPE 레코드 1개.
+    """
+    programs = np.zeros(128, dtype=bool)
+    programs[list(features['programs'])] = True
+    return np.array([(features['bpm'], features['key'], features['drums'], features['density'],
+                      np.packbits(programs), True)], dtype=META_DTYPE)
+
+
+def _extract(path):
+    return path, extract_features(path)
+
+
+class MidiFeatureIndex:
+    """
+    참고용 MIDI 모음의 특징 벡터 색인.
+
+    벡터(vectors.f32)와 필터용 BPM/조성/드럼/밀도/악기(meta.bin)를 같은 행 번호로 raw 파일에 이어
+    저장하고, 파일별 행 번호와 mtime/크기를 features_index.json에 기록합니다 (PcmStore와 같은 방식).
+    조회는 memmap 전체에 대한 행렬-벡터 곱 한 번과 argpartition이라 10만 개에서도 수 ms입니다.
+    바뀐 파일만 다시 분석해 제자리에서 덮어쓰고, 새 파일은 뒤에 붙입니다.
+
+    index = {'version', 'dim', 'rows', 'files': {경로: {'row', 'mtime', 'size'}}}
+
+    Args:
+        index_dir (str): 색인 폴더.
+    """
+
+    def __init__(self, index_dir):
+        self.index_dir = index_dir
+        self.vectors_path = os.path.join(index_dir, VECTORS_FILENAME)
+        self.meta_path = os.path.join(index_dir, META_FILENAME)
+        self.index_path = os.path.join(index_dir, INDEX_FILENAME)
+        self._lock = threading.Lock()
+        self._memmap = None
+        self._paths = None
+        index = utils.load_json(self.index_path) if os.path.exists(self.index_path) else None
+        if index and (index.get('version') != INDEX_VERSION or index.get('dim') != FEATURE_DIM):
+            print(f"경고: 색인 형식이 바뀌어 새로 만듭니다 ({self.index_path}).")
+            index = None
+        self.index = index or {'version': INDEX_VERSION, 'dim': FEATURE_DIM, 'rows': 0, 'files': {}}
+
+    def __len__(self):
+        return len(self.index['files'])
+
+    def __contains__(self, path):
+        return os.path.abspath(path) in self.index['files']
+
+    def _save_index(self):
+        utils.save_json(self.index, self.index_path, verbose=False)
+
+    def _mapped(self):
+        """
+        Returns:
+            tuple: (벡터 [rows, FEATURE_DIM] memmap, 메타 [rows] memmap)
+        """
+        if self._memmap is None:
+            rows = self.index['rows']
+            if rows == 0:
+                return np.zeros((0, FEATURE_DIM), dtype=VECTOR_DTYPE), np.zeros(0, dtype=META_DTYPE)
+            self._memmap = (np.memmap(self.vectors_path, dtype=VECTOR_DTYPE, mode='r', shape=(rows, FEATURE_DIM)),
+                            np.memmap(self.meta_path, dtype=META_DTYPE, mode='r', shape=(rows,)))
+        return self._memmap
+
+    def _write_rows(self, row, vectors=None, meta=None):
+        os.makedirs(self.index_dir, exist_ok=True)
+        for path, values in ((self.vectors_path, vectors), (self.meta_path, meta)):
+            if values is None:
+                continue
+            with open(path, 'r+b' if os.path.exists(path) else 'wb') as f:
+                f.seek(row * values[0].nbytes)
+                f.write(np.ascontiguousarray(values).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+        self._memmap = None  # 파일 크기가 바뀌었으므로 다음 읽기 때 다시 매핑
+
+    def put_many(self, items):
+        """
+        [(경로, 특징 dict, mtime, 크기), ...]를 기록합니다. 이미 있는 경로는 같은 행을 덮어씁니다.
+        """
+        if not items:
+            return
+        with self._lock:
+            vectors = np.stack([feature_vector(features) for _, features, _, _ in items])
+            meta = np.concatenate([feature_meta(features) for _, features, _, _ in items])
+            rows = []
+            appended = self.index['rows']
+            for path, _, mtime, size in items:
+                entry = self.index['files'].get(path)
+                if entry is None:
+                    entry = {'row': appended}
+                    appended += 1
+                rows.append(entry['row'])
+                self.index['files'][path] = dict(entry, mtime=mtime, size=size)
+
+            # 데이터를 먼저 쓰고 인덱스를 나중에 저장 (중간에 끊겨도 기존 인덱스는 유효)
+            rows = np.array(rows)
+            new = rows >= self.index['rows']
+            if new.any():
+                order = np.argsort(rows[new])
+                self._write_rows(int(rows[new].min()), vectors[new][order], meta[new][order])
+            for idx in np.flatnonzero(~new):
+                self._write_rows(int(rows[idx]), vectors[idx:idx + 1], meta[idx:idx + 1])
+            self.index['rows'] = appended
+            self._paths = None
+            self._save_index()
+
+    def remove(self, paths):
+        """
+        색인에서 빼고 해당 행을 무효로 표시합니다 (공간은 compact()에서 회수).
+        """
+        with self._lock:
+            for path in paths:
+                entry = self.index['files'].pop(path, None)
+                if entry is not None:
+                    meta = np.array(self._mapped()[1][entry['row']:entry['row'] + 1])
+                    meta['valid'] = False
+                    self._write_rows(entry['row'], meta=meta)
+            self._paths = None
+            self._save_index()
+
+    def update(self, folder, workers=None, prune=True, flush_every=1000):
+        """
+        폴더 아래 MIDI 파일을 찾아 새 파일/바뀐 파일만 분석해 색인에 반영합니다.
+
+        Args:
+            workers (int): 분석 프로세스 수 (기본값: CPU 수).
+            prune (bool): folder 아래에서 사라진 파일을 색인에서 뺄지 여부.
+            flush_every (int): 이 개수마다 중간 저장 (중단되어도 다시 분석할 양이 적도록).
+
+        Returns:
+            dict: added, updated, unchanged, removed, failed 개수.
+        """
+        folder = os.path.abspath(folder)
+        found = {}
+        for root, _, files in os.walk(folder):
+            for filename in files:
+                if filename.lower().endswith(MIDI_EXTENSIONS):
+                    path = os.path.join(root, filename)
+                    stat = os.stat(path)
+                    found[path] = (stat.st_mtime, stat.st_size)
+
+        stats = {'added': 0, 'updated': 0, 'unchanged': 0, 'removed': 0, 'failed': 0}
+        todo = []
+        for path, (mtime, size) in found.items():
+            entry = self.index['files'].get(path)
+            if entry is not None and entry['mtime'] == mtime and entry['size'] == size:
+                stats['unchanged'] += 1
+            else:
+                todo.append(path)
+
+        pending = []
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for path, features in executor.map(_extract, todo, chunksize=16):
+                if features is None:
+                    stats['failed'] += 1
+                    continue
+                stats['updated' if path in self.index['files'] else 'added'] += 1
+                pending.append((path, features) + found[path])
+                if len(pending) >= flush_every:
+                    self.put_many(pending)
+                    pending = []
+        self.put_many(pending)
+
+        if prune:
+            gone = [path for path in self.index['files'] if path.startswith(folder + os.sep) and path not in found]
+            self.remove(gone)
+            stats['removed'] = len(gone)
+        return stats
+
+    def wasted_rows(self):
+        return self.index['rows'] - len(self.index['files'])
+
+    def compact(self):
+        """
+        무효 행을 없애고 파일을 다시 씁니다.
+        """
+        with self._lock:
+            vectors, meta = self._mapped()
+            paths = sorted(self.index['files'], key=lambda path: self.index['files'][path]['row'])
+            rows = np.array([self.index['files'][path]['row'] for path in paths], dtype=np.int64)
+            kept = (vectors[rows], meta[rows])
+            self._memmap = None
+            del vectors, meta
+            for path, values in zip((self.vectors_path, self.meta_path), kept):
+                tmp_path = f"{path}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(values.tobytes())
+                os.replace(tmp_path, path)
+            for row, path in enumerate(paths):
+                self.index['files'][path]['row'] = row
+            self.index['rows'] = len(paths)
+            self._paths = None
+            self._save_index()
+
+    def _row_paths(self):
+        if self._paths is None:
+            paths = np.empty(self.index['rows'], dtype=object)
+            for path, entry in self.index['files'].items():
+                paths[entry['row']] = path
+            self._paths = paths
+        return self._paths
+
+    def vector_of(self, path):
+        """
+        색인된 파일이면 저장된 벡터를, 아니면 분석해서 벡터를 돌려줍니다.
+        """
+        entry = self.index['files'].get(os.path.abspath(path))
+        if entry is not None:
+            return np.array(self._mapped()[0][entry['row']])
+        features = extract_features(path)
+        return feature_vector(features) if features else None
+
+    def query(self, example, k=20, bpm_min=None, bpm_max=None, no_drums=False, mode=None, programs=None,
+              exclude=None):
+        """
+        예시와 가장 비슷한 k개를 찾습니다.
+
+        Args:
+            example: MIDI 경로 또는 feature_vector 결과.
+            bpm_min, bpm_max (float): BPM 범위 필터.
+            no_drums (bool): 드럼이 있는 파일 제외.
+            mode (str): 'major' 또는 'minor'만.
+            programs (iterable): 이 GM 프로그램 중 하나 이상을 쓰는 파일만.
+            exclude (iterable): 결과에서 뺄 경로 (기본값: 예시 파일 자신).
+
+        Returns:
+            list: [{'path', 'score', 'bpm', 'key', 'drums', 'density'}, ...] 유사도 내림차순.
+        """
+        if isinstance(example, str):
+            exclude = {os.path.abspath(example)} if exclude is None else set(exclude)
+            example = self.vector_of(example)
+            if example is None:
+                return []
+        vectors, meta = self._mapped()
+        if len(meta) == 0:
+            return []
+
+        mask = meta['valid'].copy()
+        if bpm_min is not None:
+            mask &= meta['bpm'] >= bpm_min
+        if bpm_max is not None:
+            mask &= meta['bpm'] < bpm_max
+        if no_drums:
+            mask &= ~meta['drums']
+        if mode is not None:
+            mask &= (meta['key'] >= 12) == (mode == 'minor')
+        if programs is not None:
+            bits = np.zeros(128, dtype=bool)
+            bits[list(programs)] = True
+            mask &= (meta['programs'] & np.packbits(bits)).any(axis=1)
+        paths = self._row_paths()
+        for path in exclude or ():
+            entry = self.index['files'].get(path)
+            if entry is not None:
+                mask[entry['row']] = False
+
+        # 필터를 먼저 적용해 남은 행의 벡터만 읽음 (조건이 까다로울수록 빨라짐)
+        candidates = np.flatnonzero(mask)
+        example = np.asarray(example, dtype=VECTOR_DTYPE)
+        if len(candidates) < len(meta) // 2:
+            scores = vectors[candidates] @ example
+        else:
+            scores = (vectors @ example)[candidates]
+        if len(candidates) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            candidates, scores = candidates[top], scores[top]
+        order = np.argsort(-scores)
+        return [{'path': paths[row], 'score': round(float(score), 4), 'bpm': float(meta['bpm'][row]),
+                 'key': key_name(int(meta['key'][row])), 'drums': bool(meta['drums'][row]),
+                 'density': round(float(meta['density'][row]), 3)}
+                for row, score in zip(candidates[order], scores[order])]
+
+
+def _random_features(rng):
+    """
+    __main__ 벤치마크용 가짜 특징 (MIDI 파일 없이 10만 개 색인을 만들기 위해).
+    """
+    pitch_class = rng.dirichlet(np.ones(12))
+    return {'bpm': float(rng.uniform(50, 160)), 'key': int(rng.integers(24)), 'pitch_class': pitch_class.tolist(),
+            'velocity': rng.dirichlet(np.ones(VELOCITY_BINS)).tolist(), 'density': float(rng.uniform(0.2, 6)),
+            'peak_density': float(rng.uniform(0.5, 8)),
+            'programs': sorted(set(rng.integers(0, 128, rng.integers(1, 4)).tolist())),
+            'drums': bool(rng.random() < 0.4)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='참고 MIDI 특징 벡터 색인')
+    subparsers = parser.add_subparsers(dest='command')
+    build_parser = subparsers.add_parser('build', help='폴더의 MIDI를 색인에 추가/갱신')
+    build_parser.add_argument('index_dir')
+    build_parser.add_argument('midi_folder')
+    build_parser.add_argument('--workers', type=int, default=None)
+    query_parser = subparsers.add_parser('query', help='예시 MIDI와 비슷한 파일 찾기')
+    query_parser.add_argument('index_dir')
+    query_parser.add_argument('example')
+    query_parser.add_argument('-k', type=int, default=20)
+    query_parser.add_argument('--bpm-min', type=float, default=None)
+    query_parser.add_argument('--bpm-max', type=float, default=None)
+    query_parser.add_argument('--no-drums', action='store_true')
+    query_parser.add_argument('--mode', choices=['major', 'minor'], default=None)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        start_time = time.time()
+        midi_index = MidiFeatureIndex(args.index_dir)
+        stats = midi_index.update(args.midi_folder, workers=args.workers)
+        print(f"색인 갱신 완료 ({time.time() - start_time:.1f}초, 전체 {len(midi_index)}개): {stats}")
+    elif args.command == 'query':
+        midi_index = MidiFeatureIndex(args.index_dir)
+        start_time = time.perf_counter()
+        results = midi_index.query(args.example, k=args.k, bpm_min=args.bpm_min, bpm_max=args.bpm_max,
+                                   no_drums=args.no_drums, mode=args.mode)
+        print(f"{len(results)}개 ({(time.perf_counter() - start_time) * 1000:.1f}ms)")
+        for result in results:
+            print(f"  {result['score']:.3f}  {result['bpm']:6.1f} BPM  {result['key']:<9}  {result['path']}")
+    else:
+        # --- 간단한 동작 확인: 가짜 특징 10만 개 색인 후 필터 조회 ---
+        import tempfile
+
+        rng = np.random.default_rng(0)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            midi_index = MidiFeatureIndex(tmp_dir)
+            start_time = time.time()
+            for chunk in range(10):
+                midi_index.put_many([(f'/corpus/{chunk * 10000 + idx:06d}.mid', _random_features(rng), 0.0, 0)
+                                     for idx in range(10000)])
+            print(f"10만 개 색인: {time.time() - start_time:.1f}초, "
+                  f"파일 {os.path.getsize(midi_index.vectors_path) / 1024 ** 2:.0f}MB")
+
+            midi_index = MidiFeatureIndex(tmp_dir)  # 다시 열어 memmap으로 조회
+            midi_index.query('/corpus/000042.mid', k=20)  # 첫 매핑/페이지 캐시
+            start_time = time.perf_counter()
+            for _ in range(20):
+                results = midi_index.query('/corpus/000042.mid', k=20, bpm_max=70, no_drums=True)
+            elapsed = (time.perf_counter() - start_time) / 20 * 1000
+            print(f"'비슷한 20개, 70 BPM 미만, 드럼 없음': {elapsed:.1f}ms, "
+                  f"조건 만족 {all(r['bpm'] < 70 and not r['drums'] for r in results)}, 최고 {results[0]['score']}")
+
+            midi_index.put_many([('/corpus/000042.mid', dict(_random_features(rng), bpm=60.0), 1.0, 1)])
+            midi_index.remove(['/corpus/000007.mid'])
+            at_60 = {result['path'] for result in midi_index.query('/corpus/000001.mid', k=len(midi_index),
+                                                                    bpm_min=59.99, bpm_max=60.01)}
+            everything = {result['path'] for result in midi_index.query('/corpus/000001.mid', k=len(midi_index))}
+            print(f"갱신 후 행 {midi_index.index['rows']}개 (낭비 {midi_index.wasted_rows()}), "
+                  f"000042 BPM 60 반영 {'/corpus/000042.mid' in at_60}, 000007 제외 {'/corpus/000007.mid' not in everything}")
+            midi_index.compact()
+            print(f"정리 후 행 {midi_index.index['rows']}개, 000042 행 {midi_index.index['files']['/corpus/000042.mid']}")
+
+        print(f"조성 추정 (C장조 음계): {key_name(estimate_key([2, 0, 1, 0, 1, 1, 0, 2, 0, 1, 0, 1]))}, "
+              f"(A단조 화성): {key_name(estimate_key([2, 0, 1, 0, 1, 0, 0, 0, 1, 2, 0, 1]))}")
@@ -0,0 +1,295 @@
+import time
+from functools import partial
+
+import numpy as np
+
+# 음표 이벤트 배열. 시간 단위는 쿼터(4분음표) 길이이며, 같은 화음에 속한 음표는
+# 같은 chord 번호를 가집니다 (화음이 아니면 -1).
+NOTE_DTYPE = np.dtype([
+    ('onset', 'f8'),
+    ('duration', 'f4'),
+    ('pitch', 'i2'),
+    ('velocity', 'i2'),
+    ('track', 'i2'),
+    ('chord', 'i4'),
+])
+
+# 구간별로 남길 음표 비율. 깊은 NREM일수록 음표를 줄여 잔잔하게
+STAGE_KEEP_RATIO = {
+    'SleepOnset': 0.75,
+    'NREM': 0.45,
+    'REM': 0.8,
+    'WakeUp': 1.0,
+}
+HUMANIZE_SECONDS = 0.015  # 박자 흔들림 표준편차 (약 15ms)
+PHRASE_QUARTERS = 8.0     # 벨로시티 곡선이 한 번 굽이치는 길이 (2마디)
+BEATS_PER_BAR = 4.0
+
+
+def make_notes(onset, duration, pitch, velocity=64, track=0, chord=-1):
+    """
+    필드별 값(스칼라 또는 배열)을 브로드캐스트해 NOTE_DTYPE 배열을 만듭니다.
+    """
+    columns = np.broadcast_arrays(*(np.asarray(value) for value in (onset, duration, pitch, velocity, track, chord)))
+    notes = np.empty(columns[0].shape, dtype=NOTE_DTYPE).reshape(-1)
+    for name, column in zip(NOTE_DTYPE.names, columns):
+        notes[name] = column.reshape(-1)
+    return notes
+
+
+def sort_notes(notes):
+    """
+    onset → track → pitch 순으로 정렬한 사본.
+    """
+    return notes[np.lexsort((notes['pitch'], notes['track'], notes['onset']))]
+
+
+def _track_mask(notes, tracks):
+    if tracks is None:
+        return np.ones(len(notes), dtype=bool)
+    return np.isin(notes['track'], np.asarray(tracks))
+
+
+def _share_within_chords(notes, values):
+    """
+    같은 화음의 음표가 같은 값을 갖도록, 화음마다 첫 음표의 값을 나머지에 복사합니다.
+    """
+    in_chord = notes['chord'] >= 0
+    if in_chord.any():
+        chord_values = values[in_chord]
+        _, first, inverse = np.unique(notes['chord'][in_chord], return_index=True, return_inverse=True)
+        values[in_chord] = chord_values[first][inverse]
+    return values
+
+
+def _is_downbeat(onset, beats=BEATS_PER_BAR, tolerance=1e-3):
+    position = np.mod(onset, beats)
+    return (position < tolerance) | (beats - position < tolerance)
+
+
+def humanize_timing(notes, rng, jitter=0.03, duration_jitter=0.05, tracks=None):
+    """
+    onset에 정규분포 흔들림(jitter, 쿼터 단위)을, 길이에 비율 흔들림을 더합니다.
+    화음의 음들은 함께 움직이며, 흔들림은 ±3σ로 자르고 onset은 0 아래로 내려가지 않습니다.
+    """
+    notes = notes.copy()
+    mask = _track_mask(notes, tracks)
+    offsets = np.clip(rng.normal(0.0, jitter, len(notes)), -3 * jitter, 3 * jitter)
+    offsets = _share_within_chords(notes, offsets)
+    scales = _share_within_chords(notes, np.clip(1.0 + rng.normal(0.0, duration_jitter, len(notes)), 0.5, 1.5))
+    notes['onset'] = np.where(mask, np.maximum(notes['onset'] + offsets, 0.0), notes['onset'])
+    notes['duration'] = np.where(mask, notes['duration'] * scales, notes['duration'])
+    return notes
+
+
+def shape_velocity(notes, rng, mean=64.0, spread=12.0, phrase_quarters=PHRASE_QUARTERS, accent=6.0,
+                   start_scale=1.0, end_scale=1.0, noise=0.25, low=1, high=127, tracks=None):
+    """
+    음표마다 따로 뽑던 벨로시티 대신, 흐름이 이어지는 벨로시티 곡선을 입힙니다.
+
+    - 프레이즈 곡선: phrase_quarters 간격의 매듭에서 뽑은 값을 선형 보간 (spread 크기)
+    - 강박 강조: 마디 첫 박 +accent, 나머지 정박 +accent/2
+    - 전체 흐름: 처음 start_scale → 끝 end_scale 배율 (페이드 인/아웃)
+    - 음표별 잡음: spread * noise 크기의 작은 흔들림
+
+    결과는 [low, high]로 자릅니다.
+    """
+    notes = notes.copy()
+    mask = _track_mask(notes, tracks)
+    if not mask.any():
+        return notes
+    onset = notes['onset']
+    length = max(float(onset[mask].max()), phrase_quarters)
+
+    knots = rng.normal(0.0, 1.0, int(np.ceil(length / phrase_quarters)) + 2)
+    contour = np.interp(onset / phrase_quarters, np.arange(len(knots)), knots)
+    emphasis = np.where(_is_downbeat(onset), accent, np.where(_is_downbeat(onset, 1.0), accent / 2, 0.0))
+    envelope = start_scale + (end_scale - start_scale) * np.clip(onset / length, 0.0, 1.0)
+    jitter = _share_within_chords(notes, rng.normal(0.0, spread * noise, len(notes)))
+
+    velocity = mean * envelope + spread * contour + emphasis + jitter
+    notes['velocity'] = np.where(mask, np.clip(np.rint(velocity), max(1, low), min(127, high)), notes['velocity'])
+    return notes
+
+
+def thin_density(notes, rng, keep=1.0, tracks=None, protect_downbeats=True):
+    """
+    음표를 keep 비율만큼 무작위로 남깁니다 (화음은 통째로 남기거나 뺌).
+    keep은 숫자 또는 onset 배열을 받아 남길 확률 배열을 돌려주는 함수입니다.
+    protect_downbeats면 마디 첫 박 음표는 항상 남겨 박자감을 유지합니다.
+    """
+    keep_probability = keep(notes['onset']) if callable(keep) else np.full(len(notes), float(keep))
+    draws = _share_within_chords(notes, rng.random(len(notes)))
+    kept = draws < keep_probability
+    if protect_downbeats:
+        kept |= _is_downbeat(notes['onset'])
+    kept |= ~_track_mask(notes, tracks)
+    return notes[kept]
+
+
+def stage_keep_ratio(stage):
+    """
+    구간('NREM2' 등)에 맞는 thin_density 비율.
+    """
+    return STAGE_KEEP_RATIO.get(stage.rstrip('0123456789'), 1.0)
+
+
+def transpose(notes, rng=None, semitones=0, tracks=None, low=0, high=127):
+    """
+    음높이를 semitones만큼 옮깁니다. [low, high]를 벗어난 음은 옥타브 단위로 접어 넣습니다.
+    """
+    notes = notes.copy()
+    mask = _track_mask(notes, tracks)
+    pitch = notes['pitch'].astype(np.int32) + int(semitones)
+    pitch = np.where(pitch < low, pitch + 12 * ((low - pitch + 11) // 12), pitch)
+    pitch = np.where(pitch > high, pitch - 12 * ((pitch - high + 11) // 12), pitch)
+    notes['pitch'] = np.where(mask, pitch, notes['pitch'])
+    return notes
+
+
+def revoice_chords(notes, rng=None, inversion=0, open_voicing=False, tracks=None):
+    """
+    화음의 자리바꿈/배치를 바꿉니다.
+
+    - inversion: 아래에서부터 inversion개의 음을 한 옥타브 올림 (1 = 첫째 자리바꿈)
+    - open_voicing: 3음 이상 화음의 아래에서 두 번째 음을 한 옥타브 올려 넓게 펼침
+    """
+    notes = notes.copy()
+    chord_mask = (notes['chord'] >= 0) & _track_mask(notes, tracks)
+    if not chord_mask.any():
+        return notes
+    index = np.flatnonzero(chord_mask)
+    order = index[np.lexsort((notes['pitch'][index], notes['chord'][index]))]
+    chord_ids = notes['chord'][order]
+
+    # 정렬된 화음 안에서 각 음의 순위(아래부터 0)와 화음 크기
+    starts = np.flatnonzero(np.r_[True, chord_ids[1:] != chord_ids[:-1]])
+    sizes = np.diff(np.r_[starts, len(order)])
+    group = np.repeat(np.arange(len(starts)), sizes)
+    rank = np.arange(len(order)) - starts[group]
+    size = sizes[group]
+
+    shift = np.where(rank < np.minimum(int(inversion), size - 1), 12, 0)
+    if open_voicing:
+        shift += np.where((size >= 3) & (rank == 1), 12, 0)
+    notes['pitch'][order] = np.clip(notes['pitch'][order] + shift, 0, 127)
+    return notes
+
+
+def compose(*steps):
+    """
+    (notes, rng)를 받는 변환들을 차례로 적용하는 하나의 변환을 만듭니다.
+    매개변수는 functools.partial로 미리 묶어 둡니다.
+    """
+    def apply(notes, rng):
+        for step in steps:
+            notes = step(notes, rng)
+        return notes
+    return apply
+
+
+class StyleProfile:
+    """
+    참고 MIDI의 분석 결과(midi_analyzer)를 변환 매개변수로 옮긴 스타일 정보.
+    """
+
+    def __init__(self, bpm=100, key_name='C', scale_type='major', velocity_mean=60.0,
+                 velocity_min=30, velocity_max=90, density=None):
+        self.bpm = float(bpm)
+        self.key_name = key_name
+        self.scale_type = scale_type
+        self.velocity_mean = float(velocity_mean)
+        self.velocity_min = int(velocity_min)
+        self.velocity_max = int(velocity_max)
+        self.density = density  # 쿼터당 평균 음표 수 (None이면 밀도 조절 안 함)
+
+    @classmethod
+    def from_analysis(cls, bpm=None, key_and_scale=(None, None), dynamics=None, density=None):
+        """
+        midi_analyzer 함수들의 반환값으로 만듭니다. 빠진 값은 기본값을 씁니다.
+        """
+        profile = cls()
+        if bpm:
+            profile.bpm = float(bpm)
+        key_name, scale_type = key_and_scale
+        if key_name:
+            profile.key_name = key_name.split()[0]
+            profile.scale_type = scale_type or profile.scale_type
+        if dynamics and dynamics.get('average_velocity') is not None:
+            profile.velocity_mean = float(dynamics['average_velocity'])
+            profile.velocity_min = int(dynamics['min_velocity'])
+            profile.velocity_max = int(dynamics['max_velocity'])
+        if density and density.get('average_density_notes_per_quarter'):
+            profile.density = float(density['average_density_notes_per_quarter'])
+        return profile
+
+    @classmethod
+    def from_midi(cls, midi_filepath):
+        """
+        MIDI 파일을 midi_analyzer로 분석해 만듭니다 (music21 필요).
+        """
+        from midi_analyzer import get_midi_bpm, get_midi_key_and_scale, get_midi_dynamics, get_midi_density
+
+        return cls.from_analysis(bpm=get_midi_bpm(midi_filepath),
+                                 key_and_scale=get_midi_key_and_scale(midi_filepath),
+                                 dynamics=get_midi_dynamics(midi_filepath),
+                                 density=get_midi_density(midi_filepath))
+
+    @property
+    def velocity_spread(self):
+        # 최소~최대 범위의 약 ±2σ가 되도록
+        return max(1.0, (self.velocity_max - self.velocity_min) / 4.0)
+
+    def keep_ratio(self, notes_per_quarter):
+        """
+        밀도가 notes_per_quarter인 음악을 참고 MIDI 밀도에 맞추려면 남길 비율.
+        """
+        if not self.density or notes_per_quarter <= 0:
+            return 1.0
+        return min(1.0, self.density / notes_per_quarter)
+
+    def to_dict(self):
+        return {'bpm': self.bpm, 'key_name': self.key_name, 'scale_type': self.scale_type,
+                'velocity_mean': self.velocity_mean, 'velocity_min': self.velocity_min,
+                'velocity_max': self.velocity_max, 'density': self.density}
+
+    def transform(self, stage=None, tracks=None, semitones=0, inversion=0, open_voicing=False, fade=(1.0, 1.0),
+                  notes_per_quarter=None):
+        """
+        이 스타일에 맞춘 변환 파이프라인: (자리바꿈/조옮김) → 밀도 → 벨로시티 곡선 → 박자 흔들림.
+        밀도는 구간 비율(stage)과 참고 MIDI 밀도에 맞춘 비율(notes_per_quarter 기준)을 곱해 정합니다.
+        강박 판단이 흐트러지지 않도록 박자 흔들림은 마지막에 적용합니다.
+        """
+        steps = []
+        if inversion or open_voicing:
+            steps.append(partial(revoice_chords, inversion=inversion, open_voicing=open_voicing, tracks=tracks))
+        if semitones:
+            steps.append(partial(transpose, semitones=semitones, tracks=tracks))
+        keep = (stage_keep_ratio(stage) if stage else 1.0) * self.keep_ratio(notes_per_quarter or 0)
+        if keep < 1.0:
+            steps.append(partial(thin_density, keep=keep, tracks=tracks))
+        steps.append(partial(shape_velocity, mean=self.velocity_mean, spread=self.velocity_spread,
+                             start_scale=fade[0], end_scale=fade[1], low=self.velocity_min,
+                             high=self.velocity_max, tracks=tracks))
+        jitter = HUMANIZE_SECONDS * self.bpm / 60.0  # 초 → 쿼터
+        steps.append(partial(humanize_timing, jitter=jitter, tracks=tracks))
+        return compose(*steps)
+
+
+if __name__ == '__main__':
+    # --- 간단한 동작 확인: 수백만 개 음표를 한 번에 변환 ---
+    rng = np.random.default_rng(0)
+    count = 3_000_000
+    onset = np.repeat(np.arange(count // 3) * 0.5, 3)
+    notes = make_notes(onset, 0.5, rng.integers(48, 72, count), track=0, chord=np.arange(count) // 3)
+
+    profile = StyleProfile(bpm=72, velocity_mean=55, velocity_min=35, velocity_max=80)
+    pipeline = profile.transform(stage='NREM2', inversion=1, open_voicing=True, semitones=-2, fade=(1.0, 0.7))
+    start = time.perf_counter()
+    result = pipeline(notes, np.random.default_rng(1))
+    seconds = time.perf_counter() - start
+    print(f"음표 {count}개 → {len(result)}개, {seconds:.2f}초 ({count / seconds / 1e6:.1f}M 음표/초)")
+    print(f"벨로시티 평균 {result['velocity'].mean():.1f}, 범위 {result['velocity'].min()}~{result['velocity'].max()}")
+    print(f"인접 음표 벨로시티 차이 평균: {np.abs(np.diff(result['velocity'].astype(int))).mean():.1f}")
+    chord_sizes = np.bincount(result['chord'][result['chord'] >= 0])
+    print(f"화음 유지: {set(np.unique(chord_sizes[chord_sizes > 0]).tolist())}")
@@ -0,0 +1,147 @@
+import os
+import time
+
+# 선택 가능한 모델 크기와 CPU 추론 정밀도
+MODEL_SIZES = ['small', 'medium']
+PRECISIONS = ['fp32', 'bf16', 'int8']
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'sleep_music_generator', 'models')
+
+
+def _cache_paths(cache_dir, model_size, precision):
+    # 압축 모델은 정밀도와 상관없이 fp32로 쓰므로 크기별로 하나만 둡니다.
+    # LM은 bf16만 따로 저장하고, int8은 로딩 후 동적 양자화하므로 fp32 캐시를 함께 씁니다.
+    prefix = os.path.join(cache_dir, f"musicgen-{model_size}")
+    lm_suffix = '-bf16' if precision == 'bf16' else ''
+    return f"{prefix}{lm_suffix}-lm.pt", f"{prefix}-compression.pt"
+
+
+def _compression_cfg(model_size):
+    """
+    압축 모델 설정. audiocraft는 LM에만 .cfg를 붙이므로 원본 체크포인트에서 읽습니다
+    (체크포인트가 'pretrained' 참조만 가진 경우 None).
+    """
+    from audiocraft.models import loaders
+
+    return loaders.load_compression_model_ckpt(f"facebook/musicgen-{model_size}").get('xp.cfg')
+
+
+def _save_package(module, path, cfg=None):
+    """
+    audiocraft 체크포인트와 같은 형식({'xp.cfg', 'best_state'})으로 저장합니다.
+    cfg를 주지 않으면 module.cfg를 씁니다.
+    임시 파일에 쓴 뒤 교체하므로 저장 중 종료되어도 캐시가 깨지지 않습니다.
+    """
+    import torch
+    from omegaconf import OmegaConf
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    pkg = {
+        'xp.cfg': OmegaConf.to_container(OmegaConf.create(module.cfg if cfg is None else cfg), resolve=True),
+        'best_state': module.state_dict(),
+    }
+    tmp_path = f"{path}.tmp"
+    try:
+        torch.save(pkg, tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)  # 저장 실패 시 반쯤 쓴 임시 파일을 남기지 않음
+
+
+def _load_package(path, builder):
+    """
+    캐시된 가중치를 메모리 매핑(mmap)으로 열어 모델에 그대로 연결합니다 (복사 없음).
+    """
+    import torch
+    from omegaconf import OmegaConf
+
+    pkg = torch.load(path, map_location='cpu', mmap=True, weights_only=False)
+    cfg = OmegaConf.create(pkg['xp.cfg'])
+    cfg.device = 'cpu'
+    module = builder(cfg)
+    module.load_state_dict(pkg['best_state'], assign=True)
+    module.eval()
+    module.cfg = cfg
+    return module
+
+
+def _apply_precision(model, precision):
+    import torch
+
+    if precision == 'bf16':
+        model.lm = model.lm.to(torch.bfloat16)
+    elif precision == 'int8':
+        # nn.Linear(FFN, 출력층 등)만 int8 동적 양자화. 어텐션 입력 투영은 fp32로 유지됩니다.
+        model.lm = torch.ao.quantization.quantize_dynamic(model.lm, {torch.nn.Linear}, dtype=torch.qint8)
+    return model
+
+
+def load_musicgen(model_size='medium', duration=120, precision='fp32', cache_dir=None, log=None):
+    """
+    MusicGen 모델을 로딩합니다. torch/audiocraft는 이 함수가 호출될 때 임포트됩니다.
+
+    처음 로딩할 때 가중치를 cache_dir에 저장해 두고, 이후에는 메모리 매핑으로
+    불러오므로 프로세스 시작 시 로딩 시간이 크게 줄어듭니다.
+
+    Args:
+        model_size (str): 'small' 또는 'medium'.
+        duration (int): 세그먼트 1개 생성 길이(초).
+        precision (str): 'fp32'(기본값), 'bf16'(가중치 bfloat16), 'int8'(nn.Linear 동적 양자화).
+        cache_dir (str): 가중치 캐시 폴더 (기본값: ~/.cache/sleep_music_generator/models).
+            LM은 모델 크기(+bf16)별, 압축 모델은 크기별로 저장합니다. False를 넘기면 캐시를 사용하지 않습니다.
+        log (callable): 로그 함수 (기본값: 출력 없음).
+
+    Returns:
+        MusicGen: 생성 파라미터가 설정된 모델.
+    """
+    if model_size not in MODEL_SIZES:
+        raise ValueError(f"지원하지 않는 모델 크기입니다: {model_size} (가능: {MODEL_SIZES})")
+    if precision not in PRECISIONS:
+        raise ValueError(f"지원하지 않는 정밀도입니다: {precision} (가능: {PRECISIONS})")
+    log = log or (lambda message: None)
+
+    from audiocraft.models import MusicGen, builders, loaders
+
+    name = f"facebook/musicgen-{model_size}"
+    start_time = time.time()
+    model = None
+    lm_path = compression_path = None
+    if cache_dir is not False:
+        lm_path, compression_path = _cache_paths(cache_dir or DEFAULT_CACHE_DIR, model_size, precision)
+        if os.path.exists(lm_path):
+            try:
+                lm = _load_package(lm_path, builders.get_lm_model)
+                if os.path.exists(compression_path):
+                    compression_model = _load_package(compression_path, builders.get_compression_model)
+                else:
+                    compression_model = loaders.load_compression_model(name, device='cpu')
+                model = MusicGen(name, compression_model, lm)
+                log(f"캐시된 가중치 사용: {lm_path}")
+            except Exception as e:
+                log(f"❗ 가중치 캐시 로딩 실패, 원본에서 다시 로딩합니다: {e}")
+                model = None
+
+    if model is None:
+        model = MusicGen.get_pretrained(model_size, device='cpu')
+        if precision == 'bf16':
+            model = _apply_precision(model, 'bf16')
+        if lm_path:
+            # 캐시 저장은 다음 실행을 빠르게 할 뿐이므로, 실패해도 이번 로딩은 그대로 진행.
+            # 파일마다 임시 파일에 쓴 뒤 교체하므로 실패해도 반쯤 쓴 캐시는 남지 않습니다.
+            try:
+                _save_package(model.lm, lm_path)
+                log(f"가중치 캐시 저장: {lm_path}")
+                if not os.path.exists(compression_path):
+                    compression_cfg = _compression_cfg(model_size)
+                    if compression_cfg is not None:
+                        _save_package(model.compression_model, compression_path, cfg=compression_cfg)
+            except Exception as e:
+                log(f"❗ 가중치 캐시 저장 실패, 캐시 없이 계속합니다: {e}")
+
+    if precision == 'int8':
+        model = _apply_precision(model, 'int8')
+
+    model.set_generation_params(duration=duration)
+    log(f"MusicGen {model_size} ({precision}) 로딩 완료: {time.time() - start_time:.1f}초")
+    return model
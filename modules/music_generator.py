@@ -1,13 +1,17 @@
 import music21
 import os
-import random
+import json
 import time
 from pydub import AudioSegment
 from pydub.playback import play # 테스트용 (실제 사용 시에는 필요 없을 수 있음)
 import traceback
 
-# music_analyzer.py에서 분석 함수들을 임포트 (만약 직접 사용한다면)
-# from midi_analyzer import get_midi_bpm, get_midi_key_and_scale, get_midi_dynamics, get_midi_density
+from rng import RNG_SCHEME, stream
+from midi_transform import StyleProfile, make_notes, sort_notes
+from pattern_render import PatternRenderer, RENDER_SAMPLE_RATE
+from audio_io import write_wav_blocks
+
+# 참고 MIDI의 분석 결과는 midi_transform.StyleProfile.from_midi(경로)로 받아 profile 인자로 넘깁니다.
 
 # --- 설정값 ---
 TARGET_DURATION_MINUTES = 10
@@ -15,26 +19,55 @@ BPM = 100 # 고정 BPM (나중에 분석된 값으로 대체 가능)
 KEY_NAME = 'C' # 고정 키 (나중에 분석된 값으로 대체 가능)
 SCALE_TYPE = 'major' # 고정 스케일 (나중에 분석된 값으로 대체 가능)
 
-# 다이내믹스 범위 (예시: midi_analyzer에서 추출된 common_velocity_ranges를 기반으로 설정)
-# 실제 프로젝트에서는 midi_analyzer.py의 get_midi_dynamics 결과에서 가져올 수 있습니다.
-VELOCITY_RANGES = [
-    (0, 31),   # ppp-pp
-    (32, 63),  # p-mp
-    (64, 95),  # mf-f
-    (96, 127)  # ff-fff
-]
-# 각 범위에서 무작위로 벨로시티 선택
-def get_random_velocity():
-    chosen_range = random.choice(VELOCITY_RANGES)
-    return random.randint(chosen_range[0], chosen_range[1])
+# 트랙 번호 (midi_transform 음표 배열의 track 필드)
+PIANO_TRACK, VIOLIN_TRACK, DRUM_TRACK = 0, 1, 2
+MELODIC_TRACKS = (PIANO_TRACK, VIOLIN_TRACK)
+RENDER_VOICES = {PIANO_TRACK: 'piano', VIOLIN_TRACK: 'strings', DRUM_TRACK: 'drums'}
+DRUM_VARIATIONS = 4 # 곡 전체에서 돌려 쓰는 드럼 마디 벨로시티 패턴 수
+
+def _choice(rng, items):
+    return items[rng.integers(len(items))]
+
+# 드럼 마디 벨로시티 패턴 (8분음표 8칸)을 곡 시드로 몇 개만 만들어 둡니다.
+# 마디마다 벨로시티를 새로 뽑으면 모든 마디가 서로 달라져 렌더러의 마디 캐시가 재사용되지 않으므로,
+# 각 마디는 이 중 하나를 골라 씁니다.
+def _drum_variations(rng, count=DRUM_VARIATIONS):
+    return [{'bass': int(rng.integers(90, 121)), 'snare': int(rng.integers(60, 91)),
+             'hat': rng.integers(40, 71, 8).tolist()} for _ in range(count)]
+
+# 음표 배열을 music21 파트에 넣습니다. chord 번호가 같은 음표는 하나의 Chord로 묶습니다.
+# 박자 흔들림으로 생긴 onset/길이는 1/96 쿼터 단위로 반올림합니다 (MIDI 해상도 수준).
+def _insert_notes(part, notes):
+    chords = {}
+    for onset, duration, pitch, velocity, _, chord_id in notes.tolist():
+        onset, duration = round(onset * 96) / 96, max(round(duration * 96), 1) / 96
+        if chord_id >= 0:
+            chords.setdefault(chord_id, []).append((onset, duration, pitch, velocity))
+            continue
+        n = music21.note.Note(pitch, quarterLength=duration)
+        n.volume.velocity = velocity
+        part.insert(onset, n)
+    for members in chords.values():
+        onset, duration, _, velocity = members[0]
+        chord_obj = music21.chord.Chord([pitch for _, _, pitch, _ in members], quarterLength=duration)
+        chord_obj.volume.velocity = velocity
+        part.insert(onset, chord_obj)
 
 # --- 음악 생성 함수 ---
-def generate_music_and_convert_to_mp3(output_filename="generated_music.mp3"):
+# seed: 같은 값이면 같은 MIDI가 만들어집니다 (None이면 새로 정해 기록).
+# 트랙(piano/violin/drum)과 섹션마다 독립된 난수 흐름을 쓰므로 어느 섹션이든 단독으로 다시 만들 수 있습니다.
+# profile: 벨로시티/밀도/박자 흔들림의 기준 (midi_transform.StyleProfile, None이면 기본값)
+# stage: 수면 구간('NREM2' 등)을 주면 그 구간에 맞게 음표 밀도를 줄입니다.
+def generate_music_and_convert_to_mp3(output_filename="generated_music.mp3", seed=None, profile=None, stage=None):
     print(f"--- 10분 길이 음악 생성 시작 ---")
+    if seed is None:
+        seed = int.from_bytes(os.urandom(4), 'little') & 0x7fffffff
+    print(f"DEBUG: 시드 {seed} ({RNG_SCHEME})")
     
     output_dir = os.path.dirname(os.path.abspath(__file__)) # 현재 스크립트가 있는 modules 폴더
     midi_output_filepath = os.path.join(output_dir, "generated_music_temp.mid")
     mp3_output_filepath = os.path.join(output_dir, output_filename)
+    seed_output_filepath = os.path.splitext(midi_output_filepath)[0] + ".json"
 
     # 이전 임시 파일 삭제 (만약 있다면)
     if os.path.exists(midi_output_filepath):
@@ -66,10 +99,23 @@ def generate_music_and_convert_to_mp3(output_filename="generated_music.mp3"):
 
     current_offset = 0.0
     section_length = 8.0 # 8 쿼터 길이 (2마디) 마다 패턴 변화 시도
+
+    # 음표는 (onset, 길이, 음높이, 벨로시티, 트랙, 화음 번호)로 모아 두었다가
+    # 마지막에 midi_transform 파이프라인(박자 흔들림, 밀도, 벨로시티 곡선)을 한 번에 적용합니다.
+    events = []
+    chord_count = 0
+    bass_drum, snare_drum, hi_hat = (music21.pitch.Pitch(name).midi for name in ('C2', 'D2', 'G2'))
     
     # 10분 길이까지 음악 생성
     start_time = time.time()
+    section_index = 0
+    drum_variations = _drum_variations(stream(seed, 'drum'))
     while current_offset < total_quarter_length:
+        # 섹션별/트랙별 난수 흐름
+        piano_rng = stream(seed, 'piano', section_index)
+        violin_rng = stream(seed, 'violin', section_index)
+        drum_rng = stream(seed, 'drum', section_index)
+
         # 피아노 파트 (화음 및 저음 멜로디)
         # 간단한 C-F-G-C 진행 반복 (C Major 스케일 내)
         chord_root_pitches = [
@@ -80,39 +126,31 @@ def generate_music_and_convert_to_mp3(output_filename="generated_music.mp3"):
         ]
         
         for i in range(2): # 각 section_length마다 2번의 코드 진행
-            root_pitch = random.choice(chord_root_pitches) # 매번 다른 코드 시작
+            root_pitch = _choice(piano_rng, chord_root_pitches) # 매번 다른 코드 시작
             chord_pitches = [root_pitch, scale.getTonic().transpose(4), scale.getTonic().transpose(7)] # 근음, 3음, 5음
             
             # 화음 (세 음을 동시에, 긴 길이)
-            chord_obj = music21.chord.Chord(chord_pitches)
-            chord_obj.quarterLength = section_length / len(chord_root_pitches) / 2 # 2번 코드 진행에 맞춤
-            chord_obj.volume.velocity = get_random_velocity()
-            piano_part.insert(current_offset + i * chord_obj.quarterLength * 2, chord_obj)
+            chord_length = section_length / len(chord_root_pitches) / 2 # 2번 코드 진행에 맞춤
+            chord_offset = current_offset + i * chord_length * 2
+            for chord_pitch in chord_pitches:
+                events.append((chord_offset, chord_length, chord_pitch.midi, 0, PIANO_TRACK, chord_count))
+            chord_count += 1
 
-            # 베이스 노트 (간단한 베이스 라인)
-            bass_note = music21.note.Note(root_pitch.transpose(-12)) # 한 옥타브 아래
-            bass_note.quarterLength = chord_obj.quarterLength
-            bass_note.volume.velocity = get_random_velocity()
-            piano_part.insert(current_offset + i * chord_obj.quarterLength * 2, bass_note)
+            # 베이스 노트 (간단한 베이스 라인, 한 옥타브 아래)
+            events.append((chord_offset, chord_length, root_pitch.midi - 12, 0, PIANO_TRACK, -1))
 
 
         # 바이올린 파트 (주요 멜로디)
-        melody_notes_in_section = []
-        num_melody_notes = random.randint(int(section_length * 1.5), int(section_length * 2.5)) # 밀도 변화
+        num_melody_notes = int(violin_rng.integers(int(section_length * 1.5), int(section_length * 2.5) + 1)) # 밀도 변화
         melody_offset_in_section = 0.0
         
         while melody_offset_in_section < section_length:
-            pitch_choice = random.choice(scale.getPitches(f'{KEY_NAME}4', f'{KEY_NAME}5')) # C4~C5 옥타브 내에서 선택
-            note_length = random.choice([0.5, 1.0]) # 8분음표, 4분음표
+            pitch_choice = _choice(violin_rng, scale.getPitches(f'{KEY_NAME}4', f'{KEY_NAME}5')) # C4~C5 옥타브 내에서 선택
+            note_length = _choice(violin_rng, [0.5, 1.0]) # 8분음표, 4분음표
 
-            n = music21.note.Note(pitch_choice, quarterLength=note_length)
-            n.volume.velocity = get_random_velocity()
-            melody_notes_in_section.append((n, current_offset + melody_offset_in_section))
-            
+            events.append((current_offset + melody_offset_in_section, note_length, pitch_choice.midi, 0,
+                           VIOLIN_TRACK, -1))
             melody_offset_in_section += note_length
-            
-        for note, offset in melody_notes_in_section:
-            violin_part.insert(offset, note)
 
 
         # 드럼 파트 (간단한 비트)
@@ -120,32 +158,47 @@ def generate_music_and_convert_to_mp3(output_filename="generated_music.mp3"):
         drum_pattern_length = 4.0 # 4분음표 4개
         drum_offset_in_section = 0.0
         while drum_offset_in_section < section_length:
+            position = int(drum_offset_in_section % drum_pattern_length / 0.5) # 마디 안 8분음표 칸
+            if position == 0:
+                variation = _choice(drum_rng, drum_variations) # 마디마다 벨로시티 패턴 선택
+
             # 베이스 드럼 (1, 3박에 강하게)
             if drum_offset_in_section % 4.0 == 0.0:
-                bd = music21.note.Note('C2', quarterLength=0.5)
-                bd.volume.velocity = random.randint(90, 120) # 강하게
-                drum_part.insert(current_offset + drum_offset_in_section, bd)
+                events.append((current_offset + drum_offset_in_section, 0.5, bass_drum,
+                               variation['bass'], DRUM_TRACK, -1)) # 강하게
             
             # 스네어 드럼 (2, 4박에 보통)
             if drum_offset_in_section % 4.0 == 2.0:
-                sd = music21.note.Note('D2', quarterLength=0.5)
-                sd.volume.velocity = random.randint(60, 90) # 보통
-                drum_part.insert(current_offset + drum_offset_in_section, sd)
+                events.append((current_offset + drum_offset_in_section, 0.5, snare_drum,
+                               variation['snare'], DRUM_TRACK, -1)) # 보통
 
             # 하이햇 (매 8분음표마다)
-            hh = music21.note.Note('G2', quarterLength=0.5)
-            hh.volume.velocity = random.randint(40, 70) # 약하게
-            drum_part.insert(current_offset + drum_offset_in_section, hh)
+            events.append((current_offset + drum_offset_in_section, 0.5, hi_hat,
+                           variation['hat'][position], DRUM_TRACK, -1)) # 약하게
 
             drum_offset_in_section += 0.5 # 8분음표 단위로 진행
 
 
         current_offset += section_length # 다음 섹션으로 이동
+        section_index += 1
         
         if int(current_offset) % (BPM * 1) == 0: # 1분마다 진행 상황 출력 (BPM 100 기준 100쿼터 = 1분)
             elapsed_minutes = round(current_offset / BPM, 1)
             print(f"DEBUG: {elapsed_minutes}분 길이 생성 중...")
 
+    # 멜로디 트랙(피아노/바이올린)에 변환 파이프라인 적용. 드럼은 박과 벨로시티를 그대로 둡니다.
+    if profile is None:
+        profile = StyleProfile(bpm=BPM, key_name=KEY_NAME, scale_type=SCALE_TYPE)
+    notes = make_notes(*zip(*events))
+    melodic_count = int((notes['track'] != DRUM_TRACK).sum())
+    transform = profile.transform(stage=stage, tracks=MELODIC_TRACKS,
+                                  notes_per_quarter=melodic_count / max(current_offset, 1.0))
+    notes = sort_notes(transform(notes, stream(seed, 'transform')))
+    print(f"DEBUG: 음표 {len(events)}개 → 변환 후 {len(notes)}개")
+
+    for part, track in ((piano_part, PIANO_TRACK), (violin_part, VIOLIN_TRACK), (drum_part, DRUM_TRACK)):
+        _insert_notes(part, notes[notes['track'] == track])
+
     s.insert(0, piano_part)
     s.insert(0, violin_part)
     s.insert(0, drum_part)
@@ -156,66 +209,35 @@ def generate_music_and_convert_to_mp3(output_filename="generated_music.mp3"):
     try:
         s.write('midi', fp=midi_output_filepath)
         print(f"MIDI 파일이 생성되었습니다: {midi_output_filepath}")
+        # 같은 결과를 다시 만들 수 있도록 시드 기록
+        with open(seed_output_filepath, 'w', encoding='utf-8') as f:
+            json.dump({'seed': seed, 'rng': RNG_SCHEME, 'sections': section_index,
+                       'target_minutes': TARGET_DURATION_MINUTES, 'bpm': BPM, 'key': KEY_NAME,
+                       'stage': stage, 'profile': profile.to_dict()}, f, indent=4)
     except Exception as e:
         print(f"MIDI 파일 저장 중 오류 발생: {e}")
         traceback.print_exc()
         return None
 
     # --- MIDI to MP3 변환 ---
-    print(f"--- MIDI to MP3 변환 시작 (시간이 다소 소요될 수 있습니다) ---")
+    # 변환된 음표 배열을 마디 패턴 캐시로 바로 렌더링합니다 (반복되는 드럼/화음 마디는 한 번만 합성).
+    # 실제 악기 음색이 필요하면 생성된 MIDI를 Fluidsynth + .sf2 사운드폰트로 따로 렌더링할 수 있습니다.
+    print(f"--- MIDI to MP3 변환 시작 ---")
+    wav_temp_filepath = os.path.join(output_dir, "generated_music_temp.wav")
     try:
-        # music21이 직접 MIDI를 WAV로 렌더링하는 기능 (fluidsynth 필요, 설치가 복잡)
-        # 대안: 외부 MIDI 렌더러 사용 (SimpleSynth 등) 또는 사운드폰트 설정
-        # music21의 show('midi')는 재생만 하고 파일로 저장하는 기능이 제한적
-
-        # 여기서는 music21로 MIDI 파일 생성 후, pydub로 변환을 시도합니다.
-        # pydub는 내부적으로 ffmpeg를 사용하며, midi 파일을 직접 다루지 못하므로
-        # midi to wav 렌더링 과정이 필요합니다.
-        # 이 부분을 위해선 Fluidsynth와 사운드폰트 설치가 권장됩니다.
-        # 하지만 일단은 파일을 만들고, 수동으로 렌더링하거나, music21의 임시 재생 기능을 이용하는 것으로 가정합니다.
-        # 또는, "pydub.AudioSegment.from_file(midi_output_filepath)" 를 사용해보고 안되면 수동 렌더링을 안내합니다.
-
-        # 임시 MIDI 파일을 로드하여 변환 시도
-        # 주의: pydub는 기본적으로 MIDI 파일을 직접 WAV로 렌더링하는 기능을 내장하고 있지 않습니다.
-        # 이를 위해선 Fluidsynth 등의 외부 MIDI 렌더링 도구가 필요합니다.
-        # 아래 코드는 일단 pydub로 바로 시도하지만, 실패 시 수동 렌더링 안내가 필요합니다.
-        
-        # music21을 통해 MIDI 파일을 재생하거나 WAV로 렌더링하는 더 일반적인 방법은
-        # music21.midi.realtime.StreamPlayer를 사용하는 것이나, 파일 저장까지는 복잡합니다.
-        # 따라서, 여기서는 **생성된 MIDI 파일**을 **수동으로 WAV로 변환**하거나
-        # Fluidsynth를 설치하여 Python에서 자동화하는 방안을 고려해야 합니다.
-
-        # 편의상, 일단 MIDI 파일만 생성하고, MP3 변환 부분은 다음 단계에서 자세히 다루겠습니다.
-        # 현재 코드에서는 music21로 MIDI를 생성까지만 하고, MP3 변환은 주석 처리합니다.
-        # MP3 변환을 자동화하려면 Fluidsynth와 사운드폰트 설치가 필수적입니다.
-        
-        # **********************************************************************
-        # 이 부분은 아직 자동화가 불가능하며, Fluidsynth 설치가 필요합니다.
-        # 아래 코드는 Fluidsynth가 설치되어 있고 Path에 추가되었음을 가정합니다.
-        # **********************************************************************
-        
-        # 예시: fluidsynth를 사용하여 MIDI -> WAV 변환 (fluidsynth 설치 후)
-        # import subprocess
-        # soundfont_path = "path/to/your/soundfont.sf2" # 사운드폰트 경로 설정
-        # wav_temp_filepath = os.path.join(output_dir, "generated_music_temp.wav")
-        # command = f"fluidsynth -ni {soundfont_path} {midi_output_filepath} -F {wav_temp_filepath} -r 44100"
-        # subprocess.run(command, shell=True)
-        # print(f"MIDI to WAV 변환 완료: {wav_temp_filepath}")
-
-        # if os.path.exists(wav_temp_filepath):
-        #     audio = AudioSegment.from_wav(wav_temp_filepath)
-        #     audio.export(mp3_output_filepath, format="mp3", bitrate="192k")
-        #     print(f"MP3 파일이 생성되었습니다: {mp3_output_filepath}")
-        #     os.remove(wav_temp_filepath) # 임시 WAV 파일 삭제
-        # else:
-        #     print("경고: WAV 파일이 생성되지 않아 MP3 변환을 건너뛰었습니다. Fluidsynth 설치 및 사운드폰트 확인 필요.")
-
-        print(f"\n참고: MP3 파일 자동 생성을 위해서는 'Fluidsynth' 프로그램과 '.sf2' 사운드폰트 파일 설치가 필요합니다.")
-        print(f"생성된 MIDI 파일 ({midi_output_filepath})을 사용하여 수동으로 MP3를 변환하거나,")
-        print(f"다음 단계에서 Fluidsynth 설치 및 자동화 방법을 안내해 드릴 수 있습니다.")
+        renderer = PatternRenderer(BPM, voices=RENDER_VOICES)
+        render_start = time.time()
+        frames = write_wav_blocks(wav_temp_filepath, renderer.render_blocks(notes), RENDER_SAMPLE_RATE)
+        print(f"DEBUG: {frames / RENDER_SAMPLE_RATE / 60:.1f}분 렌더링 {time.time() - render_start:.1f}초, "
+              f"{renderer.summary()}")
+
+        audio = AudioSegment.from_wav(wav_temp_filepath)
+        audio.export(mp3_output_filepath, format="mp3", bitrate="192k")
+        print(f"MP3 파일이 생성되었습니다: {mp3_output_filepath}")
+        os.remove(wav_temp_filepath) # 임시 WAV 파일 삭제
 
     except Exception as e:
-        print(f"MP3 변환 중 오류 발생 (Fluidsynth 또는 사운드폰트 문제일 수 있습니다): {e}")
+        print(f"MP3 변환 중 오류 발생 (ffmpeg 설치를 확인하세요): {e}")
         traceback.print_exc()
 
     print(f"--- 음악 생성 및 변환 프로세스 완료 ---")
@@ -0,0 +1,253 @@
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from midi_transform import BEATS_PER_BAR
+
+# midi_transform 음표 배열을 NumPy 합성음으로 렌더링합니다.
+# 같은 마디 패턴(마디 안 위치/길이/음높이/양자화한 벨로시티가 모두 같은 음표 묶음)이 두 번째 나오면
+# PCM 캐시에 두고, 타임라인은 캐시된 마디 버퍼를 제자리에 더해서 만듭니다.
+# 렌더링 비용이 전체 길이가 아니라 서로 다른 마디 수에 비례합니다.
+RENDER_SAMPLE_RATE = 32000        # MusicGen 세그먼트와 같은 32kHz 모노
+ONSET_GRID = 96                   # 쿼터당 격자 (music_generator._insert_notes와 같은 MIDI 해상도)
+VELOCITY_STEP = 8                 # 벨로시티 양자화 간격 (16단계)
+RELEASE_SECONDS = 0.4             # 음표가 끝난 뒤 남는 울림
+DEFAULT_CACHE_BYTES = 256 * 1024 ** 2
+DEFAULT_VOICES = {0: 'piano', 1: 'strings', 2: 'drums'}
+VOICE_LEVELS = {'piano': 0.3, 'strings': 0.18, 'drums': 0.35}
+
+
+class PcmLruCache:
+    """
+    바이트 크기 상한이 있는 메모리 PCM 캐시. 넘치면 가장 오래 쓰지 않은 버퍼부터 버립니다.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._items = OrderedDict()
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key):
+        buffer = self._items.get(key)
+        if buffer is None:
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return buffer
+
+    def put(self, key, buffer):
+        if key in self._items:
+            self.bytes -= self._items.pop(key).nbytes
+        self._items[key] = buffer
+        self.bytes += buffer.nbytes
+        while self.bytes > self.max_bytes and self._items:
+            _, evicted = self._items.popitem(last=False)
+            self.bytes -= evicted.nbytes
+            self.evictions += 1
+
+
+def synthesize_note(voice, pitch, seconds, velocity, sample_rate=RENDER_SAMPLE_RATE):
+    """
+    음표 1개를 합성합니다 (간단한 배음 합성, 같은 입력이면 항상 같은 결과).
+
+    Args:
+        voice (str): 'piano', 'strings', 'drums'.
+        seconds (float): 음표 길이(초). 끝난 뒤 RELEASE_SECONDS만큼 울림이 이어집니다.
+
+    Returns:
+        np.ndarray: [frames] float32.
+    """
+    frames = int((seconds + RELEASE_SECONDS) * sample_rate)
+    t = np.arange(frames) / sample_rate
+    release = np.clip((seconds + RELEASE_SECONDS - t) / RELEASE_SECONDS, 0.0, 1.0)
+    freq = 440.0 * 2.0 ** ((pitch - 69) / 12.0)
+    gain = VOICE_LEVELS[voice] * velocity / 127.0
+
+    if voice == 'piano':
+        audio = sum(amp * np.sin(2 * np.pi * freq * harmonic * t)
+                    for harmonic, amp in ((1, 1.0), (2, 0.5), (3, 0.25), (4, 0.12)))
+        audio *= np.exp(-t * (1.5 + freq / 500.0)) * np.minimum(t / 0.005, 1.0)
+    elif voice == 'strings':
+        phase = 2 * np.pi * freq * t + 0.003 * freq / 5.0 * np.sin(2 * np.pi * 5.0 * t)  # 5Hz 비브라토
+        audio = sum(np.sin(harmonic * phase) / harmonic for harmonic in range(1, 7))
+        audio *= np.minimum(t / 0.08, 1.0)
+    else:
+        noise = np.random.default_rng(pitch).standard_normal(frames)  # 음높이별 고정 잡음
+        if pitch <= 36:    # 베이스 드럼: 아래로 휘는 사인
+            audio = np.sin(2 * np.pi * (45.0 * t + 75.0 * (1 - np.exp(-t * 30.0)) / 30.0)) * np.exp(-t * 12.0)
+        elif pitch <= 40:  # 스네어: 잡음 + 몸통 울림
+            audio = (0.6 * noise + 0.5 * np.sin(2 * np.pi * 180.0 * t)) * np.exp(-t * 20.0)
+        else:              # 하이햇: 고역 잡음
+            audio = 0.5 * np.diff(noise, prepend=0.0) * np.exp(-t * 60.0)
+    return (gain * audio * release).astype(np.float32)
+
+
+class PatternRenderer:
+    """
+    음표 배열(midi_transform.NOTE_DTYPE)을 마디 패턴 캐시로 렌더링합니다.
+
+    트랙마다 마디 단위로 음표를 묶어 (마디 안 onset, 길이, 음높이, 양자화 벨로시티) 목록을 키로 씁니다.
+    마디는 음표 버퍼(역시 캐시)를 더해 만들고, 같은 키를 두 번째 볼 때부터 마디 버퍼를 캐시에 둡니다.
+    한 번만 나오는 마디가 반복되는 마디 버퍼를 LRU에서 밀어내지 않게 하기 위해서입니다.
+    마디 밖으로 이어지는 울림은 다음 마디 위에 겹쳐 더해집니다.
+    박자 흔들림(humanize)이 들어간 멜로디 마디는 거의 반복되지 않으므로 음표 단위 캐시가 대신 받칩니다.
+
+    Args:
+        bpm (float): 템포.
+        voices (dict): 트랙 번호 → 음색 ('piano', 'strings', 'drums').
+        velocity_step (int): 벨로시티 양자화 간격 (클수록 반복으로 보는 마디가 많아짐).
+        max_cache_bytes (int): 마디/음표 PCM 캐시 상한 (넘치면 LRU로 버림).
+    """
+
+    def __init__(self, bpm, sample_rate=RENDER_SAMPLE_RATE, voices=None, velocity_step=VELOCITY_STEP,
+                 bar_quarters=BEATS_PER_BAR, max_cache_bytes=DEFAULT_CACHE_BYTES):
+        self.bpm = bpm
+        self.sample_rate = sample_rate
+        self.voices = dict(DEFAULT_VOICES if voices is None else voices)
+        self.velocity_step = velocity_step
+        self.bar_units = int(round(bar_quarters * ONSET_GRID))
+        self.frames_per_unit = 60.0 / bpm / ONSET_GRID * sample_rate
+        self.cache = PcmLruCache(max_cache_bytes)
+        self._seen_bars = set()  # 한 번 본 마디 키 (두 번째부터 캐시)
+        self.stats = {'bars': 0, 'unique_bars': 0, 'notes': 0, 'synthesized_notes': 0}
+
+    def _note_buffer(self, voice, pitch, duration_units, velocity):
+        key = ('note', voice, pitch, duration_units, velocity)
+        buffer = self.cache.get(key)
+        if buffer is None:
+            seconds = duration_units * 60.0 / self.bpm / ONSET_GRID
+            buffer = synthesize_note(voice, pitch, seconds, velocity, self.sample_rate)
+            self.stats['synthesized_notes'] += 1
+            self.cache.put(key, buffer)
+        return buffer
+
+    def _bar_buffer(self, track, rows):
+        """
+        rows: [n, 4] int32 (마디 안 onset 격자, 길이 격자, 음높이, 벨로시티).
+        """
+        key = ('bar', track, rows.tobytes())
+        buffer = self.cache.get(key)
+        if buffer is not None:
+            return buffer
+        voice = self.voices.get(track, 'piano')
+        pieces = [(int(round(onset * self.frames_per_unit)), self._note_buffer(voice, pitch, duration, velocity))
+                  for onset, duration, pitch, velocity in rows.tolist()]
+        buffer = np.zeros(max(offset + len(piece) for offset, piece in pieces), dtype=np.float32)
+        for offset, piece in pieces:
+            buffer[offset:offset + len(piece)] += piece
+        if key in self._seen_bars:
+            self.cache.put(key, buffer)
+        else:
+            self._seen_bars.add(key)
+            self.stats['unique_bars'] += 1
+        return buffer
+
+    def bars(self, notes):
+        """
+        음표를 (트랙, 마디)로 묶습니다.
+
+        Returns:
+            list: [(마디 시작 프레임, 트랙, [n, 4] int32 패턴), ...] 시작 프레임 순서.
+        """
+        if len(notes) == 0:
+            return []
+        onset = np.maximum(np.round(notes['onset'] * ONSET_GRID).astype(np.int64), 0)
+        duration = np.maximum(np.round(notes['duration'] * ONSET_GRID).astype(np.int64), 1)
+        step = self.velocity_step
+        velocity = np.clip(notes['velocity'] // step * step + step // 2, 1, 127).astype(np.int64)
+        bar = onset // self.bar_units
+        track = notes['track'].astype(np.int64)
+
+        order = np.lexsort((notes['pitch'], onset, bar, track))
+        rows = np.stack([onset - bar * self.bar_units, duration, notes['pitch'].astype(np.int64), velocity],
+                        axis=1)[order].astype(np.int32)
+        bar, track = bar[order], track[order]
+        starts = np.flatnonzero(np.r_[True, (bar[1:] != bar[:-1]) | (track[1:] != track[:-1])])
+        ends = np.r_[starts[1:], len(order)]
+        groups = [(int(round(bar[start] * self.bar_units * self.frames_per_unit)), int(track[start]),
+                   rows[start:end]) for start, end in zip(starts, ends)]
+        groups.sort(key=lambda group: group[0])
+        return groups
+
+    def render_blocks(self, notes, block_seconds=60.0):
+        """
+        타임라인을 block_seconds 길이의 [frames] float32 블록으로 내보냅니다
+        (몇 시간 길이도 메모리에는 블록 하나와 겹치는 울림만 둠).
+        """
+        block_frames = int(block_seconds * self.sample_rate)
+        accumulator = np.zeros(block_frames, dtype=np.float32)
+        accumulator_start = 0
+        end_frame = 0
+        for start, track, rows in self.bars(notes):
+            # 이 마디보다 앞선 구간은 더 이상 더해질 음이 없으므로 내보냄
+            while start >= accumulator_start + block_frames:
+                yield accumulator[:block_frames].copy()
+                accumulator = np.concatenate([accumulator[block_frames:], np.zeros(block_frames, np.float32)])
+                accumulator_start += block_frames
+            buffer = self._bar_buffer(track, rows)
+            offset = start - accumulator_start
+            if offset + len(buffer) > len(accumulator):
+                accumulator = np.concatenate([accumulator, np.zeros(offset + len(buffer) - len(accumulator),
+                                                                    np.float32)])
+            accumulator[offset:offset + len(buffer)] += buffer
+            end_frame = max(end_frame, start + len(buffer))
+            self.stats['bars'] += 1
+            self.stats['notes'] += len(rows)
+
+        while accumulator_start < end_frame:
+            length = min(block_frames, end_frame - accumulator_start)
+            yield accumulator[:length].copy()
+            accumulator = accumulator[length:]
+            accumulator_start += length
+
+    def render(self, notes):
+        """
+        전체 타임라인을 배열 하나로 렌더링합니다 (짧은 곡용).
+        """
+        blocks = list(self.render_blocks(notes))
+        return np.concatenate(blocks) if blocks else np.zeros(0, dtype=np.float32)
+
+    def summary(self):
+        stats = dict(self.stats, cache_hits=self.cache.hits, cache_misses=self.cache.misses,
+                     cache_evictions=self.cache.evictions, cache_mb=round(self.cache.bytes / 1024 ** 2, 1))
+        stats['bar_reuse'] = round(1 - stats['unique_bars'] / max(stats['bars'], 1), 3)
+        return stats
+
+
+if __name__ == '__main__':
+    # --- 간단한 동작 확인: 드럼 그리드 + 화음 순환 1시간 ---
+    from midi_transform import make_notes
+
+    rng = np.random.default_rng(0)
+    bpm, quarters = 100, 100 * 60
+    beats = np.arange(0, quarters, 0.5)
+    # music_generator처럼 마디마다 4가지 벨로시티 패턴 중 하나를 고름
+    variations = rng.integers(40, 121, (4, 8))
+    velocity = variations[rng.integers(0, 4, len(beats) // 8)].reshape(-1)
+    drums = make_notes(beats, 0.5, np.where(beats % 4 == 0, 36, np.where(beats % 4 == 2, 38, 43)),
+                       velocity, track=2)
+    chord_onsets = np.arange(0, quarters, 2.0)
+    roots = rng.choice([60, 65, 67], len(chord_onsets))
+    chords = make_notes(np.repeat(chord_onsets, 3), 1.0, (roots[:, None] + [0, 4, 7]).reshape(-1),
+                        64, track=0, chord=np.repeat(np.arange(len(chord_onsets)), 3))
+    notes = np.concatenate([drums, chords])
+
+    renderer = PatternRenderer(bpm)
+    start_time = time.time()
+    frames = sum(len(block) for block in renderer.render_blocks(notes))
+    elapsed = time.time() - start_time
+    print(f"1시간 렌더링 {elapsed:.1f}초 (실시간 대비 {frames / RENDER_SAMPLE_RATE / elapsed:.0f}배): {renderer.summary()}")
+
+    # 캐시를 끄고 짧은 구간을 렌더링해 결과가 같은지 확인
+    short = notes[notes['onset'] < 64]
+    cached = PatternRenderer(bpm).render(short)
+    uncached = PatternRenderer(bpm, max_cache_bytes=0).render(short)
+    print(f"캐시 사용/미사용 결과 동일: {np.allclose(cached, uncached, atol=1e-6)}, 최대 {np.abs(cached).max():.2f}")
@@ -0,0 +1,244 @@
+import os
+import sys
+import threading
+
+import numpy as np
+
+# scripts 폴더(utils.py)를 임포트 경로에 추가
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+
+import utils
+import audio_io
+
+STORE_FILENAME = 'night.pcm'
+INDEX_FILENAME = 'night_index.json'
+SAMPLE_DTYPE = np.dtype('<f4')  # 32-bit float, 채널 인터리브
+COMPACT_WASTE_RATIO = 0.25      # 교체로 버려진 프레임이 이 비율을 넘으면 maybe_compact가 정리
+
+
+def _source_fingerprint(path):
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': utils.get_file_sha256(path)}
+
+
+class PcmStore:
+    """
+    한 밤(작업 폴더)의 세그먼트를 하나의 raw PCM 파일(night.pcm)에 이어 저장하고,
+    세그먼트별 위치를 night_index.json에 기록하는 저장소.
+
+    세그먼트는 np.memmap 조각으로 바로 읽을 수 있어 믹싱/라우드니스 분석/인코딩 단계가
+    WAV를 다시 디코딩하거나 전체를 메모리에 올리지 않고 필요한 부분만 읽습니다.
+    어떤 세그먼트든 미리듣기나 교체를 위해 즉시 접근할 수 있습니다.
+
+    index = {'sample_rate', 'channels', 'dtype', 'total_frames',
+             'segments': {파일명: {'offset': 시작 프레임, 'frames': 프레임 수, 'stage': 구간명,
+                                   'source': 원본 WAV의 {'size', 'mtime_ns', 'sha256'} (WAV에서 옮긴 경우)}}}
+
+    Args:
+        folder (str): 작업 폴더.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.data_path = os.path.join(folder, STORE_FILENAME)
+        self.index_path = os.path.join(folder, INDEX_FILENAME)
+        self._lock = threading.Lock()
+        self._memmap = None
+        index = utils.load_json(self.index_path) if os.path.exists(self.index_path) else None
+        self.index = index or {'sample_rate': None, 'channels': None, 'dtype': SAMPLE_DTYPE.str,
+                               'total_frames': 0, 'segments': {}}
+
+    @classmethod
+    def exists(cls, folder):
+        return os.path.exists(os.path.join(folder, INDEX_FILENAME))
+
+    @property
+    def sample_rate(self):
+        return self.index['sample_rate']
+
+    @property
+    def channels(self):
+        return self.index['channels']
+
+    def __contains__(self, name):
+        return name in self.index['segments']
+
+    def _save_index(self):
+        utils.save_json(self.index, self.index_path, verbose=False)
+
+    def _write_frames(self, offset, audio):
+        mode = 'r+b' if os.path.exists(self.data_path) else 'wb'
+        with open(self.data_path, mode) as f:
+            f.seek(offset * self.channels * SAMPLE_DTYPE.itemsize)
+            f.write(audio.astype(SAMPLE_DTYPE, copy=False).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        self._memmap = None  # 파일 크기가 바뀌었으므로 다음 읽기 때 다시 매핑
+
+    def put(self, name, audio, sample_rate, stage=None, source_path=None):
+        """
+        세그먼트를 저장합니다. 항상 파일 끝에 새로 쓰고 인덱스의 위치만 바꾸므로, 교체 중에 끊겨도
+        기존 인덱스는 온전한 예전 데이터를 가리킵니다. 버려진 영역은 compact()로 회수합니다.
+
+        Args:
+            name (str): 세그먼트 이름 (예: '001_SleepOnset.wav').
+            audio (np.ndarray): [frames] 또는 [frames, channels] float 배열.
+            sample_rate (int): 샘플레이트 (저장소 안에서 모두 같아야 함).
+            stage (str): 구간명.
+            source_path (str): 같은 내용의 WAV 파일. 주면 크기/수정 시각/해시를 기록해
+                is_current()로 WAV가 바뀌었는지 확인할 수 있습니다.
+        """
+        audio = np.asarray(audio, dtype=np.float32)
+        if audio.ndim == 1:
+            audio = audio[:, None]
+        with self._lock:
+            if self.index['sample_rate'] is None:
+                self.index['sample_rate'], self.index['channels'] = int(sample_rate), int(audio.shape[1])
+            if sample_rate != self.sample_rate or audio.shape[1] != self.channels:
+                raise ValueError(f"{name}: 저장소 형식({self.sample_rate}Hz, {self.channels}ch)과 다릅니다 "
+                                 f"({sample_rate}Hz, {audio.shape[1]}ch).")
+
+            offset = self.index['total_frames']
+            # 데이터를 먼저 쓰고 인덱스를 나중에 저장 (중간에 끊겨도 기존 인덱스는 유효)
+            self._write_frames(offset, audio)
+            entry = {'offset': offset, 'frames': len(audio), 'stage': stage}
+            if source_path is not None:
+                entry['source'] = _source_fingerprint(source_path)
+            self.index['total_frames'] += len(audio)
+            self.index['segments'][name] = entry
+            self._save_index()
+
+    def put_wav(self, name, wav_path, stage=None):
+        """
+        WAV 파일을 읽어 저장소에 추가합니다.
+        """
+        audio, sample_rate = audio_io.read_wav(wav_path)
+        self.put(name, audio, sample_rate, stage, source_path=wav_path)
+
+    def is_current(self, name, wav_path):
+        """
+        저장된 세그먼트가 지금의 wav_path와 같은 내용인지 확인합니다.
+        크기와 수정 시각이 같으면 바로 True, 수정 시각만 다르면 해시로 비교합니다.
+        원본 기록이 없거나 WAV가 바뀌었으면 False (put_wav로 다시 옮겨야 함).
+        """
+        source = self.index['segments'].get(name, {}).get('source')
+        if source is None or not os.path.exists(wav_path):
+            return False
+        stat = os.stat(wav_path)
+        if stat.st_size != source['size']:
+            return False
+        if stat.st_mtime_ns == source['mtime_ns']:
+            return True
+        return utils.get_file_sha256(wav_path) == source['sha256']
+
+    def _mapped(self):
+        if self._memmap is None:
+            total = self.index['total_frames']
+            if total == 0:
+                return np.zeros((0, self.channels or 1), dtype=SAMPLE_DTYPE)
+            self._memmap = np.memmap(self.data_path, dtype=SAMPLE_DTYPE, mode='r', shape=(total, self.channels))
+        return self._memmap
+
+    def segment(self, name):
+        """
+        세그먼트를 [frames, channels] 읽기 전용 memmap 조각으로 반환합니다 (복사/디코딩 없음).
+        """
+        with self._lock:
+            entry = self.index['segments'][name]
+            mapped = self._mapped()
+        return mapped[entry['offset']:entry['offset'] + entry['frames']]
+
+    def names(self, plan=None):
+        """
+        세그먼트 이름 목록. plan(매니페스트 plan)이 주어지면 그 순서 중 저장된 것만 반환합니다.
+        """
+        if plan is not None:
+            return [entry[0] for entry in plan if entry[0] in self.index['segments']]
+        return sorted(self.index['segments'])
+
+    def iter_blocks(self, names, block_frames):
+        """
+        여러 세그먼트를 이어진 하나의 흐름으로 보고 block_frames씩 memmap 조각을 내보냅니다.
+
+        Yields:
+            tuple: (세그먼트 이름, 세그먼트 안 시작 프레임, [frames, channels] 조각)
+        """
+        for name in names:
+            audio = self.segment(name)
+            for start in range(0, len(audio), block_frames):
+                yield name, start, audio[start:start + block_frames]
+
+    def wasted_frames(self):
+        """
+        교체 등으로 더 이상 인덱스가 가리키지 않는 프레임 수.
+        """
+        return self.index['total_frames'] - sum(entry['frames'] for entry in self.index['segments'].values())
+
+    def maybe_compact(self, plan=None, max_waste_ratio=COMPACT_WASTE_RATIO):
+        """
+        버려진 프레임이 전체의 max_waste_ratio를 넘을 때만 compact()합니다.
+
+        Returns:
+            bool: 정리했는지 여부.
+        """
+        total = self.index['total_frames']
+        if not total or self.wasted_frames() <= total * max_waste_ratio:
+            return False
+        self.compact(plan)
+        return True
+
+    def compact(self, plan=None):
+        """
+        쓰이지 않는 영역을 없애고 세그먼트를 plan 순서(없으면 이름 순서)로 다시 씁니다.
+        """
+        with self._lock:
+            planned = self.names(plan) if plan is not None else []
+            names = planned + [name for name in self.names() if name not in planned]
+            mapped = self._mapped()
+            tmp_path = f"{self.data_path}.tmp"
+            segments, offset = {}, 0
+            with open(tmp_path, 'wb') as f:
+                for name in names:
+                    entry = self.index['segments'][name]
+                    f.write(np.ascontiguousarray(mapped[entry['offset']:entry['offset'] + entry['frames']]).tobytes())
+                    segments[name] = dict(entry, offset=offset)
+                    offset += entry['frames']
+            self._memmap = None
+            del mapped
+            os.replace(tmp_path, self.data_path)
+            self.index['segments'], self.index['total_frames'] = segments, offset
+            self._save_index()
+
+
+if __name__ == '__main__':
+    # --- 간단한 동작 확인 ---
+    import tempfile
+    import time
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        sr = 32000
+        store = PcmStore(tmp_dir)
+        start_time = time.time()
+        for idx in range(30):
+            audio = np.full((sr * 120, 1), idx / 100.0, dtype=np.float32)
+            store.put(f"{idx + 1:03d}_NREM1.wav", audio, sr, stage='NREM1')
+        print(f"120초 세그먼트 30개 저장: {time.time() - start_time:.2f}초, "
+              f"파일 {os.path.getsize(store.data_path) / 1024 ** 2:.0f}MB")
+
+        start_time = time.time()
+        piece = PcmStore(tmp_dir).segment('017_NREM1.wav')
+        print(f"임의 세그먼트 접근: {(time.time() - start_time) * 1000:.2f}ms, 값 {piece[0, 0]:.2f}, "
+              f"memmap={isinstance(piece, np.memmap)}")
+
+        store.put('005_NREM1.wav', np.ones((sr * 60, 1), dtype=np.float32), sr, stage='NREM1')
+        print(f"교체 후 낭비 프레임: {store.wasted_frames()}")
+
+        wav_path = os.path.join(tmp_dir, '031_REM1.wav')
+        audio_io.write_wav(wav_path, np.zeros((sr, 1), dtype=np.float32), sr)
+        store.put_wav('031_REM1.wav', wav_path, stage='REM1')
+        current = store.is_current('031_REM1.wav', wav_path)
+        audio_io.write_wav(wav_path, np.full((sr, 1), 0.5, dtype=np.float32), sr)
+        os.utime(wav_path, ns=(0, 1))  # 밖에서 바꾼 WAV (크기는 같음)
+        print(f"WAV 교체 감지: 교체 전 {current}, 교체 후 {store.is_current('031_REM1.wav', wav_path)}")
+        store.compact()
+        print(f"정리 후 낭비 프레임: {store.wasted_frames()}, 값 {store.segment('005_NREM1.wav')[0, 0]:.2f}")
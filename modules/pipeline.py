@@ -0,0 +1,972 @@
+import os
+import re
+import glob
+import subprocess
+import sys
+import threading
+import weakref
+
+# scripts 폴더(utils.py)를 임포트 경로에 추가
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+
+import utils
+import audio_io
+from job_manifest import JobManifest
+from model_loader import load_musicgen
+from segment_cache import SegmentCache, make_segment_key, stage_family
+from stage_planner import build_schedule, schedule_to_plan, stage_order
+from pcm_store import PcmStore
+from loudness import build_target_curve, normalize_segments, wav_blocks
+from segment_scan import scan_segments, wav_reader
+from audio_analyzer import check_wake_rising, verify_segments
+from hls_stream import HlsStream
+from rng import RNG_SCHEME, derive_seed, stream, torch_rng
+
+NORMALIZED_DIRNAME = 'normalized'
+LOUDNESS_REPORT_FILENAME = 'loudness_report.json'
+SCAN_REPORT_FILENAME = 'scan_report.json'
+CONFORMANCE_REPORT_FILENAME = 'conformance_report.json'
+
+# GUI와 CLI(sleepgen.py)가 함께 사용하는 파이프라인 순서
+PIPELINE_STAGES = ['generate', 'scan', 'normalize', 'verify', 'convert', 'concat_stage', 'concat_final', 'video']
+SEGMENT_FILE_PATTERN = re.compile(r'^(\d+)_(.+)\.([^.]+)$')  # '001_NREM1.wav', '1205_WakeUp.wav' 등
+
+
+def segment_files_by_stage(folder, extension):
+    """
+    '001_NREM1.mp3' 형식의 세그먼트 파일을 구간별로 묶습니다 (파일 번호 순서 유지, 1000번 이후도 포함).
+    *_merged.mp3, final_*.mp3 같은 결과 파일은 제외됩니다.
+    """
+    segments = []
+    for filename in os.listdir(folder):
+        match = SEGMENT_FILE_PATTERN.match(filename)
+        if match and match.group(3) == extension:
+            segments.append((int(match.group(1)), match.group(2), os.path.join(folder, filename)))
+
+    stages = {}
+    for _, stage, filepath in sorted(segments):  # 자릿수가 달라도 번호 순서대로
+        stages.setdefault(stage, []).append(filepath)  # SleepOnset, NREM1, REM1 등
+    return stages
+
+
+def encode_mp3_from_store(store, name, mp3_path, block_frames=1 << 18):
+    """
+    PCM 저장소의 세그먼트를 WAV 디코딩 없이 ffmpeg 표준입력으로 흘려보내 MP3로 인코딩합니다.
+    """
+    command = [
+        'ffmpeg', '-y', '-f', 'f32le', '-ar', str(store.sample_rate), '-ac', str(store.channels),
+        '-i', 'pipe:0', '-codec:a', 'libmp3lame', '-qscale:a', '2', mp3_path
+    ]
+    process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        for _, _, block in store.iter_blocks([name], block_frames):
+            process.stdin.write(block.tobytes())
+        process.stdin.close()
+    except BrokenPipeError:
+        pass
+    _, stderr = process.communicate()
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, command, stderr=stderr)
+
+
+def segment_seed(manifest, counter):
+    """
+    counter번째 세그먼트의 시드. 매니페스트에 기록된 시드 방식을 따르며,
+    방식이 기록되지 않은 예전 작업은 기존 계산(작업 시드 + 번호)을 유지합니다.
+    """
+    if manifest.rng_scheme == RNG_SCHEME:
+        return derive_seed(manifest.seed, 'segment', counter)
+    return manifest.seed + counter
+
+
+def pool_seed(manifest, section, section_index, idx):
+    """
+    'loop' 모드 구간 클립 풀의 idx번째 클립 시드.
+    """
+    if manifest.rng_scheme == RNG_SCHEME:
+        return derive_seed(manifest.seed, 'pool', section, idx)
+    return manifest.seed + 10000 * section_index + idx
+
+
+def tile_rng(manifest, section, section_index):
+    """
+    'loop' 모드 구간 타일링(클립 순서/변화)용 NumPy Generator.
+    """
+    import numpy as np
+
+    if manifest.rng_scheme == RNG_SCHEME:
+        return stream(manifest.seed, 'tile', section)
+    return np.random.default_rng(manifest.seed + section_index)
+
+
+_generation_locks = weakref.WeakKeyDictionary()
+_generation_locks_guard = threading.Lock()
+
+
+def generation_lock(model):
+    """
+    모델 객체마다 하나씩 있는 생성 잠금. 생성 길이(set_generation_params)와 LM의 스트리밍 캐시가
+    모델 객체에 들어 있어 같은 모델로는 한 번에 하나만 생성할 수 있고, 서로 다른 모델(작업 큐의
+    워커들)은 동시에 생성합니다.
+    """
+    with _generation_locks_guard:
+        lock = _generation_locks.get(model)
+        if lock is None:
+            lock = _generation_locks[model] = threading.Lock()
+        return lock
+
+
+def generate_segment(model, prompt_text, filepath, seed, duration=None):
+    """
+    세그먼트 1개를 생성해 WAV로 저장합니다. 같은 시드면 같은 결과가 나옵니다.
+    duration이 모델 설정과 다르면 이 세그먼트 길이로 바꿔 생성합니다.
+    샘플링 난수는 이 호출 전용 생성기(seed)에서 나와 다른 스레드/호출에 영향을 주지 않습니다.
+    """
+    import torchaudio
+
+    with generation_lock(model), torch_rng(seed):
+        if duration is not None and getattr(model, 'duration', None) != duration:
+            model.set_generation_params(duration=duration)
+        wav = model.generate([prompt_text])
+    torchaudio.save(filepath, wav[0].cpu(), model.sample_rate)
+
+
+def generate_batch(model, prompts, seed, duration=None):
+    """
+    같은 길이의 세그먼트 여러 개를 한 번의 model.generate 호출로 만듭니다 (프롬프트 1개 = 배치 1줄).
+    배치 전체가 하나의 torch 난수 흐름(seed)을 쓰므로, 1개짜리 배치는 generate_segment와 같은 오디오가 됩니다.
+
+    Returns:
+        tuple: ([frames, channels] float32 배열 목록, 샘플레이트)
+    """
+    with generation_lock(model), torch_rng(seed):
+        if duration is not None and getattr(model, 'duration', None) != duration:
+            model.set_generation_params(duration=duration)
+        wav = model.generate(list(prompts))
+    batch = wav.detach().float().cpu().numpy()  # [batch, channels, frames]
+    return [clip.T for clip in batch], model.sample_rate
+
+
+def cached_segment(prompt_text, filepath, section, seed, model_id, duration, cache=None, reuse_stages=(),
+                   job_id=None):
+    """
+    모델 없이 세그먼트를 준비할 수 있으면 filepath에 복사합니다 (produce_segment의 캐시/재사용 단계).
+
+    Returns:
+        tuple: (출처, 캐시 키). 출처는 'cache', 'reuse', 또는 생성이 필요하면 (None, None).
+            재사용한 경우 캐시 키를 기록해 두면 regenerate_segment가 같은 클립을 다시 복사합니다.
+    """
+    if cache is None:
+        return None, None
+    key = make_segment_key(prompt_text, model_id, seed, duration)
+    if cache.get(key, filepath):
+        return 'cache', key
+    family = stage_family(section)
+    if family in reuse_stages:
+        key = cache.reuse(filepath, seed, exclude_job=job_id, prompt=prompt_text.strip(),
+                          model=model_id, duration=duration, stage=family)
+        if key:
+            return 'reuse', key
+    return None, None
+
+
+def segment_details(seed, duration, model_id, source, cache_key=None):
+    """
+    매니페스트 generate 작업에 기록하는 세그먼트 정보. 재사용한 세그먼트는 복사한 캐시 키도 남깁니다.
+    """
+    details = {'seed': seed, 'duration': duration, 'model': model_id, 'source': source}
+    if source == 'reuse' and cache_key:
+        details['cache_key'] = cache_key
+    return details
+
+
+def cache_generated_segment(cache, prompt_text, filepath, section, seed, model_id, duration, job_id=None):
+    """
+    새로 생성한 세그먼트를 캐시에 추가합니다 (cache가 None이면 아무것도 하지 않음).
+    """
+    if cache is not None:
+        cache.put(make_segment_key(prompt_text, model_id, seed, duration), filepath,
+                  meta={'prompt': prompt_text.strip(), 'model': model_id, 'duration': duration,
+                        'stage': stage_family(section), 'job': job_id})
+
+
+def produce_segment(get_model, prompt_text, filepath, section, seed, model_id, duration,
+                    cache=None, reuse_stages=(), job_id=None):
+    """
+    세그먼트 1개를 준비합니다. 캐시에 같은 세그먼트가 있으면 복사하고, 구간 종류가
+    reuse_stages에 있으면 같은 프롬프트의 캐시 세그먼트를 골라 재사용하며,
+    둘 다 아니면 모델로 생성한 뒤 캐시에 추가합니다.
+
+    Args:
+        get_model (callable): 모델이 필요할 때만 호출되는 함수 (캐시 적중 시 로딩 생략).
+        model_id (str): 캐시 키용 모델 식별자 (예: 'medium-fp32').
+        cache (SegmentCache): 세그먼트 캐시 (None이면 항상 생성).
+        reuse_stages (iterable): 재사용할 구간 종류 (예: ['NREM']).
+        job_id: 작업 식별자. 같은 작업이 만든 세그먼트는 재사용 후보에서 제외됩니다.
+
+    Returns:
+        tuple: (출처, 캐시 키). 출처는 'cache', 'reuse', 'generated' 중 하나이고,
+            캐시 키는 캐시에서 복사한 경우에만 있습니다.
+    """
+    source, key = cached_segment(prompt_text, filepath, section, seed, model_id, duration, cache=cache,
+                                 reuse_stages=reuse_stages, job_id=job_id)
+    if source:
+        return source, key
+
+    generate_segment(get_model(), prompt_text, filepath, seed, duration)
+    cache_generated_segment(cache, prompt_text, filepath, section, seed, model_id, duration, job_id=job_id)
+    return 'generated', None
+
+
+class SleepMusicPipeline:
+    """
+    생성 → 변환 → 구간별 이어붙이기 → 최종 이어붙이기 → 영상 만들기 파이프라인.
+
+    Qt 위젯에 의존하지 않으며, 로그와 진행률은 콜백으로 전달합니다.
+    torch/audiocraft는 generate 단계에서 처음 필요할 때만 임포트합니다.
+
+    Args:
+        log (callable): 로그 메시지(str)를 받는 함수 (기본값: print).
+        progress (callable): 진행률(0~100 int)을 받는 함수 (기본값: 무시).
+        model_size (str): MusicGen 모델 크기 ('small', 'medium').
+        segment_seconds (int): 세그먼트 1개 길이(초).
+        precision (str): CPU 추론 정밀도 ('fp32', 'bf16', 'int8').
+        model_cache_dir (str): 가중치 캐시 폴더 (None이면 기본 위치, False면 사용 안 함).
+        segment_cache (SegmentCache): 생성 세그먼트 캐시 (None이면 사용 안 함).
+        reuse_stages (iterable): 캐시에서 골라 재사용할 구간 종류 (예: ['NREM']).
+        synthesis_mode (str): 'generate'(세그먼트마다 추론) 또는 'loop'(구간별 클립 풀을 만들어
+            루프/크로스페이드로 이어 붙임, 추론 횟수 대폭 감소).
+        loop_pool_size (int): 'loop' 모드에서 구간마다 생성할 클립 수.
+        stage_options (dict): 수면 구간 설계 옵션 (stage_planner.build_stage_plan의
+            cycle_minutes, onset_minutes, wake_minutes, rem_ratio).
+        pcm_store (bool): 생성된 세그먼트를 작업 폴더의 memmap PCM 저장소(night.pcm)에도 모아 두고,
+            후처리 단계가 WAV 대신 저장소에서 바로 읽게 할지 여부.
+        progressive (bool): 세그먼트가 하나 끝날 때마다 folder/stream/의 HLS 재생목록(stream.m3u8)에
+            조각으로 이어 붙여, 밤 전체가 끝나기 전에도 들을 수 있게 할지 여부.
+    """
+
+    def __init__(self, log=None, progress=None, model_size='medium', segment_seconds=120,
+                 precision='fp32', model_cache_dir=None, segment_cache=None, reuse_stages=(),
+                 synthesis_mode='generate', loop_pool_size=4, stage_options=None, pcm_store=False,
+                 progressive=False):
+        self.model = None  # MusicGen 모델은 프로세스 실행 중 1회만 로딩
+        self.log = log or print
+        self.progress = progress or (lambda value: None)
+        self.model_size = model_size
+        self.segment_seconds = segment_seconds
+        self.precision = precision
+        self.model_cache_dir = model_cache_dir
+        self.segment_cache = segment_cache
+        self.reuse_stages = tuple(reuse_stages)
+        self.synthesis_mode = synthesis_mode
+        self.loop_pool_size = loop_pool_size
+        self.stage_options = dict(stage_options or {})
+        self.pcm_store = pcm_store
+        self.progressive = progressive
+        self._model_lock = threading.Lock()  # 모델/설정 교체만 보호 (로딩 중에는 잡지 않음)
+        self._load_lock = threading.Lock()   # 백그라운드 미리 로딩과 생성 요청이 겹쳐도 1회만 로딩
+
+    def load_model(self):
+        with self._load_lock:
+            while True:
+                with self._model_lock:
+                    if self.model is not None:
+                        return self.model
+                    model_size, precision = self.model_size, self.precision
+                self.log(f'MusicGen {model_size} ({precision}) 모델 로딩 중...')
+                model = load_musicgen(model_size, duration=self.segment_seconds, precision=precision,
+                                      cache_dir=self.model_cache_dir, log=self.log)
+                with self._model_lock:
+                    # 로딩하는 동안 configure로 크기/정밀도가 바뀌었으면 바뀐 설정으로 다시 로딩
+                    if (model_size, precision) == (self.model_size, self.precision):
+                        if getattr(model, 'duration', None) != self.segment_seconds:
+                            model.set_generation_params(duration=self.segment_seconds)
+                        self.model = model
+                        self.log('모델 로딩 완료.')
+
+    def configure(self, model_size=None, segment_seconds=None, precision=None):
+        """
+        모델 설정을 바꿉니다. 크기/정밀도가 바뀌면 다음 생성 때 모델을 다시 로딩합니다.
+        설정만 바꾸고 바로 돌아오므로 백그라운드 로딩 중에 UI 스레드에서 불러도 멈추지 않습니다.
+        """
+        with self._model_lock:
+            if model_size and model_size != self.model_size:
+                self.model_size, self.model = model_size, None
+            if precision and precision != self.precision:
+                self.precision, self.model = precision, None
+            if segment_seconds and segment_seconds != self.segment_seconds:
+                self.segment_seconds = segment_seconds
+                if self.model is not None:
+                    self.model.set_generation_params(duration=segment_seconds)
+
+    def generate_music(self, prompt_text, folder, duration_hours):
+        self.log(f'{self.segment_seconds}초 단위 WAV 생성 시작합니다...')
+        if not prompt_text:
+            self.log('❗ 프롬프트가 입력되지 않았습니다.')
+            return False
+        if not folder:
+            self.log('❗ 저장 폴더를 선택해주세요.')
+            return False
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+
+        # 수면 구간 일정표 (생성/이어붙이기/영상이 모두 이 일정표를 따름)
+        schedule = build_schedule(duration_hours * 60, self.segment_seconds, **self.stage_options)
+        plan = schedule_to_plan(schedule)
+
+        # 작업 매니페스트 로드 (중단된 작업이면 완료된 세그먼트는 건너뜀)
+        manifest, resumed = JobManifest.load_or_create(folder, prompt_text, None, plan, rng_scheme=RNG_SCHEME)
+        if resumed:
+            done_count = manifest.summary().get('generate', 0)
+            self.log(f'이전 작업을 이어서 진행합니다. (완료 기록 {done_count}개, 시드 {manifest.seed})')
+
+        self.log(f'총 {len(plan)}개 WAV 파일을 생성합니다...')
+        store = PcmStore(folder) if self.pcm_store else None
+        stream = HlsStream(folder, plan, store=store, log=self.log) if self.progressive else None
+
+        # 'loop' 모드: 세그먼트 수가 클립 풀보다 많은 구간은 풀 클립을 이어 붙여 만듦
+        section_entries = {}
+        for counter, (filename, section, seconds) in enumerate(plan, start=1):
+            section_entries.setdefault(section, []).append((counter, filename, seconds))
+        loop_sections = set()
+        if self.synthesis_mode == 'loop':
+            loop_sections = {section for section, entries in section_entries.items()
+                             if len(entries) > self.loop_pool_size}
+
+        for counter, (filename, section, seconds) in enumerate(plan, start=1):
+            filepath = os.path.join(folder, filename)
+
+            if section in loop_sections:
+                if counter == section_entries[section][0][0]:
+                    self._synthesize_section_loop(prompt_text, folder, manifest, section,
+                                                  section_entries[section], len(plan), store)
+                    if stream is not None:
+                        for _, name, _ in section_entries[section]:
+                            stream.add(name)
+                continue
+
+            if manifest.is_task_done('generate', filename, filepath):
+                self.log(f'[{counter}/{len(plan)}] {filename} 이미 생성됨, 건너뜁니다.')
+            else:
+                self.log(f'[{counter}/{len(plan)}] {filename} 생성 중...')
+                self._produce_planned_segment(manifest, prompt_text, folder, counter, filename, section, seconds,
+                                              store)
+            if stream is not None:
+                stream.add(filename)
+
+            self.progress(int((counter/len(plan))*100))
+
+        if stream is not None and stream.close():
+            self.log(f'✅ 스트림 재생목록 완성: {stream.playlist_path} ({stream.seconds / 60:.1f}분)')
+        if self.segment_cache is not None:
+            self.segment_cache.flush()
+        self.log(f'✅ {self.segment_seconds}초 단위 WAV 파일 생성 완료!')
+        return True
+
+    def _produce_planned_segment(self, manifest, prompt_text, folder, counter, filename, section, seconds,
+                                 store=None, seed=None, model_id=None):
+        """
+        일정표의 세그먼트 1개를 만들고, 다시 만들 때 필요한 시드/길이/모델을 매니페스트에 기록합니다.
+        """
+        filepath = os.path.join(folder, filename)
+        # 세그먼트별 시드 고정 (재시작/단독 재생성 시 동일 결과)
+        seed = segment_seed(manifest, counter) if seed is None else seed
+        model_id = model_id or f'{self.model_size}-{self.precision}'
+        source, cache_key = produce_segment(self.load_model, prompt_text, filepath, section, seed, model_id, seconds,
+                                            cache=self.segment_cache, reuse_stages=self.reuse_stages,
+                                            job_id=manifest.seed)
+        if source != 'generated':
+            self.log(f'[{counter}/{len(manifest.plan)}] {filename} 캐시 세그먼트 사용 ({source})')
+        manifest.mark_task_done('generate', filename, filepath,
+                                details=segment_details(seed, seconds, model_id, source, cache_key))
+        if store is not None:
+            store.put_wav(filename, filepath, stage=section)
+        return source
+
+    def regenerate_segment(self, folder, filename, new_seed=False):
+        """
+        매니페스트에 기록된 시드/길이/모델로 세그먼트 1개만 다시 만듭니다 (전체 밤을 다시 생성하지 않음).
+        'loop' 모드 세그먼트는 같은 구간 난수 흐름을 다시 재생해 그 세그먼트만 다시 씁니다.
+        new_seed면 결과가 마음에 들지 않은 세그먼트를 새 시드로 바꿔 만들고, 그 시드를 기록합니다
+        (다시 시도한 횟수마다 정해진 시드라 재현 가능).
+        """
+        manifest = JobManifest.load(folder)
+        plan = manifest.plan
+        positions = {entry[0]: idx for idx, entry in enumerate(plan, start=1)}
+        if filename not in positions or len(plan[0]) < 3:
+            self.log(f'❗ 일정표에 없는 세그먼트입니다: {filename}')
+            return False
+
+        counter = positions[filename]
+        _, section, seconds = plan[counter - 1]
+        prompt_text = manifest.data['job']['prompt']
+        task = manifest.task('generate', filename) or {}
+        store = PcmStore(folder) if self.pcm_store else None
+
+        if task.get('source') == 'loop':
+            if new_seed:
+                self.log(f'❗ {filename}은 루프 타일링 세그먼트라 새 시드로 바꿀 수 없습니다.')
+                return False
+            entries = [(idx, name, secs) for idx, (name, stage, secs) in enumerate(plan, start=1) if stage == section]
+            manifest.data['stages']['generate'].pop(filename, None)
+            self.log(f'{filename}: {section} 구간 타일링을 다시 재생해 이 세그먼트만 씁니다...')
+            self._synthesize_section_loop(prompt_text, folder, manifest, section, entries, len(plan), store)
+            return True
+
+        if task.get('source') == 'reuse' and not new_seed:
+            # 재사용 세그먼트는 다시 고르지 않고 기록된 캐시 클립을 그대로 복사
+            cache_key = task.get('cache_key')
+            filepath = os.path.join(folder, filename)
+            if cache_key and self.segment_cache is not None and self.segment_cache.get(cache_key, filepath):
+                self.log(f'{filename}: 재사용했던 캐시 세그먼트를 다시 복사합니다.')
+                manifest.mark_task_done('generate', filename, filepath, details=segment_details(
+                    task.get('seed'), task.get('duration', seconds), task.get('model'), 'reuse', cache_key))
+                if store is not None:
+                    store.put_wav(filename, filepath, stage=section)
+                return True
+            self.log(f'❗ {filename}은 재사용 세그먼트지만 ' +
+                     ('캐시에서 그 클립을 찾을 수 없습니다.' if cache_key else '복사한 캐시 키가 기록되지 않았습니다.') +
+                     ' 같은 시드로 다시 만듭니다.')
+
+        model_id = task.get('model')
+        current_model = f'{self.model_size}-{self.precision}'
+        if model_id and model_id != current_model:
+            self.log(f'❗ {filename}은 {model_id} 모델로 생성되었습니다 (현재 {current_model}). '
+                     f'기록된 모델 설정으로 바꿔야 같은 결과가 나옵니다.')
+        seed = task.get('seed', segment_seed(manifest, counter))
+        retries = task.get('retries', 0)
+        if new_seed:
+            retries += 1
+            seed = derive_seed(manifest.seed, 'retry', counter, retries)
+        elif task.get('source') == 'batch':
+            self.log(f'❗ {filename}은 여러 세그먼트를 묶은 배치로 생성되었습니다. '
+                     f'혼자 다시 생성하면 같은 시드라도 배치 때와 다른 결과가 나옵니다.')
+        self.log(f'{filename} 다시 생성 중... (시드 {seed})')
+        self._produce_planned_segment(manifest, prompt_text, folder, counter, filename, section,
+                                      task.get('duration', seconds), store, seed=seed, model_id=model_id)
+        if retries:
+            manifest.task('generate', filename)['retries'] = retries
+            manifest.save()
+        return True
+
+    def _synthesize_section_loop(self, prompt_text, folder, manifest, section, entries, total_segments,
+                                 store=None):
+        """
+        구간 하나를 클립 풀(loop_pool_size개) 생성 + 루프 타일링으로 만듭니다.
+        풀 클립은 folder/pool/에 저장되어 변환/이어붙이기 대상에서 제외됩니다.
+        store가 주어지면 만든 세그먼트를 PCM 저장소에도 씁니다.
+        """
+        from loop_synth import tile_stage, write_tiled_segments
+
+        pending = [(counter, filename) for counter, filename, _ in entries
+                   if not manifest.is_task_done('generate', filename, os.path.join(folder, filename))]
+        if not pending:
+            self.log(f'{section} 구간은 이미 생성됨, 건너뜁니다.')
+            self.progress(int((entries[-1][0]/total_segments)*100))
+            return
+
+        pool_dir = os.path.join(folder, 'pool')
+        os.makedirs(pool_dir, exist_ok=True)
+        section_index = entries[0][0]
+        clips = []
+        sample_rate = None
+        for idx in range(self.loop_pool_size):
+            pool_name = f"{section}_pool{idx + 1}.wav"
+            pool_path = os.path.join(pool_dir, pool_name)
+            if not manifest.is_task_done('pool', pool_name, pool_path):
+                self.log(f'{section} 클립 풀 [{idx + 1}/{self.loop_pool_size}] 생성 중...')
+                seed = pool_seed(manifest, section, section_index, idx)
+                model_id = f'{self.model_size}-{self.precision}'
+                source, cache_key = produce_segment(self.load_model, prompt_text, pool_path, section, seed,
+                                                    model_id, self.segment_seconds, cache=self.segment_cache,
+                                                    reuse_stages=self.reuse_stages, job_id=manifest.seed)
+                manifest.mark_task_done('pool', pool_name, pool_path,
+                                        details=segment_details(seed, self.segment_seconds, model_id, source,
+                                                                cache_key))
+            audio, sample_rate = audio_io.read_wav(pool_path)
+            clips.append(audio)
+
+        self.log(f'{section} 구간 {len(entries)}개 세그먼트를 클립 {len(clips)}개로 이어 붙입니다...')
+        segment_frames = [int(seconds * sample_rate) for _, _, seconds in entries]
+        rng = tile_rng(manifest, section, section_index)  # 재시작해도 같은 배치
+        done_names = {filename for _, filename, _ in entries} - {filename for _, filename in pending}
+
+        def write_segment(index, audio):
+            counter, filename, _ = entries[index]
+            if filename not in done_names:
+                filepath = os.path.join(folder, filename)
+                audio_io.write_wav(filepath, audio, sample_rate)
+                manifest.mark_task_done('generate', filename, filepath, details={'source': 'loop'})
+                if store is not None:
+                    store.put(filename, audio, sample_rate, stage=section, source_path=filepath)
+            self.progress(int((counter/total_segments)*100))
+
+        blocks = tile_stage(clips, sample_rate, sum(segment_frames), rng)
+        write_tiled_segments(blocks, segment_frames, write_segment)
+
+    def scan_segments(self, folder, regenerate=True, max_rounds=2):
+        """
+        생성된 세그먼트의 지문(크로마/대역 에너지/RMS 포락선)을 계산해 거의 같은 세그먼트와
+        결함(긴 디지털 무음/끊김, 클리핑, 세그먼트의 들리는 음량보다 훨씬 큰 소리)을 찾고, regenerate면
+        걸린 세그먼트만 새 시드로 다시 만든 뒤 그 세그먼트만 저장된 지문과 다시 비교합니다 (최대
+        max_rounds번). 결과는 scan_report.json에 기록됩니다.
+        루프 타일링 세그먼트는 일부러 반복한 것이므로 중복 검사와 재생성에서 제외됩니다.
+        """
+        self.log('세그먼트 중복/결함 검사 시작합니다...')
+        if not folder:
+            self.log('❗ 저장 폴더를 먼저 선택해주세요.')
+            return False
+
+        manifest = JobManifest.load(folder)
+        plan = [entry for entry in (manifest.plan or []) if len(entry) > 2]
+        if not plan:
+            self.log('❗ 작업 매니페스트의 세그먼트 일정표가 없습니다. 먼저 생성 단계를 실행하세요.')
+            return False
+        looped = {filename for filename, _, _ in plan
+                  if (manifest.task('generate', filename) or {}).get('source') == 'loop'}
+
+        report = {'rounds': [], 'regenerated': {}}
+        fingerprints = {}  # 세그먼트별 (결과, 지문). 2회차부터는 다시 만든 세그먼트만 다시 분석
+        names = [filename for filename, _, _ in plan]
+        for round_idx in range(1, max_rounds + 2):
+            store = PcmStore(folder) if self.pcm_store and PcmStore.exists(folder) else None
+
+            sources = []
+            for filename in names:
+                wav_path = os.path.join(folder, filename)
+                if not os.path.exists(wav_path):
+                    self.log(f'❗ {filename} 파일이 없습니다.')
+                    return False
+                if store is not None and filename in store:
+                    # PCM 저장소가 있으면 디코딩 없이 memmap 조각을 바로 읽음
+                    read_audio = (lambda name: lambda: (store.segment(name), store.sample_rate))(filename)
+                    sources.append((filename, read_audio))
+                else:
+                    sources.append((filename, wav_reader(wav_path)))
+
+            results, duplicates, flagged = scan_segments(sources, skip_duplicates=looped, fingerprints=fingerprints)
+            report['segments'] = results
+            report['duplicates'] = duplicates
+            report['flagged'] = flagged
+            report['rounds'].append({'round': round_idx, 'flagged': sorted(flagged)})
+            utils.save_json(report, os.path.join(folder, SCAN_REPORT_FILENAME), verbose=False)
+
+            self.log(f'[{round_idx}회차] {len(results)}개 세그먼트 검사: 중복 {len(duplicates)}개, '
+                     f'걸린 세그먼트 {len(flagged)}개')
+            for filename, reasons in sorted(flagged.items()):
+                self.log(f"  {filename}: {', '.join(reasons)}")
+
+            retry = sorted(name for name in flagged if name not in looped)
+            if not retry or not regenerate or round_idx > max_rounds:
+                break
+            names = []
+            for idx, filename in enumerate(retry, start=1):
+                if self.regenerate_segment(folder, filename, new_seed=True):
+                    report['regenerated'][filename] = report['regenerated'].get(filename, 0) + 1
+                    names.append(filename)
+                self.progress(int((idx/len(retry))*100))
+            if not names:
+                break
+
+        if self.segment_cache is not None and report['regenerated']:
+            self.segment_cache.flush()
+        if flagged:
+            self.log(f'❗ 검사를 마쳤지만 {len(flagged)}개 세그먼트가 여전히 걸립니다 ({SCAN_REPORT_FILENAME} 참고).')
+        else:
+            self.log('✅ 세그먼트 중복/결함 검사 완료!')
+        self.progress(100)
+        return True
+
+    def normalize_loudness(self, folder, block_seconds=10):
+        """
+        모든 세그먼트의 라우드니스를 측정하고, 구간별 목표 곡선(깊은 NREM일수록 조용하게)에 맞춘
+        게인을 적용해 folder/normalized/에 저장합니다. 세그먼트마다 한 번만 읽으며 병렬로 처리합니다.
+        측정값과 게인은 loudness_report.json에 기록됩니다.
+        """
+        self.log('라우드니스 분석/정규화 시작합니다...')
+        if not folder:
+            self.log('❗ 저장 폴더를 먼저 선택해주세요.')
+            return False
+
+        manifest = JobManifest.load(folder)
+        plan = [entry for entry in (manifest.plan or []) if len(entry) > 2]
+        if not plan:
+            self.log('❗ 작업 매니페스트의 세그먼트 일정표가 없습니다. 먼저 생성 단계를 실행하세요.')
+            return False
+
+        output_dir = os.path.join(folder, NORMALIZED_DIRNAME)
+        os.makedirs(output_dir, exist_ok=True)
+        curve = build_target_curve(plan)
+        store = PcmStore(folder) if self.pcm_store and PcmStore.exists(folder) else None
+
+        jobs = []
+        for filename, section, seconds in plan:
+            wav_path = os.path.join(folder, filename)
+            output_path = os.path.join(output_dir, filename)
+            if not os.path.exists(wav_path):
+                self.log(f'❗ {filename} 파일이 없습니다.')
+                return False
+            if manifest.is_task_done('normalize', filename, output_path, inputs=[wav_path]):
+                continue
+            if store is not None and filename in store:
+                # PCM 저장소가 있으면 디코딩 없이 memmap 조각을 바로 읽음
+                sample_rate = store.sample_rate
+                make_blocks = (lambda name: lambda: (block for _, _, block in
+                                                     store.iter_blocks([name], sample_rate * block_seconds)))(filename)
+            else:
+                sample_rate = audio_io.read_wav_info(wav_path)['sample_rate']
+                make_blocks = wav_blocks(wav_path, sample_rate * block_seconds)
+            jobs.append((filename, make_blocks, sample_rate, output_path, curve[filename]))
+
+        if not jobs:
+            self.log('모든 세그먼트가 이미 정규화되었습니다, 건너뜁니다.')
+            return True
+
+        done = []
+
+        def on_done(filename, result):
+            manifest.mark_task_done('normalize', filename, os.path.join(output_dir, filename),
+                                    inputs=[os.path.join(folder, filename)])
+            done.append(filename)
+            self.log(f"[{len(done)}/{len(jobs)}] {filename}: {result['integrated_lufs']} → "
+                     f"{result['output_lufs']} LUFS (게인 {result['gain_db'][0]:+.1f}~{result['gain_db'][1]:+.1f} dB)")
+            self.progress(int((len(done)/len(jobs))*100))
+
+        results, night = normalize_segments(jobs, on_done=on_done)
+
+        report_path = os.path.join(folder, LOUDNESS_REPORT_FILENAME)
+        report = (utils.load_json(report_path) if os.path.exists(report_path) else None) or {'segments': {}}
+        report['segments'].update(results)
+        report['night'] = night  # 이번 실행에서 처리한 세그먼트 기준
+        utils.save_json(report, report_path, verbose=False)
+        self.log(f"✅ 라우드니스 정규화 완료 (통합 {night['before_lufs']} → {night['after_lufs']} LUFS)")
+        return True
+
+    def verify_stages(self, folder, block_seconds=10):
+        """
+        세그먼트 오디오에서 onset 밀도(스펙트럴 플럭스), 템포(onset 자기상관), 창별 RMS/벨로시티 상당값을
+        측정해 구간 목표(깊은 NREM은 성기게, 깨어날수록 촘촘하게)와 비교합니다. 정규화 결과가 있으면
+        실제로 듣게 될 그 파일을 검사합니다. 결과는 conformance_report.json에 기록되며, 목표를 벗어난
+        세그먼트가 있어도 파이프라인은 멈추지 않습니다.
+        """
+        self.log('구간 적합성 검사 시작합니다...')
+        if not folder:
+            self.log('❗ 저장 폴더를 먼저 선택해주세요.')
+            return False
+
+        manifest = JobManifest.load(folder)
+        plan = [entry for entry in (manifest.plan or []) if len(entry) > 2]
+        if not plan:
+            self.log('❗ 작업 매니페스트의 세그먼트 일정표가 없습니다. 먼저 생성 단계를 실행하세요.')
+            return False
+        store = PcmStore(folder) if self.pcm_store and PcmStore.exists(folder) else None
+
+        jobs = []
+        for filename, section, _ in plan:
+            wav_path = os.path.join(folder, filename)
+            normalized_path = os.path.join(folder, NORMALIZED_DIRNAME, filename)
+            if os.path.exists(normalized_path):
+                wav_path = normalized_path
+            elif store is not None and filename in store:
+                # PCM 저장소가 있으면 디코딩 없이 memmap 조각을 바로 읽음
+                sample_rate = store.sample_rate
+                make_blocks = (lambda name: lambda: (block for _, _, block in
+                                                     store.iter_blocks([name], sample_rate * block_seconds)))(filename)
+                jobs.append((filename, section, make_blocks, sample_rate))
+                continue
+            elif not os.path.exists(wav_path):
+                self.log(f'❗ {filename} 파일이 없습니다.')
+                return False
+            sample_rate = audio_io.read_wav_info(wav_path)['sample_rate']
+            jobs.append((filename, section, wav_blocks(wav_path, sample_rate * block_seconds), sample_rate))
+
+        done = []
+
+        def on_done(filename, result):
+            done.append(filename)
+            if not result['conforms']:
+                failed = [name for name, ok in result['checks'].items() if not ok]
+                self.log(f"  {filename} ({result['stage']}): {', '.join(failed)} 목표 벗어남 "
+                         f"(밀도 {result['onset_density']}/초, 템포 {result['tempo_bpm']}, "
+                         f"변화폭 {result['dynamic_range_db']} dB)")
+            self.progress(int((len(done)/len(jobs))*100))
+
+        results, speed = verify_segments(jobs, on_done=on_done)
+        failed = sorted(name for name, result in results.items() if not result['conforms'])
+        wake_rising = check_wake_rising(results, plan)
+        report = {
+            'segments': results,
+            'night': {'segments': len(results), 'nonconforming': failed, 'wake_rising': wake_rising,
+                      'realtime_factor': speed},
+        }
+        utils.save_json(report, os.path.join(folder, CONFORMANCE_REPORT_FILENAME), verbose=False)
+
+        self.log(f'{len(results)}개 세그먼트 검사 (실시간 대비 {speed}배): 목표 벗어남 {len(failed)}개')
+        if wake_rising is False:
+            self.log('❗ 깨어나는 구간의 밀도가 점점 늘어나지 않습니다.')
+        if failed or wake_rising is False:
+            self.log(f'❗ 구간 목표를 벗어난 부분이 있습니다 ({CONFORMANCE_REPORT_FILENAME} 참고).')
+        else:
+            self.log('✅ 구간 적합성 검사 완료!')
+        self.progress(100)
+        return True
+
+    def convert_wav_to_mp3(self, folder):
+        self.log('WAV → MP3 변환 시작합니다...')
+        if not folder:
+            self.log('❗ 저장 폴더를 먼저 선택해주세요.')
+            return False
+
+        wav_files = sorted(f for f in os.listdir(folder) if f.endswith('.wav'))
+        total_files = len(wav_files)
+
+        if total_files == 0:
+            self.log('❗ 변환할 WAV 파일이 없습니다.')
+            return False
+
+        manifest = JobManifest.load(folder)
+        failed = 0
+        store = PcmStore(folder) if self.pcm_store else None
+
+        for idx, wav_file in enumerate(wav_files, start=1):
+            wav_path = os.path.join(folder, wav_file)
+            # 라우드니스 정규화를 마친 세그먼트는 정규화된 WAV를 인코딩
+            normalized_path = os.path.join(folder, NORMALIZED_DIRNAME, wav_file)
+            normalized = manifest.is_task_done('normalize', wav_file, normalized_path, inputs=[wav_path],
+                                               verify_hash=False)
+            if normalized:
+                wav_path = normalized_path
+            mp3_filename = os.path.splitext(wav_file)[0] + ".mp3"
+            mp3_path = os.path.join(folder, mp3_filename)
+
+            if manifest.is_task_done('convert', wav_file, mp3_path, inputs=[wav_path]):
+                self.log(f"[{idx}/{total_files}] {mp3_filename} 이미 변환됨, 건너뜁니다.")
+                self.progress(int((idx/total_files)*100))
+                continue
+
+            command = [
+                'ffmpeg', '-y', '-i', wav_path,
+                '-codec:a', 'libmp3lame', '-qscale:a', '2', mp3_path
+            ]
+
+            try:
+                if store is not None and not normalized:
+                    # 저장소에 없거나 WAV가 저장소 밖에서 바뀐 세그먼트는 이때 다시 옮겨 둠
+                    if not store.is_current(wav_file, wav_path):
+                        store.put_wav(wav_file, wav_path, stage=wav_file.split('_', 1)[-1].rsplit('.', 1)[0])
+                    encode_mp3_from_store(store, wav_file, mp3_path)
+                else:
+                    subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+                manifest.mark_task_done('convert', wav_file, mp3_path, inputs=[wav_path])
+                self.log(f"[{idx}/{total_files}] {mp3_filename} 변환 완료.")
+                self.progress(int((idx/total_files)*100))
+            except subprocess.CalledProcessError:
+                self.log(f"❗ {wav_file} 변환 실패!")
+                failed += 1
+
+        if store is not None and store.maybe_compact(manifest.plan):
+            self.log('PCM 저장소의 교체된 영역을 정리했습니다.')
+        self.log('✅ 모든 WAV 파일이 MP3로 변환 완료되었습니다.')
+        return failed == 0
+
+    def concat_stage_mp3(self, folder):
+        self.log('구간별 이어붙이기 시작합니다...')
+        if not folder:
+            self.log('❗ 저장 폴더를 먼저 선택해주세요.')
+            return False
+
+        # 구간별로 묶기
+        stages = segment_files_by_stage(folder, 'mp3')
+        if not stages:
+            self.log('❗ 이어붙일 MP3 파일이 없습니다.')
+            return False
+
+        total_stages = len(stages)
+        self.log(f'총 {total_stages}개 구간을 이어붙입니다.')
+
+        manifest = JobManifest.load(folder)
+        failed = 0
+
+        for idx, (stage, files) in enumerate(stages.items(), start=1):
+            list_path = os.path.join(folder, f'concat_list_{stage}.txt')
+            output_path = os.path.join(folder, f'{stage}_merged.mp3')
+
+            if manifest.is_task_done('concat_stage', stage, output_path, inputs=files):
+                self.log(f"[{idx}/{total_stages}] {stage} 구간은 이미 이어붙였습니다, 건너뜁니다.")
+                self.progress(int((idx/total_stages)*100))
+                continue
+
+            # 리스트 파일 작성
+            with open(list_path, 'w', encoding='utf-8') as f:
+                for filepath in files:
+                    f.write(f"file '{filepath}'\n")
+
+            # ffmpeg로 이어붙이기
+            command = [
+                'ffmpeg', '-y', '-f', 'concat', '-safe', '0',
+                '-i', list_path, '-c', 'copy', output_path
+            ]
+
+            try:
+                subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+                manifest.mark_task_done('concat_stage', stage, output_path, inputs=files)
+                self.log(f"[{idx}/{total_stages}] {stage} 구간 이어붙이기 완료: {output_path}")
+            except subprocess.CalledProcessError:
+                self.log(f"❗ {stage} 구간 이어붙이기 실패!")
+                failed += 1
+
+            self.progress(int((idx/total_stages)*100))
+
+        self.log('✅ 구간별 MP3 이어붙이기 완료!')
+        return failed == 0
+
+    def concat_final_mp3(self, folder):
+        self.log('최종 전체 이어붙이기 시작합니다...')
+        if not folder:
+            self.log('❗ 저장 폴더를 먼저 선택해주세요.')
+            return False
+
+        # 구간별 이어붙인 파일 검색
+        merged_files = sorted(glob.glob(os.path.join(folder, '*_merged.mp3')))
+
+        if not merged_files:
+            self.log('❗ 이어붙일 *_merged.mp3 파일이 없습니다.')
+            return False
+
+        # 일정표 순서(SleepOnset → NREM1 → REM1 → NREM2 → ...)로 정렬
+        # 매니페스트가 없으면 세그먼트 파일 번호 순서를 사용
+        manifest = JobManifest.load(folder)
+        priority_order = stage_order(manifest.plan) or list(segment_files_by_stage(folder, 'mp3'))
+
+        # 실제 파일 순서 정렬 (구간명이 정확히 일치하는 파일만)
+        sorted_files = []
+        for stage in priority_order:
+            merged_path = os.path.join(folder, f'{stage}_merged.mp3')
+            if merged_path in merged_files:
+                sorted_files.append(merged_path)
+        if len(sorted_files) < len(priority_order):
+            self.log(f'❗ 일부 구간의 *_merged.mp3가 없습니다 ({len(sorted_files)}/{len(priority_order)}).')
+
+        if not sorted_files:
+            self.log('❗ 최종 이어붙일 파일을 찾을 수 없습니다.')
+            return False
+
+        list_path = os.path.join(folder, 'final_concat_list.txt')
+        final_output = os.path.join(folder, 'final_sleep_music.mp3')
+
+        if manifest.is_task_done('concat_final', 'final', final_output, inputs=sorted_files):
+            self.log(f'✅ 최종 파일이 이미 최신 상태입니다: {final_output}')
+            self.progress(100)
+            return True
+
+        # 리스트 파일 작성
+        with open(list_path, 'w', encoding='utf-8') as f:
+            for filepath in sorted_files:
+                f.write(f"file '{filepath}'\n")
+
+        # ffmpeg로 최종 이어붙이기
+        command = [
+            'ffmpeg', '-y', '-f', 'concat', '-safe', '0',
+            '-i', list_path, '-c', 'copy', final_output
+        ]
+
+        try:
+            subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+            manifest.mark_task_done('concat_final', 'final', final_output, inputs=sorted_files)
+            self.log(f'✅ 최종 수면 음악 파일 완성: {final_output}')
+            self.progress(100)
+            return True
+        except subprocess.CalledProcessError:
+            self.log(f'❗ 최종 이어붙이기 실패!')
+            return False
+
+    def make_mp4_video(self, folder, image_path):
+        self.log('MP4 영상 만들기 시작합니다...')
+        if not folder:
+            self.log('❗ 저장 폴더를 먼저 선택해주세요.')
+            return False
+
+        audio_path = os.path.join(folder, 'final_sleep_music.mp3')
+        if not os.path.exists(audio_path):
+            self.log('❗ final_sleep_music.mp3 파일이 없습니다.')
+            return False
+
+        if not image_path or not os.path.exists(image_path):
+            self.log('❗ 배경 이미지가 선택되지 않았습니다.')
+            return False
+
+        output_video = os.path.join(folder, 'final_sleep_music_video.mp4')
+
+        manifest = JobManifest.load(folder)
+        if manifest.is_task_done('video', 'final', output_video, inputs=[audio_path, image_path]):
+            self.log(f'✅ MP4 영상이 이미 최신 상태입니다: {output_video}')
+            self.progress(100)
+            return True
+
+        command = [
+            'ffmpeg', '-y',
+            '-loop', '1',
+            '-i', image_path,
+            '-i', audio_path,
+            '-c:v', 'libx264',
+            '-c:a', 'aac',
+            '-b:a', '192k',
+            '-pix_fmt', 'yuv420p',
+            '-shortest',
+            output_video
+        ]
+        # 일정표 전체 길이로 영상 길이를 고정 (MP3 인코더 패딩으로 길어지는 것을 방지)
+        total_seconds = sum(entry[2] for entry in manifest.plan if len(entry) > 2)
+        if total_seconds:
+            command[-1:-1] = ['-t', str(total_seconds)]
+
+        try:
+            subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+            manifest.mark_task_done('video', 'final', output_video, inputs=[audio_path, image_path])
+            self.log(f'✅ MP4 영상 생성 완료: {output_video}')
+            self.progress(100)
+            return True
+        except subprocess.CalledProcessError:
+            self.log(f'❗ MP4 영상 생성 실패!')
+            return False
+
+    def run(self, config, stages=None):
+        """
+        설정(dict)에 따라 파이프라인 단계를 순서대로 실행합니다.
+
+        Args:
+            config (dict): prompt, output_folder, duration_hours, background_image 키를 가진 설정.
+            stages (list): 실행할 단계 목록 (기본값: config['stages'] 또는 전체 단계).
+
+        Returns:
+            bool: 모든 단계 성공 여부. 실패한 단계가 있으면 즉시 중단합니다.
+        """
+        stages = stages or config.get('stages') or PIPELINE_STAGES
+        folder = config.get('output_folder', '')
+
+        for stage in stages:
+            if stage == 'generate':
+                ok = self.generate_music(config.get('prompt', '').strip(), folder,
+                                         float(config.get('duration_hours', 8)))
+            elif stage == 'scan':
+                ok = self.scan_segments(folder)
+            elif stage == 'normalize':
+                ok = self.normalize_loudness(folder)
+            elif stage == 'verify':
+                ok = self.verify_stages(folder)
+            elif stage == 'convert':
+                ok = self.convert_wav_to_mp3(folder)
+            elif stage == 'concat_stage':
+                ok = self.concat_stage_mp3(folder)
+            elif stage == 'concat_final':
+                ok = self.concat_final_mp3(folder)
+            elif stage == 'video':
+                ok = self.make_mp4_video(folder, config.get('background_image'))
+            else:
+                self.log(f'❗ 알 수 없는 단계입니다: {stage}')
+                ok = False
+
+            if not ok:
+                self.log(f'❗ {stage} 단계에서 중단합니다.')
+                return False
+        return True
@@ -0,0 +1,126 @@
+import zlib
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+# 작업 시드에서 하위 시드를 만드는 방식. 매니페스트에 기록해 두고, 기록이 없는
+# 예전 작업은 기존 방식(작업 시드 + 번호)을 그대로 사용합니다.
+RNG_SCHEME = 'seedseq-v1'
+LEGACY_RNG_SCHEME = 'legacy'
+
+_thread_state = threading.local()   # 스레드마다 torch_rng로 정한 시드와 장치별 torch.Generator
+_hook_lock = threading.Lock()
+_hook_installed = None              # None: 아직 시도 안 함, True/False: audiocraft 샘플링 연결 여부
+_torch_lock = threading.Lock()      # audiocraft가 없을 때만 쓰는 전역 난수 보호용 잠금
+
+
+def _spawn_key(part):
+    if isinstance(part, str):
+        return zlib.crc32(part.encode('utf-8'))  # 실행마다 바뀌는 hash() 대신 고정된 값
+    return int(part) & 0xFFFFFFFF
+
+
+def seed_sequence(root_seed, *path):
+    """
+    작업 시드와 경로(예: 'segment', 17)로 독립된 SeedSequence를 만듭니다.
+    경로가 다르면 서로 겹치지 않는 난수 흐름이 되고, 같으면 항상 같은 흐름이 됩니다.
+    """
+    return np.random.SeedSequence(entropy=int(root_seed), spawn_key=tuple(_spawn_key(part) for part in path))
+
+
+def derive_seed(root_seed, *path):
+    """
+    경로별 정수 시드 (0 ~ 2^31-1). torch.manual_seed, 캐시 키 등에 사용합니다.
+    """
+    return int(seed_sequence(root_seed, *path).generate_state(1, dtype=np.uint32)[0]) & 0x7FFFFFFF
+
+
+def stream(root_seed, *path):
+    """
+    경로별 NumPy Generator (트랙/세그먼트/구간마다 하나씩).
+    """
+    return np.random.Generator(np.random.PCG64(seed_sequence(root_seed, *path)))
+
+
+def _thread_generator(device):
+    """
+    현재 스레드의 torch_rng 시드로 만든 device용 torch.Generator (torch_rng 밖이면 None = 전역 생성기).
+    """
+    seed = getattr(_thread_state, 'seed', None)
+    if seed is None:
+        return None
+    generators = _thread_state.generators
+    key = str(device)
+    if key not in generators:
+        import torch
+        generators[key] = torch.Generator(device=device).manual_seed(seed)
+    return generators[key]
+
+
+def _install_sampling_hook():
+    """
+    MusicGen의 토큰 샘플링은 모두 audiocraft.utils.utils.multinomial을 거칩니다 (top-k/top-p 포함).
+    이 함수가 generator를 받지 않았을 때 현재 스레드의 torch.Generator를 쓰도록 한 번만 감쌉니다.
+
+    Returns:
+        bool: 연결 여부 (audiocraft가 없으면 False).
+    """
+    global _hook_installed
+    with _hook_lock:
+        if _hook_installed is None:
+            try:
+                from audiocraft.utils import utils as audiocraft_utils
+            except ImportError:
+                _hook_installed = False
+                return False
+            original = audiocraft_utils.multinomial
+
+            def multinomial(input, num_samples, replacement=False, *, generator=None):
+                if generator is None:
+                    generator = _thread_generator(input.device)
+                return original(input, num_samples, replacement=replacement, generator=generator)
+
+            audiocraft_utils.multinomial = multinomial
+            _hook_installed = True
+        return _hook_installed
+
+
+@contextmanager
+def torch_rng(seed):
+    """
+    with 블록 안에서 이 스레드의 MusicGen 샘플링이 seed로 만든 전용 torch.Generator를 쓰게 합니다.
+
+    전역 난수 상태를 건드리지 않으므로 여러 스레드가 각자 다른 모델로 동시에 생성해도 서로의 난수를
+    섞어 쓰지 않고, 프로세스 전체를 잠그지도 않습니다. 새 Generator는 torch.manual_seed와 같은 흐름을
+    만들기 때문에 예전에 기록된 시드도 같은 결과가 나옵니다. audiocraft를 임포트할 수 없을 때만
+    전역 난수 상태를 잠금 안에서 고정하는 예전 방식으로 실행합니다.
+    """
+    if not _install_sampling_hook():
+        import torch
+
+        with _torch_lock:
+            devices = list(range(torch.cuda.device_count())) if torch.cuda.is_available() else []
+            with torch.random.fork_rng(devices=devices):
+                torch.manual_seed(seed)
+                yield
+        return
+
+    previous = getattr(_thread_state, 'seed', None), getattr(_thread_state, 'generators', None)
+    _thread_state.seed, _thread_state.generators = seed, {}
+    try:
+        yield
+    finally:
+        _thread_state.seed, _thread_state.generators = previous
+
+
+if __name__ == '__main__':
+    # --- 간단한 동작 확인 ---
+    root = 12345
+    print(f"세그먼트 시드: {[derive_seed(root, 'segment', idx) for idx in range(1, 4)]}")
+    print(f"재현성: {derive_seed(root, 'segment', 2) == derive_seed(root, 'segment', 2)}")
+    print(f"이웃 작업과 겹치지 않음: {derive_seed(root, 'segment', 2) != derive_seed(root + 1, 'segment', 1)}")
+    a = stream(root, 'track', 'piano').integers(0, 128, 5)
+    b = stream(root, 'track', 'piano').integers(0, 128, 5)
+    c = stream(root, 'track', 'violin').integers(0, 128, 5)
+    print(f"트랙 흐름: piano={a.tolist()} (재현 {np.array_equal(a, b)}), violin={c.tolist()}")
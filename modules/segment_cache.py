@@ -0,0 +1,286 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import hashlib
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# scripts 폴더(utils.py)를 임포트 경로에 추가
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+
+import utils
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'sleep_music_generator', 'segments')
+INDEX_FILENAME = 'index.json'
+LOCK_FILENAME = 'index.lock'
+FLUSH_SECONDS = 60  # 조회/추가 기록을 색인 파일에 모아 쓰는 최대 간격
+
+
+def make_segment_key(prompt, model, seed, duration):
+    """
+    세그먼트 캐시 키를 만듭니다. 생성 결과에 영향을 주는 값이 모두 같으면 같은 키가 됩니다.
+    샘플링 파라미터(top_k, temperature 등)는 MusicGen 기본값으로 고정이므로 키에 넣지 않고,
+    크기/정밀도는 model 식별자에 들어 있습니다.
+
+    Args:
+        prompt (str): MusicGen 프롬프트.
+        model (str): 모델 식별자 (예: 'medium-fp32').
+        seed (int): 세그먼트 시드.
+        duration (int): 세그먼트 길이(초).
+
+    Returns:
+        str: SHA-256 16진수 키.
+    """
+    payload = json.dumps({
+        'prompt': prompt.strip(),
+        'model': model,
+        'seed': seed,
+        'duration': duration,
+        'params': {},  # 예전 키와 같은 값이 되도록 유지
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def stage_family(section):
+    """
+    'NREM2', 'REM13' 처럼 번호가 붙은 구간명에서 구간 종류('NREM', 'REM')만 남깁니다.
+    """
+    return section.rstrip('0123456789')
+
+
+class SegmentCache:
+    """
+    생성된 세그먼트 WAV를 내용 주소(content-addressed) 방식으로 보관하는 캐시.
+
+    같은 (프롬프트, 모델, 시드, 길이)의 세그먼트는 다시 생성하지 않고
+    복사해 사용합니다. 전체 크기가 max_bytes를 넘으면 가장 오래 사용하지 않은 항목부터
+    삭제합니다(LRU). 같은 프롬프트/구간 종류의 캐시 세그먼트를 다른 밤에 재사용할 수도 있습니다.
+
+    조회/추가 기록은 메모리에 모았다가 flush()에서 한 번에 색인 파일에 씁니다 (삭제가 필요할 때,
+    FLUSH_SECONDS마다, 그리고 호출한 쪽이 작업을 마칠 때). 쓸 때는 파일 잠금을 잡고 디스크의 색인과
+    합치므로, 같은 캐시 폴더를 여러 프로세스가 함께 써도 서로의 항목을 지우지 않습니다.
+
+    Args:
+        cache_dir (str): 캐시 폴더 (기본값: ~/.cache/sleep_music_generator/segments).
+        max_bytes (int): 캐시 최대 크기 (기본값: 20GB).
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=20 * 1024 ** 3):
+        self.cache_dir = cache_dir or DEFAULT_CACHE_DIR
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(self.cache_dir, INDEX_FILENAME)
+        self.lock_path = os.path.join(self.cache_dir, LOCK_FILENAME)
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.index = self._read_index()
+        self._touched = {}     # 마지막 flush 이후 바뀐 키 -> 그동안 늘어난 적중 수
+        self._removed = set()  # 마지막 flush 이후 지운 키
+        self._flushed_at = time.time()
+
+    def _object_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.wav")
+
+    def _read_index(self):
+        index = utils.load_json(self.index_path) if os.path.exists(self.index_path) else None
+        return index or {}
+
+    @contextmanager
+    def _file_lock(self):
+        """
+        색인을 읽고-합치고-쓰는 동안 다른 프로세스가 끼어들지 않도록 잡는 파일 잠금.
+        """
+        with open(self.lock_path, 'a+b') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def flush(self):
+        """
+        메모리에 모아 둔 조회/추가/삭제 기록을 디스크 색인과 합쳐 저장하고, 크기가 넘치면 LRU로 지웁니다.
+        다른 프로세스가 그사이 추가한 항목도 이때 이 색인으로 들어옵니다.
+        """
+        with self._lock:
+            with self._file_lock():
+                merged = self._read_index()
+                for key in self._removed:
+                    merged.pop(key, None)
+                for key, hits in self._touched.items():
+                    entry = self.index.get(key)
+                    if entry is None:
+                        continue
+                    disk_entry = merged.get(key)
+                    if disk_entry is not None:
+                        entry = dict(entry,
+                                     last_access=max(entry['last_access'], disk_entry['last_access']),
+                                     hits=disk_entry.get('hits', 0) + hits,
+                                     reused_by=sorted(set(entry.get('reused_by', []))
+                                                      | set(disk_entry.get('reused_by', []))))
+                    merged[key] = entry
+                self.index = merged
+                self._evict()
+                utils.save_json(self.index, self.index_path, verbose=False)
+            self._touched.clear()
+            self._removed.clear()
+            self._flushed_at = time.time()
+
+    def _touch(self, key, hits=0):
+        self._touched[key] = self._touched.get(key, 0) + hits
+
+    def _maybe_flush(self):
+        with self._lock:
+            due = bool(self._touched or self._removed) and (
+                self.total_bytes() > self.max_bytes or time.time() - self._flushed_at > FLUSH_SECONDS)
+        if due:
+            self.flush()
+
+    def total_bytes(self):
+        return sum(entry['size'] for entry in self.index.values())
+
+    def get(self, key, dest_path):
+        """
+        캐시에 key가 있으면 dest_path로 복사하고 True를 반환합니다.
+        """
+        with self._lock:
+            entry = self.index.get(key)
+            object_path = self._object_path(key)
+            if entry is None or not os.path.exists(object_path):
+                if entry is not None:
+                    del self.index[key]
+                    self._removed.add(key)
+                return False
+            entry['last_access'] = time.time()
+            entry['hits'] = entry.get('hits', 0) + 1
+            self._touch(key, hits=1)
+        shutil.copyfile(object_path, dest_path)
+        self._maybe_flush()
+        return True
+
+    def put(self, key, src_path, meta=None):
+        """
+        생성된 세그먼트를 캐시에 추가하고 필요하면 오래된 항목을 삭제합니다.
+
+        Args:
+            key (str): make_segment_key로 만든 키.
+            src_path (str): 캐시에 넣을 WAV 파일 경로.
+            meta (dict): 재사용 검색용 정보 (prompt, model, duration, stage 등).
+        """
+        object_path = self._object_path(key)
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        tmp_path = f"{object_path}.tmp"
+        shutil.copyfile(src_path, tmp_path)
+        os.replace(tmp_path, object_path)
+        with self._lock:
+            self.index[key] = {
+                'size': os.path.getsize(object_path),
+                'last_access': time.time(),
+                'hits': 0,
+                'meta': meta or {},
+            }
+            self._removed.discard(key)
+            self._touch(key)
+        self._maybe_flush()
+
+    def _evict(self):
+        """
+        크기가 max_bytes를 넘으면 가장 오래 쓰지 않은 항목부터 지웁니다 (flush에서 파일 잠금을 잡은 채 호출).
+        """
+        total = self.total_bytes()
+        if total <= self.max_bytes:
+            return
+        for key, entry in sorted(self.index.items(), key=lambda item: item[1]['last_access']):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(self._object_path(key))
+            except OSError:
+                pass
+            total -= entry['size']
+            del self.index[key]
+
+    def find(self, **meta_filter):
+        """
+        meta가 주어진 조건과 모두 일치하는 캐시 키 목록을 반환합니다 (키 순서로 정렬).
+        """
+        with self._lock:
+            return sorted(key for key, entry in self.index.items()
+                          if all(entry['meta'].get(name) == value for name, value in meta_filter.items()))
+
+    def reuse(self, dest_path, seed, exclude_job=None, **meta_filter):
+        """
+        조건에 맞는 캐시 세그먼트 중 하나를 시드로 정해진 순서에 따라 골라 복사합니다.
+        (예: 같은 프롬프트의 NREM 세그먼트를 다른 밤에 섞어서 재사용)
+
+        Args:
+            exclude_job: 이 작업이 직접 만들었거나 이미 재사용한 세그먼트는 후보에서 제외합니다
+                (같은 밤 안에서 반복 방지). 재사용 기록은 색인에 남으므로 작업을 이어서 실행해도 유지됩니다.
+
+        Returns:
+            str: 사용한 캐시 키. 후보가 없으면 None.
+        """
+        candidates = self.find(**meta_filter)
+        if exclude_job is not None:
+            with self._lock:
+                candidates = [key for key in candidates if key in self.index
+                              and self.index[key]['meta'].get('job') != exclude_job
+                              and exclude_job not in self.index[key].get('reused_by', [])]
+        if not candidates:
+            return None
+        key = random.Random(seed).choice(candidates)
+        if not self.get(key, dest_path):
+            return None
+        if exclude_job is not None:
+            with self._lock:
+                entry = self.index.get(key)
+                if entry is not None:
+                    entry['reused_by'] = entry.get('reused_by', []) + [exclude_job]
+                    self._touch(key)
+        return key
+
+
+if __name__ == '__main__':
+    # --- 간단한 동작 확인 ---
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = SegmentCache(os.path.join(tmp_dir, 'cache'), max_bytes=2500)
+        for idx in range(3):
+            src = os.path.join(tmp_dir, f"src{idx}.wav")
+            with open(src, 'wb') as f:
+                f.write(os.urandom(1000))
+            key = make_segment_key('calm piano', 'medium-fp32', idx, 120)
+            cache.put(key, src, meta={'prompt': 'calm piano', 'stage': 'NREM'})
+        print(f"캐시 항목 수 (LRU 삭제 후): {len(cache.index)}, 크기: {cache.total_bytes()}")
+        first_key = make_segment_key('calm piano', 'medium-fp32', 0, 120)
+        print(f"가장 오래된 항목 조회: {cache.get(first_key, os.path.join(tmp_dir, 'out.wav'))}")
+        print(f"NREM 재사용: {cache.reuse(os.path.join(tmp_dir, 'reuse.wav'), seed=7, stage='NREM')}")
+        reused = [cache.reuse(os.path.join(tmp_dir, 'reuse.wav'), seed=7, exclude_job=99, stage='NREM')
+                  for _ in range(3)]
+        print(f"같은 작업의 재사용은 겹치지 않음: {reused}")
+        cache.flush()
+        other = SegmentCache(os.path.join(tmp_dir, 'cache'), max_bytes=2500)  # 같은 폴더를 쓰는 다른 프로세스
+        src = os.path.join(tmp_dir, 'src_other.wav')
+        with open(src, 'wb') as f:
+            f.write(os.urandom(500))
+        other.put(make_segment_key('calm piano', 'medium-fp32', 10, 120), src, meta={'stage': 'NREM'})
+        other.flush()
+        cache.flush()
+        print(f"다른 프로세스 항목과 합친 색인: {len(cache.index)}개, 크기 {cache.total_bytes()}")
@@ -0,0 +1,268 @@
+import os
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import audio_io
+
+# 지문용 스펙트럼: 0.5초마다 4096샘플 프레임 하나 (세그먼트 전체 FFT 없이 충분한 해상도)
+FRAME_SIZE = 4096
+FRAME_HOP_SECONDS = 0.5
+CHROMA_BLOCKS = 16          # 크로마를 시간 순으로 16묶음 평균 → 16 x 12
+CHROMA_MIN_HZ = 55.0
+CHROMA_MAX_HZ = 4000.0
+SPECTRAL_BANDS = 24         # 로그 간격 대역 에너지 (음색 요약)
+ENVELOPE_SECONDS = 0.1      # RMS 포락선 창 길이
+ENVELOPE_POINTS = 64        # 길이가 다른 세그먼트끼리 비교하도록 포락선을 64점으로 맞춤
+
+# 결함 기준. 깊은 구간의 성긴 음표 사이 조용한 부분(잡음 바닥)은 정상이므로 결함으로 보지 않고,
+# 디지털 무음(0에 가까운 샘플)이 이어지는 경우만 무음/끊김으로 봅니다.
+DIGITAL_SILENCE_DB = -90.0  # 이보다 조용한 창은 디지털 무음 (생성된 음악의 잡음 바닥보다 훨씬 아래)
+SILENCE_RUN_SECONDS = 2.0   # 디지털 무음이 이만큼 이어지면 무음 결함
+CLIP_LEVEL = 0.999
+CLIP_MAX_RATIO = 1e-4       # 샘플의 0.01% 넘게 꽉 차면 클리핑
+AUDIBLE_RANGE_DB = 20.0     # 가장 큰 부분(상위 1% 창)에서 이 범위 안의 창을 '들리는' 창으로 셈
+HIT_DB = 12.0               # 들리는 창의 중앙값과 주변(약 5초) 중앙값보다 모두 이만큼 큰 창은 갑작스러운 타격음
+HIT_CONTEXT_WINDOWS = 51
+
+# 중복 기준: 크로마 흐름과 음량 포락선이 모두 거의 같아야 중복 (같은 조성의 잔잔한 패드끼리는
+# 크로마가 비슷하지만 포락선은 다르므로 걸리지 않음)
+DUPLICATE_CHROMA = 0.98
+DUPLICATE_ENVELOPE = 0.95
+
+
+@lru_cache(maxsize=8)
+def _spectral_maps(sample_rate, n_fft=FRAME_SIZE):
+    """
+    rfft 빈 → 크로마(12) / 로그 대역(SPECTRAL_BANDS) 합산 행렬과 Hann 창.
+    """
+    freqs = np.fft.rfftfreq(n_fft, 1.0 / sample_rate)
+    chroma = np.zeros((len(freqs), 12), dtype=np.float32)
+    valid = (freqs >= CHROMA_MIN_HZ) & (freqs <= CHROMA_MAX_HZ)
+    pitch_class = np.mod(np.rint(12 * np.log2(freqs[valid] / 440.0) + 69).astype(int), 12)
+    chroma[np.flatnonzero(valid), pitch_class] = 1.0
+
+    edges = np.geomspace(40.0, sample_rate / 2, SPECTRAL_BANDS + 1)
+    band = np.clip(np.searchsorted(edges, freqs, side='right') - 1, 0, SPECTRAL_BANDS - 1)
+    bands = np.zeros((len(freqs), SPECTRAL_BANDS), dtype=np.float32)
+    in_range = freqs >= edges[0]
+    bands[np.flatnonzero(in_range), band[in_range]] = 1.0
+    return chroma, bands, np.hanning(n_fft).astype(np.float32)
+
+
+def _unit(vector):
+    return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+
+def _runs(mask):
+    """
+    True가 이어지는 구간들의 (시작, 끝) 인덱스 배열 [n, 2] (끝은 포함하지 않음).
+    """
+    edges = np.diff(np.r_[0, mask.astype(np.int8), 0])
+    return np.stack([np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)], axis=1)
+
+
+def analyze_segment(audio, sample_rate):
+    """
+    세그먼트 1개의 지문과 결함 지표를 계산합니다.
+
+    Returns:
+        dict: chroma(정규화된 16x12 벡터), envelope(정규화된 포락선), bands(대역 에너지 dB),
+            silence_ratio(디지털 무음 창 비율), clipped_ratio, hits(타격음 개수), rms_db(들리는 창의 중앙값),
+            peak_db, artifacts(결함 이름 목록: silence, dropout, clipping, loud_hit)
+    """
+    mono = audio.mean(axis=1) if audio.ndim == 2 else audio
+    mono = np.asarray(mono, dtype=np.float32)
+
+    # RMS 포락선 (100ms 창)
+    window = int(sample_rate * ENVELOPE_SECONDS)
+    count = max(1, len(mono) // window)
+    windows = np.resize(mono, count * window).reshape(count, window) if len(mono) < window \
+        else mono[:count * window].reshape(count, window)
+    rms_db = 10.0 * np.log10(np.maximum(np.einsum('ij,ij->i', windows, windows) / window, 1e-12))
+    peak = float(np.abs(mono).max()) if len(mono) else 0.0
+
+    digital_silence = rms_db < DIGITAL_SILENCE_DB
+    silence_ratio = float(np.mean(digital_silence))
+    silence_runs = _runs(digital_silence)
+    run_windows = silence_runs[:, 1] - silence_runs[:, 0]
+    long_silence = bool(np.any(run_windows * ENVELOPE_SECONDS >= SILENCE_RUN_SECONDS))
+    # 음악 중간에 짧게 0으로 끊긴 곳 (앞뒤가 모두 소리인 디지털 무음)
+    dropout = bool(np.any((silence_runs[:, 0] > 0) & (silence_runs[:, 1] < len(rms_db))
+                          & (run_windows * ENVELOPE_SECONDS < SILENCE_RUN_SECONDS)))
+    clipped_ratio = float(np.count_nonzero(np.abs(mono) >= CLIP_LEVEL)) / max(len(mono), 1)
+
+    # 들리는 창: 세그먼트에서 가장 큰 부분보다 AUDIBLE_RANGE_DB 안쪽 (음표 사이의 잡음 바닥/여운 꼬리는 제외)
+    sounding = rms_db[~digital_silence]
+    top_db = float(np.percentile(sounding, 99)) if len(sounding) else DIGITAL_SILENCE_DB
+    audible = sounding[sounding >= top_db - AUDIBLE_RANGE_DB]
+    median_db = float(np.median(audible)) if len(audible) else DIGITAL_SILENCE_DB
+    # 천천히 커지는 부분은 걸리지 않도록 주변 창들의 중앙값과도 비교
+    context = min(HIT_CONTEXT_WINDOWS, len(rms_db)) | 1
+    padded = np.pad(rms_db, context // 2, mode='edge')
+    local_db = np.median(np.lib.stride_tricks.sliding_window_view(padded, context), axis=1)
+    hits = len(_runs(rms_db - np.maximum(local_db, median_db) > HIT_DB))  # 이어진 창은 타격음 1개
+
+    artifacts = []
+    if long_silence:
+        artifacts.append('silence')
+    if dropout:
+        artifacts.append('dropout')
+    if clipped_ratio > CLIP_MAX_RATIO:
+        artifacts.append('clipping')
+    if hits:
+        artifacts.append('loud_hit')
+
+    # 스펙트럼 프레임을 한 번의 rfft로 (프레임 x 빈)
+    chroma_map, band_map, hann = _spectral_maps(sample_rate)
+    hop = int(sample_rate * FRAME_HOP_SECONDS)
+    if len(mono) >= FRAME_SIZE:
+        frames = np.lib.stride_tricks.sliding_window_view(mono, FRAME_SIZE)[::hop] * hann
+    else:
+        frames = np.pad(mono, (0, FRAME_SIZE - len(mono)))[None, :] * hann
+    spectrum = np.fft.rfft(frames, axis=1)
+    power = (spectrum.real ** 2 + spectrum.imag ** 2).astype(np.float32)
+
+    chroma_frames = power @ chroma_map
+    chroma_frames /= np.maximum(chroma_frames.sum(axis=1, keepdims=True), 1e-12)
+    chroma = np.stack([block.mean(axis=0) for block in np.array_split(chroma_frames, CHROMA_BLOCKS)
+                       if len(block)])
+    chroma = np.resize(chroma, (CHROMA_BLOCKS, 12)).reshape(-1)  # 아주 짧은 세그먼트도 길이 고정
+    bands_db = 10.0 * np.log10(np.maximum((power @ band_map).mean(axis=0), 1e-12))
+
+    # 포락선: 상대 시간 64점으로 맞추고 평균 0, 길이 1로 정규화 (내적 = 상관계수)
+    envelope = np.interp(np.linspace(0, 1, ENVELOPE_POINTS), np.linspace(0, 1, len(rms_db)), rms_db)
+    envelope = envelope - envelope.mean()
+
+    return {
+        'chroma': _unit(chroma).astype(np.float32),
+        'envelope': _unit(envelope).astype(np.float32),
+        'bands': np.round(bands_db, 1),
+        'silence_ratio': round(silence_ratio, 4),
+        'clipped_ratio': round(clipped_ratio, 6),
+        'hits': hits,
+        'rms_db': round(median_db, 2),
+        'peak_db': round(20.0 * np.log10(max(peak, 1e-9)), 2),
+        'artifacts': artifacts,
+    }
+
+
+def find_duplicates(names, chroma, envelope, skip=(), chroma_threshold=DUPLICATE_CHROMA,
+                    envelope_threshold=DUPLICATE_ENVELOPE):
+    """
+    지문 행렬끼리의 코사인 유사도로 거의 같은 세그먼트 쌍을 찾습니다 (한 번의 행렬 곱).
+    중복 쌍에서는 뒤쪽 세그먼트를 앞쪽의 중복으로 표시합니다.
+
+    Args:
+        names (list): 세그먼트 이름 (행 순서).
+        chroma, envelope (np.ndarray): [세그먼트, 차원] 정규화된 지문.
+        skip (iterable): 비교에서 뺄 세그먼트 이름 (예: 루프 타일링으로 일부러 반복한 세그먼트).
+
+    Returns:
+        list: [{'segment', 'duplicate_of', 'chroma_similarity', 'envelope_similarity'}, ...]
+    """
+    if len(names) < 2:
+        return []
+    chroma_similarity = chroma @ chroma.T
+    envelope_similarity = envelope @ envelope.T
+    candidate = np.triu((chroma_similarity >= chroma_threshold) & (envelope_similarity >= envelope_threshold), k=1)
+    skipped = np.isin(np.asarray(names), list(skip))
+    candidate[skipped, :] = False
+    candidate[:, skipped] = False
+
+    duplicates = []
+    seen = set()
+    for i, j in zip(*np.nonzero(candidate)):
+        if j in seen:
+            continue
+        seen.add(j)
+        duplicates.append({
+            'segment': names[j],
+            'duplicate_of': names[i],
+            'chroma_similarity': round(float(chroma_similarity[i, j]), 4),
+            'envelope_similarity': round(float(envelope_similarity[i, j]), 4),
+        })
+    return duplicates
+
+
+def scan_segments(sources, skip_duplicates=(), max_workers=None, on_done=None, fingerprints=None):
+    """
+    여러 세그먼트를 스레드 풀에서 병렬로 분석하고 중복을 찾습니다 (NumPy FFT/파일 I/O는 GIL을 놓음).
+
+    Args:
+        sources (list): [(이름, read_audio), ...]. read_audio()는 (audio, sample_rate)를 반환.
+        skip_duplicates (iterable): 중복 검사에서 뺄 세그먼트 이름.
+        on_done (callable): 세그먼트 하나가 끝날 때마다 on_done(이름, 결과) 호출.
+        fingerprints (dict): 앞선 검사의 {이름: (결과, 크로마, 포락선)}. 주어지면 sources의 세그먼트만
+            새로 분석해 이 dict를 갱신하고, 중복은 저장된 지문 전체(처음 넣은 순서)와 비교합니다.
+            다시 생성한 세그먼트만 다시 읽을 때 사용합니다.
+
+    Returns:
+        tuple: ({이름: 결과(지문 제외)}, 중복 목록, {이름: 결함 이유 목록})
+    """
+    def work(source):
+        name, read_audio = source
+        audio, sample_rate = read_audio()
+        return name, analyze_segment(audio, sample_rate)
+
+    fingerprints = {} if fingerprints is None else fingerprints
+    with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+        for name, result in executor.map(work, sources):
+            chroma = result.pop('chroma')
+            envelope = result.pop('envelope')
+            result['bands'] = result['bands'].tolist()
+            fingerprints[name] = (result, chroma, envelope)
+            if on_done:
+                on_done(name, result)
+
+    names = list(fingerprints)
+    results = {name: fingerprints[name][0] for name in names}
+    duplicates = find_duplicates(names, np.array([fingerprints[name][1] for name in names]),
+                                 np.array([fingerprints[name][2] for name in names]), skip=skip_duplicates) \
+        if names else []
+    flagged = {name: list(result['artifacts']) for name, result in results.items() if result['artifacts']}
+    for duplicate in duplicates:
+        flagged.setdefault(duplicate['segment'], []).append(f"duplicate:{duplicate['duplicate_of']}")
+    return results, duplicates, flagged
+
+
+def wav_reader(filepath):
+    """
+    scan_segments용: WAV 파일 전체를 읽는 함수를 만듭니다.
+    """
+    return lambda: audio_io.read_wav(filepath)
+
+
+if __name__ == '__main__':
+    # --- 간단한 동작 확인: 합성 세그먼트에 중복/결함을 섞어 넣고 찾아내기 ---
+    import time
+
+    sr = 32000
+    rng = np.random.default_rng(0)
+    t = np.arange(sr * 120) / sr
+
+    def pad(seed):
+        local = np.random.default_rng(seed)
+        root = local.choice([130.81, 146.83, 174.61])
+        audio = sum(level * np.sin(2 * np.pi * root * ratio * t + local.uniform(0, 6.3))
+                    for ratio, level in ((1.0, 0.2), (1.25, 0.12), (1.5, 0.1)))
+        audio *= 0.6 + 0.4 * np.sin(2 * np.pi * local.uniform(0.02, 0.1) * t + local.uniform(0, 6.3))
+        return (audio + local.normal(0, 0.005, len(t))).astype(np.float32)
+
+    clips = {f"{idx:03d}_NREM1.wav": pad(idx) for idx in range(1, 41)}
+    clips['010_NREM1.wav'] = clips['003_NREM1.wav'] * 0.98 + rng.normal(0, 0.002, len(t)).astype(np.float32)
+    clips['020_NREM1.wav'][sr * 10:sr * 60] = 0.0                               # 무음
+    clips['030_NREM1.wav'] = np.clip(clips['030_NREM1.wav'] * 8, -1, 1)          # 클리핑
+    clips['035_NREM1.wav'][sr * 50:sr * 50 + 4800] += rng.normal(0, 0.8, 4800)  # 타격음
+    clips['038_NREM1.wav'][sr * 70:sr * 70 + sr // 2] = 0.0                     # 0.5초 끊김
+    # 깊은 NREM다운 성긴 피아노 (8초마다 약한 음 1개, 잡음 바닥 -80 dB): 결함이 아님
+    note = 0.03 * np.sin(2 * np.pi * 261.63 * t[:sr * 8]) * np.exp(-t[:sr * 8] / 0.8)
+    clips['040_NREM1.wav'] = (np.tile(note, 15) + rng.normal(0, 1e-4, len(t))).astype(np.float32)
+
+    start = time.perf_counter()
+    results, duplicates, flagged = scan_segments([(name, (lambda a=audio: (a, sr))) for name, audio in clips.items()])
+    seconds = time.perf_counter() - start
+    print(f"{len(clips)}개 세그먼트({len(clips) * 2}분) 검사: {seconds:.2f}초")
+    for name, reasons in sorted(flagged.items()):
+        print(f"  {name}: {', '.join(reasons)}")
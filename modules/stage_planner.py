@@ -0,0 +1,175 @@
+import math
+
+# 기본 수면 구조 설정
+DEFAULT_CYCLE_MINUTES = 90
+DEFAULT_ONSET_MINUTES = 15
+DEFAULT_WAKE_MINUTES = 0
+# 주기마다 REM이 차지하는 비율 (첫 주기 → 마지막 주기로 선형 증가)
+DEFAULT_REM_RATIO = (0.10, 0.35)
+# 설정 파일/작업 요청에서 받는 구간 설계 옵션 이름
+STAGE_OPTION_KEYS = ('cycle_minutes', 'onset_minutes', 'wake_minutes', 'rem_ratio')
+
+
+def split_evenly(total, parts):
+    """
+    정수 total을 parts개의 정수로 최대한 고르게 나눕니다 (합은 정확히 total).
+    """
+    base, remainder = divmod(total, parts)
+    return [base + (1 if idx < remainder else 0) for idx in range(parts)]
+
+
+def split_stage_seconds(stage_seconds, segment_seconds):
+    """
+    구간 길이를 segment_seconds 이하의 세그먼트들로 나눕니다.
+    마지막 세그먼트만 짧아지는 대신 모든 세그먼트를 고르게 맞춰, 버려지는 오디오가 없습니다.
+    """
+    if stage_seconds <= 0:
+        return []
+    count = math.ceil(stage_seconds / segment_seconds)
+    return split_evenly(stage_seconds, count)
+
+
+def build_stage_plan(total_minutes, cycle_minutes=DEFAULT_CYCLE_MINUTES, onset_minutes=DEFAULT_ONSET_MINUTES,
+                     wake_minutes=DEFAULT_WAKE_MINUTES, rem_ratio=DEFAULT_REM_RATIO):
+    """
+    수면 총 시간을 구간(stage) 순서와 길이(초)로 나눕니다.
+
+    Sleep onset → (NREM → REM) × 주기 수 → (선택) Wake-up 순서이며,
+    주기 수는 남은 시간을 cycle_minutes로 나눈 값을 반올림해 정하고 남은 시간을
+    주기마다 고르게 배분합니다. REM 비율은 밤이 깊어질수록 늘어납니다.
+
+    Args:
+        total_minutes (int): 수면 총 시간(분).
+        cycle_minutes (int): 수면 주기 길이(분, 기본값: 90).
+        onset_minutes (int): 잠들기(Sleep onset) 구간 길이(분, 기본값: 15).
+        wake_minutes (int): 마지막 기상(WakeUp) 구간 길이(분, 기본값: 0 = 없음).
+        rem_ratio (tuple): (첫 주기 REM 비율, 마지막 주기 REM 비율).
+
+    Returns:
+        list: [{'stage': 'NREM1', 'family': 'NREM', 'cycle': 1, 'seconds': 4860}, ...]
+            구간 길이의 합은 정확히 total_minutes * 60 입니다.
+
+    Raises:
+        ValueError: total_minutes/onset_minutes/wake_minutes가 음수, cycle_minutes가 0 이하,
+            rem_ratio가 0~1 범위를 벗어날 때.
+    """
+    if total_minutes < 0:
+        raise ValueError(f"수면 총 시간은 0 이상이어야 합니다: total_minutes={total_minutes}")
+    if not cycle_minutes or cycle_minutes <= 0:
+        raise ValueError(f"수면 주기 길이는 0보다 커야 합니다: cycle_minutes={cycle_minutes}")
+    if onset_minutes < 0 or wake_minutes < 0:
+        raise ValueError(f"잠들기/기상 구간 길이는 0 이상이어야 합니다: "
+                         f"onset_minutes={onset_minutes}, wake_minutes={wake_minutes}")
+    if len(rem_ratio) != 2 or not all(0 <= ratio <= 1 for ratio in rem_ratio):
+        raise ValueError(f"REM 비율은 0~1 사이 값 2개여야 합니다: rem_ratio={rem_ratio}")
+
+    total_seconds = int(round(total_minutes * 60))
+    onset_seconds = min(int(onset_minutes * 60), total_seconds)
+    wake_seconds = min(int(wake_minutes * 60), total_seconds - onset_seconds)
+    sleep_seconds = total_seconds - onset_seconds - wake_seconds
+
+    stages = []
+    if onset_seconds > 0:
+        stages.append({'stage': 'SleepOnset', 'family': 'SleepOnset', 'cycle': 0, 'seconds': onset_seconds})
+
+    if sleep_seconds > 0:
+        num_cycles = max(1, int(round(sleep_seconds / (cycle_minutes * 60))))
+        first_ratio, last_ratio = rem_ratio
+        for idx, cycle_seconds in enumerate(split_evenly(sleep_seconds, num_cycles)):
+            ratio = first_ratio if num_cycles == 1 else first_ratio + (last_ratio - first_ratio) * idx / (num_cycles - 1)
+            rem_seconds = int(round(cycle_seconds * ratio))
+            cycle = idx + 1
+            stages.append({'stage': f'NREM{cycle}', 'family': 'NREM', 'cycle': cycle,
+                           'seconds': cycle_seconds - rem_seconds})
+            if rem_seconds > 0:
+                stages.append({'stage': f'REM{cycle}', 'family': 'REM', 'cycle': cycle, 'seconds': rem_seconds})
+
+    if wake_seconds > 0:
+        stages.append({'stage': 'WakeUp', 'family': 'WakeUp', 'cycle': len(stages), 'seconds': wake_seconds})
+    stages = [stage for stage in stages if stage['seconds'] > 0]
+    assert sum(stage['seconds'] for stage in stages) == total_seconds
+    return stages
+
+
+def stage_options_from(config):
+    """
+    설정(dict)에서 build_stage_plan 옵션만 골라냅니다.
+    """
+    options = {key: config[key] for key in STAGE_OPTION_KEYS if config.get(key) is not None}
+    if 'rem_ratio' in options:
+        options['rem_ratio'] = tuple(options['rem_ratio'])
+    return options
+
+
+def build_schedule(total_minutes, segment_seconds=120, **stage_options):
+    """
+    생성/이어붙이기/영상 단계가 함께 사용하는 세그먼트 단위 일정표를 만듭니다.
+
+    Args:
+        total_minutes (int): 수면 총 시간(분).
+        segment_seconds (int): 세그먼트 최대 길이(초).
+        **stage_options: build_stage_plan 옵션 (cycle_minutes, onset_minutes, wake_minutes, rem_ratio).
+
+    Returns:
+        list: [{'index': 1, 'filename': '001_SleepOnset.wav', 'stage': 'SleepOnset',
+                'family': 'SleepOnset', 'cycle': 0, 'seconds': 113, 'start_seconds': 0}, ...]
+            세그먼트 길이의 합은 정확히 total_minutes * 60 입니다. 파일 번호는 3자리이고,
+            세그먼트가 1000개 이상이면 모든 번호가 같은 자릿수가 되도록 늘어납니다.
+
+    Raises:
+        ValueError: segment_seconds가 0 이하이거나 구간 설계 옵션이 잘못되었을 때 (build_stage_plan 참고).
+    """
+    if not segment_seconds or segment_seconds <= 0:
+        raise ValueError(f"세그먼트 길이는 0보다 커야 합니다: segment_seconds={segment_seconds}")
+
+    segments = [(stage, seconds) for stage in build_stage_plan(total_minutes, **stage_options)
+                for seconds in split_stage_seconds(stage['seconds'], segment_seconds)]
+    width = max(3, len(str(len(segments))))
+
+    schedule = []
+    start_seconds = 0
+    for index, (stage, seconds) in enumerate(segments, start=1):
+        schedule.append({
+            'index': index,
+            'filename': f"{index:0{width}d}_{stage['stage']}.wav",
+            'stage': stage['stage'],
+            'family': stage['family'],
+            'cycle': stage['cycle'],
+            'seconds': seconds,
+            'start_seconds': start_seconds,
+        })
+        start_seconds += seconds
+    assert start_seconds == int(round(total_minutes * 60))
+    return schedule
+
+
+def schedule_to_plan(schedule):
+    """
+    매니페스트에 기록하는 [파일명, 구간명, 길이(초)] 목록으로 바꿉니다.
+    """
+    return [[entry['filename'], entry['stage'], entry['seconds']] for entry in schedule]
+
+
+def stage_order(plan):
+    """
+    일정표(또는 매니페스트 plan)에서 구간명을 등장 순서대로 반환합니다.
+    """
+    order = []
+    for entry in plan:
+        stage = entry['stage'] if isinstance(entry, dict) else entry[1]
+        if stage not in order:
+            order.append(stage)
+    return order
+
+
+if __name__ == '__main__':
+    # --- 7~10시간 일정표 확인 ---
+    for hours in (7, 8, 9, 10):
+        schedule = build_schedule(hours * 60, segment_seconds=120)
+        total = sum(entry['seconds'] for entry in schedule)
+        stages = build_stage_plan(hours * 60)
+        summary = ', '.join(f"{stage['stage']} {stage['seconds'] / 60:.1f}분" for stage in stages)
+        print(f"{hours}h: 세그먼트 {len(schedule)}개, 합계 {total / 60:.1f}분 (목표 {hours * 60}분)")
+        print(f"    {summary}")
+    long_night = build_schedule(10 * 60, segment_seconds=30)
+    print(f"10h/30초: 세그먼트 {len(long_night)}개, {long_night[0]['filename']} ~ {long_night[-1]['filename']}")
@@ -1,6 +1,8 @@
 import json
 import datetime
+import hashlib
 import os
+import tempfile
 
 def load_json(filepath):
     """
@@ -26,22 +28,60 @@ def load_json(filepath):
         print(f"JSON 파일 로드 중 오류 발생 ({filepath}): {e}")
         return None
 
-def save_json(data, filepath):
+def save_json(data, filepath, verbose=True):
     """
     Python 객체를 JSON 파일로 저장합니다.
 
+    같은 폴더의 임시 파일에 먼저 쓴 뒤 os.replace로 교체하므로,
+    저장 도중 프로그램이 종료되어도 기존 파일이 깨지지 않습니다 (원자적 쓰기).
+
     Args:
         data (dict or list): 저장할 Python 객체.
         filepath (str): 저장할 JSON 파일의 경로.
+        verbose (bool): 저장 성공 메시지 출력 여부 (기본값: True).
+
+    Returns:
+        bool: 저장 성공 여부.
     """
+    tmp_filepath = None
     try:
         # 디렉토리가 없으면 생성
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
-        with open(filepath, 'w', encoding='utf-8') as f:
+        directory = os.path.dirname(filepath)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        fd, tmp_filepath = tempfile.mkstemp(dir=directory or '.', prefix='.tmp_', suffix='.json')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
             json.dump(data, f, indent=4, ensure_ascii=False)
-        print(f"데이터가 성공적으로 저장되었습니다: {filepath}")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_filepath, filepath)
+        if verbose:
+            print(f"데이터가 성공적으로 저장되었습니다: {filepath}")
+        return True
     except Exception as e:
         print(f"JSON 파일 저장 중 오류 발생 ({filepath}): {e}")
+        if tmp_filepath and os.path.exists(tmp_filepath):
+            os.remove(tmp_filepath)
+        return False
+
+def get_file_sha256(filepath, chunk_size=1024 * 1024):
+    """
+    파일의 SHA-256 해시를 계산합니다.
+
+    Args:
+        filepath (str): 해시를 계산할 파일의 경로.
+        chunk_size (int): 한 번에 읽을 바이트 수 (기본값: 1MB).
+
+    Returns:
+        str: 16진수 해시 문자열. 파일이 없으면 None 반환.
+    """
+    if not os.path.exists(filepath):
+        return None
+    sha = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
 
 def get_current_timestamp(format="%Y%m%d_%H%M%S"):
     """
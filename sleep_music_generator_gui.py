@@ -6,8 +6,12 @@ import os
 # scripts 폴더가 현재 스크립트(sleep_music_generator_gui.py)와 같은 레벨에 있다고 가정
 script_dir = os.path.dirname(__file__)
 sys.path.append(os.path.join(script_dir, 'scripts'))
+sys.path.append(os.path.join(script_dir, 'modules'))
 
 import utils
+from pipeline import SleepMusicPipeline
+from model_loader import MODEL_SIZES, PRECISIONS
+from log_sink import LogSink
 # 이제 utils.py의 함수들을 utils.함수명() 형태로 사용할 수 있습니다.
 # 예: timestamp = utils.get_current_timestamp()
 #     config_data = utils.load_json('config.json')
@@ -18,20 +22,41 @@ from PyQt5.QtWidgets import (
     QApplication, QWidget, QLabel, QPushButton, QVBoxLayout, QHBoxLayout,
     QComboBox, QTextEdit, QFileDialog, QProgressBar
 )
-from PyQt5.QtCore import Qt
-import torch
-from audiocraft.models import MusicGen
-import torchaudio
-import time
-import subprocess
-import glob
+from PyQt5.QtCore import Qt, QTimer, pyqtSignal
+import threading
+
+# 로그창에 남길 최대 줄 수와 화면 갱신 주기(ms)
+LOG_MAX_LINES = 2000
+LOG_FLUSH_INTERVAL_MS = 200
 
 class SleepMusicGenerator(QWidget):
-    def __init__(self):
+    # 작업 스레드가 끝났음을 UI 스레드에 알리는 시그널
+    model_ready_signal = pyqtSignal()
+    model_failed_signal = pyqtSignal()
+    task_finished_signal = pyqtSignal()
+
+    def __init__(self, preload_model=True):
         super().__init__()
-        self.model = None  # MusicGen 모델은 프로그램 실행 중 1회만 로딩
+        # 로그/진행률은 어느 스레드에서든 LogSink에 쌓고, UI는 타이머로 모아서 반영
+        # (로그 파일 ~/.cache/sleep_music_generator/logs/sleepgen.log에도 기록)
+        self.log_sink = LogSink()
+        # 실제 작업은 Qt와 무관한 파이프라인 엔진이 수행 (sleepgen.py CLI와 공용)
+        # torch/audiocraft는 생성이 처음 필요할 때 임포트되므로 창이 바로 뜹니다.
+        self.pipeline = SleepMusicPipeline(log=self.log, progress=self.set_progress)
+        self.task_thread = None
+        self.task_finished_signal.connect(self._on_task_finished)
+        self.model_ready_signal.connect(self._on_model_ready)
+        self.model_failed_signal.connect(lambda: self.model_status_label.setText('모델: 생성 시 로딩'))
         self.init_ui()
 
+        self.flush_timer = QTimer(self)
+        self.flush_timer.timeout.connect(self.flush_log)
+        self.flush_timer.start(LOG_FLUSH_INTERVAL_MS)
+
+        # 창이 그려진 뒤 백그라운드에서 모델을 미리 로딩
+        if preload_model:
+            QTimer.singleShot(0, self.start_model_preload)
+
         # 기존 init_ui(), select_folder(), log()는 유지
 
     def init_ui(self):
@@ -52,6 +77,30 @@ class SleepMusicGenerator(QWidget):
         self.duration_combo.addItems(['7h', '8h', '9h', '10h'])
         main_layout.addWidget(self.duration_combo)
 
+        # 2-1. 모델 설정 (모델 크기, CPU 추론 정밀도, 세그먼트 길이)
+        model_layout = QHBoxLayout()
+        model_layout.addWidget(QLabel('모델 크기:'))
+        self.model_size_combo = QComboBox()
+        self.model_size_combo.addItems(MODEL_SIZES)
+        self.model_size_combo.setCurrentText('medium')
+        model_layout.addWidget(self.model_size_combo)
+
+        model_layout.addWidget(QLabel('추론 정밀도:'))
+        self.precision_combo = QComboBox()
+        self.precision_combo.addItems(PRECISIONS)
+        model_layout.addWidget(self.precision_combo)
+
+        model_layout.addWidget(QLabel('세그먼트 길이:'))
+        self.segment_combo = QComboBox()
+        self.segment_combo.addItems(['30s', '60s', '120s'])
+        self.segment_combo.setCurrentText('120s')
+        model_layout.addWidget(self.segment_combo)
+
+        # 미리 로딩 상태 (로딩 전에 생성해도 되지만, 첫 세그먼트가 모델을 기다림)
+        self.model_status_label = QLabel('모델: 생성 시 로딩')
+        model_layout.addWidget(self.model_status_label)
+        main_layout.addLayout(model_layout)
+
         # 3. 저장 폴더 선택
         folder_layout = QHBoxLayout()
         self.folder_label = QLabel('저장 폴더 경로:')
@@ -70,10 +119,22 @@ class SleepMusicGenerator(QWidget):
         # 4. 버튼 구역
         button_layout = QHBoxLayout()
 
-        self.generate_button = QPushButton('2분 단위 생성 (WAV)')
+        self.generate_button = QPushButton('세그먼트 단위 생성 (WAV)')
         self.generate_button.clicked.connect(self.generate_music)
         button_layout.addWidget(self.generate_button)
 
+        self.scan_button = QPushButton('중복/결함 검사')
+        self.scan_button.clicked.connect(self.scan_segments)
+        button_layout.addWidget(self.scan_button)
+
+        self.normalize_button = QPushButton('라우드니스 정규화')
+        self.normalize_button.clicked.connect(self.normalize_loudness)
+        button_layout.addWidget(self.normalize_button)
+
+        self.verify_button = QPushButton('구간 적합성 검사')
+        self.verify_button.clicked.connect(self.verify_stages)
+        button_layout.addWidget(self.verify_button)
+
         self.convert_button = QPushButton('WAV → MP3 변환')
         self.convert_button.clicked.connect(self.convert_wav_to_mp3)
         button_layout.addWidget(self.convert_button)
@@ -99,6 +160,7 @@ class SleepMusicGenerator(QWidget):
         # 6. 로그 출력창
         self.log_text = QTextEdit()
         self.log_text.setReadOnly(True)
+        self.log_text.document().setMaximumBlockCount(LOG_MAX_LINES)  # 오래된 줄은 자동 삭제
         self.log_text.setFixedHeight(150)
         main_layout.addWidget(self.log_text)
 
@@ -112,253 +174,130 @@ class SleepMusicGenerator(QWidget):
         if folder:
             self.folder_path.setText(folder)
 
-    def generate_music(self):
-        self.log('2분 단위 WAV 생성 시작합니다...')
-        # 1. 프롬프트 받기
-        prompt_text = self.prompt_text.toPlainText().strip()
-        if not prompt_text:
-            self.log('❗ 프롬프트가 입력되지 않았습니다.')
+    def run_task(self, stage, folder, func, *args):
+        """
+        파이프라인 작업을 백그라운드 스레드에서 실행합니다 (UI는 멈추지 않음).
+        단계별 소요 시간은 저장 폴더의 stage_timings.json에도 기록됩니다.
+        """
+        if self.task_thread is not None and self.task_thread.is_alive():
+            self.log('❗ 이전 작업이 아직 진행 중입니다.')
             return
+        self.set_buttons_enabled(False)
 
-        # 2. 저장 폴더 설정
-        folder = self.folder_path.toPlainText().strip()
-        if not folder:
-            self.log('❗ 저장 폴더를 선택해주세요.')
-            return
-        if not os.path.exists(folder):
-            os.makedirs(folder)
+        def work():
+            try:
+                with self.log_sink.stage(stage, folder=folder) as record:
+                    if not func(*args):
+                        record['status'] = 'failed'
+            except Exception as e:
+                self.log(f'❗ {stage} 작업 중 오류: {e}')
+            finally:
+                if folder and os.path.isdir(folder):
+                    timings = [t for t in self.log_sink.stage_timings() if t.get('folder') == folder]
+                    utils.save_json(timings, os.path.join(folder, 'stage_timings.json'), verbose=False)
+                self.task_finished_signal.emit()
+
+        self.task_thread = threading.Thread(target=work, name=f'task-{stage}', daemon=True)
+        self.task_thread.start()
+
+    def _on_task_finished(self):
+        self.set_buttons_enabled(True)
+
+    def set_buttons_enabled(self, enabled):
+        for button in (self.generate_button, self.scan_button, self.normalize_button, self.verify_button,
+                       self.convert_button,
+                       self.concat_stage_button, self.concat_final_button, self.make_video_button):
+            button.setEnabled(enabled)
 
-        # 3. 수면 시간 읽기
+    def generate_music(self):
+        prompt_text = self.prompt_text.toPlainText().strip()
+        folder = self.folder_path.toPlainText().strip()
         duration_hours = int(self.duration_combo.currentText().replace('h', ''))
-        total_minutes = duration_hours * 60
+        self.apply_model_options()
+        self.run_task('generate', folder, self.pipeline.generate_music, prompt_text, folder, duration_hours)
 
-        # 4. MusicGen medium 모델 로딩
-        if self.model is None:
-            self.log('MusicGen medium 모델 로딩 중...')
-            self.model = MusicGen.get_pretrained('medium')
-            self.model.set_generation_params(duration=120)  # 항상 2분 설정
-            self.log('모델 로딩 완료.')
+    def apply_model_options(self):
+        self.pipeline.configure(model_size=self.model_size_combo.currentText(),
+                                segment_seconds=int(self.segment_combo.currentText().rstrip('s')),
+                                precision=self.precision_combo.currentText())
+        if self.pipeline.model is None and not self.model_status_label.text().endswith('...'):
+            self.model_status_label.setText('모델: 생성 시 로딩')  # 크기/정밀도가 바뀌어 다시 로딩해야 함
 
-        # 5. Sleep 구간 설계
-        segments = []
-
-        # (1) Sleep onset
-        segments.append(('SleepOnset', 1))  # 2분짜리 1개
-
-        # (2) NREM 숙면
-        nrem_total_minutes = 360  # 6시간 기준 (3x 90분)
-        nrem_cycles = nrem_total_minutes // 90  # 90분 x 3회
-        for cycle in range(nrem_cycles):
-            for _ in range(45):  # 90분 / 2분 = 45개
-                segments.append((f'NREM{cycle+1}', 1))
-
-        # (3) REM 구간
-        rem_minutes = total_minutes - (15 + nrem_total_minutes)  # 남은 시간 REM 할당
-        rem_segments = rem_minutes // 2  # 2분 단위 나누기
-        for idx in range(int(rem_segments)):
-            segments.append((f'REM{idx+1}', 1))
-
-        self.log(f'총 {len(segments)}개 WAV 파일을 생성합니다...')
-
-        # 6. 실제 생성
-        counter = 1
-        for section, repeat in segments:
-            for _ in range(repeat):
-                filename = f"{counter:03d}_{section}.wav"
-                filepath = os.path.join(folder, filename)
-
-                self.log(f'[{counter}/{len(segments)}] {filename} 생성 중...')
-                wav = self.model.generate([prompt_text])
-                torchaudio.save(filepath, wav[0].cpu(), 32000)
+    def scan_segments(self):
+        folder = self.folder_path.toPlainText().strip()
+        self.apply_model_options()  # 걸린 세그먼트를 다시 생성할 때 같은 모델 설정을 사용
+        self.run_task('scan', folder, self.pipeline.scan_segments, folder)
 
-                self.progress_bar.setValue(int((counter/len(segments))*100))
-                counter += 1
+    def normalize_loudness(self):
+        folder = self.folder_path.toPlainText().strip()
+        self.run_task('normalize', folder, self.pipeline.normalize_loudness, folder)
 
-        self.log('✅ 2분 단위 WAV 파일 생성 완료!')
-        
+    def verify_stages(self):
+        folder = self.folder_path.toPlainText().strip()
+        self.run_task('verify', folder, self.pipeline.verify_stages, folder)
 
     def convert_wav_to_mp3(self):
-        self.log('WAV → MP3 변환 시작합니다...')
         folder = self.folder_path.toPlainText().strip()
-        if not folder:
-            self.log('❗ 저장 폴더를 먼저 선택해주세요.')
-            return
-
-        wav_files = [f for f in os.listdir(folder) if f.endswith('.wav')]
-        total_files = len(wav_files)
-
-        if total_files == 0:
-            self.log('❗ 변환할 WAV 파일이 없습니다.')
-            return
-
-        for idx, wav_file in enumerate(wav_files, start=1):
-            wav_path = os.path.join(folder, wav_file)
-            mp3_filename = os.path.splitext(wav_file)[0] + ".mp3"
-            mp3_path = os.path.join(folder, mp3_filename)
-
-            command = [
-                'ffmpeg', '-y', '-i', wav_path,
-                '-codec:a', 'libmp3lame', '-qscale:a', '2', mp3_path
-            ]
-
-            try:
-                subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
-                self.log(f"[{idx}/{total_files}] {mp3_filename} 변환 완료.")
-                self.progress_bar.setValue(int((idx/total_files)*100))
-            except subprocess.CalledProcessError:
-                self.log(f"❗ {wav_file} 변환 실패!")
-
-        self.log('✅ 모든 WAV 파일이 MP3로 변환 완료되었습니다.')
-        
+        self.run_task('convert', folder, self.pipeline.convert_wav_to_mp3, folder)
 
     def concat_stage_mp3(self):
-        self.log('구간별 이어붙이기 시작합니다...')
-
         folder = self.folder_path.toPlainText().strip()
-        if not folder:
-            self.log('❗ 저장 폴더를 먼저 선택해주세요.')
-            return
-
-        mp3_files = sorted(glob.glob(os.path.join(folder, '*.mp3')))
-        if not mp3_files:
-            self.log('❗ 이어붙일 MP3 파일이 없습니다.')
-            return
-
-        # 구간별로 묶기
-        stages = {}
-        for mp3_file in mp3_files:
-            filename = os.path.basename(mp3_file)
-            parts = filename.split('_')
-            if len(parts) >= 2:
-                stage = parts[1].split('.')[0]  # SleepOnset, NREM1, REM1 등
-                stages.setdefault(stage, []).append(mp3_file)
-
-        total_stages = len(stages)
-        self.log(f'총 {total_stages}개 구간을 이어붙입니다.')
-
-        for idx, (stage, files) in enumerate(stages.items(), start=1):
-            list_path = os.path.join(folder, f'concat_list_{stage}.txt')
-            output_path = os.path.join(folder, f'{stage}_merged.mp3')
-
-            # 리스트 파일 작성
-            with open(list_path, 'w', encoding='utf-8') as f:
-                for filepath in files:
-                    f.write(f"file '{filepath}'\n")
-
-            # ffmpeg로 이어붙이기
-            command = [
-                'ffmpeg', '-y', '-f', 'concat', '-safe', '0',
-                '-i', list_path, '-c', 'copy', output_path
-            ]
-
-            try:
-                subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
-                self.log(f"[{idx}/{total_stages}] {stage} 구간 이어붙이기 완료: {output_path}")
-            except subprocess.CalledProcessError:
-                self.log(f"❗ {stage} 구간 이어붙이기 실패!")
-
-            self.progress_bar.setValue(int((idx/total_stages)*100))
-
-        self.log('✅ 구간별 MP3 이어붙이기 완료!')
-        
+        self.run_task('concat_stage', folder, self.pipeline.concat_stage_mp3, folder)
 
     def concat_final_mp3(self):
-        self.log('최종 전체 이어붙이기 시작합니다...')
         folder = self.folder_path.toPlainText().strip()
-        if not folder:
-            self.log('❗ 저장 폴더를 먼저 선택해주세요.')
-            return
-
-        # 구간별 이어붙인 파일 검색
-        merged_files = sorted(glob.glob(os.path.join(folder, '*_merged.mp3')))
-
-        if not merged_files:
-            self.log('❗ 이어붙일 *_merged.mp3 파일이 없습니다.')
-            return
-
-        # SleepOnset → NREM1 → NREM2 → NREM3 → REM1 순으로 정렬 필요
-        priority_order = ['SleepOnset', 'NREM1', 'NREM2', 'NREM3', 'REM1', 'REM2', 'REM3', 'REM4', 'REM5']
-
-        # 실제 파일 순서 정렬
-        sorted_files = []
-        for stage in priority_order:
-            for file in merged_files:
-                if stage in file:
-                    sorted_files.append(file)
-
-        if not sorted_files:
-            self.log('❗ 최종 이어붙일 파일을 찾을 수 없습니다.')
-            return
-
-        list_path = os.path.join(folder, 'final_concat_list.txt')
-        final_output = os.path.join(folder, 'final_sleep_music.mp3')
-
-        # 리스트 파일 작성
-        with open(list_path, 'w', encoding='utf-8') as f:
-            for filepath in sorted_files:
-                f.write(f"file '{filepath}'\n")
-
-        # ffmpeg로 최종 이어붙이기
-        command = [
-            'ffmpeg', '-y', '-f', 'concat', '-safe', '0',
-            '-i', list_path, '-c', 'copy', final_output
-        ]
-
-        try:
-            subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
-            self.log(f'✅ 최종 수면 음악 파일 완성: {final_output}')
-            self.progress_bar.setValue(100)
-        except subprocess.CalledProcessError:
-            self.log(f'❗ 최종 이어붙이기 실패!')
-        
+        self.run_task('concat_final', folder, self.pipeline.concat_final_mp3, folder)
 
     def make_mp4_video(self):
-        self.log('MP4 영상 만들기 시작합니다...')
-
         folder = self.folder_path.toPlainText().strip()
-        if not folder:
-            self.log('❗ 저장 폴더를 먼저 선택해주세요.')
-            return
-
-        audio_path = os.path.join(folder, 'final_sleep_music.mp3')
-        if not os.path.exists(audio_path):
-            self.log('❗ final_sleep_music.mp3 파일이 없습니다.')
+        if folder and not os.path.exists(os.path.join(folder, 'final_sleep_music.mp3')):
+            self.pipeline.make_mp4_video(folder, None)  # 오디오 누락 로그만 남김
             return
 
         # 배경 이미지 선택
         options = QFileDialog.Options()
         options |= QFileDialog.ReadOnly
         image_path, _ = QFileDialog.getOpenFileName(self, "배경 이미지 선택", "", "Image Files (*.png *.jpg *.jpeg)", options=options)
+        self.run_task('video', folder, self.pipeline.make_mp4_video, folder, image_path)
 
-        if not image_path:
-            self.log('❗ 배경 이미지가 선택되지 않았습니다.')
-            return
+    def start_model_preload(self):
+        self.apply_model_options()
+        self.model_status_label.setText('모델: 미리 로딩 중...')
+
+        def preload():
+            try:
+                self.pipeline.load_model()
+                self.model_ready_signal.emit()
+            except Exception as e:
+                self.log(f'❗ 모델 미리 로딩 실패 (생성 시 다시 시도합니다): {e}')
+                self.model_failed_signal.emit()
+
+        threading.Thread(target=preload, daemon=True).start()
 
-        output_video = os.path.join(folder, 'final_sleep_music_video.mp4')
-
-        command = [
-            'ffmpeg', '-y',
-            '-loop', '1',
-            '-i', image_path,
-            '-i', audio_path,
-            '-c:v', 'libx264',
-            '-c:a', 'aac',
-            '-b:a', '192k',
-            '-pix_fmt', 'yuv420p',
-            '-shortest',
-            output_video
-        ]
-
-        try:
-            subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
-            self.log(f'✅ MP4 영상 생성 완료: {output_video}')
-            self.progress_bar.setValue(100)
-        except subprocess.CalledProcessError:
-            self.log(f'❗ MP4 영상 생성 실패!')
-        
+    def _on_model_ready(self):
+        self.model_status_label.setText(f'모델: 준비됨 ({self.pipeline.model_size}, {self.pipeline.precision})')
 
     def log(self, message):
-        self.log_text.append(f"[LOG] {message}")
+        self.log_sink.log(message)  # 어느 스레드에서 호출해도 안전, UI 반영은 flush_log에서
+
+    def set_progress(self, value):
+        self.log_sink.progress(value)
+
+    def flush_log(self):
+        # 타이머 주기마다 쌓인 로그를 한 번에 추가 (이벤트마다 위젯을 갱신하지 않음)
+        lines, dropped, progress = self.log_sink.drain()
+        if dropped:
+            where = f" (전체 기록은 {self.log_sink.log_path})" if self.log_sink.log_path else ''
+            lines.insert(0, f"... 로그 {dropped}줄 생략{where}")
+        if lines:
+            self.log_text.append('\n'.join(f"[LOG] {line}" for line in lines))
+        if progress is not None:
+            self.progress_bar.setValue(progress)
+
+    def closeEvent(self, event):
+        self.flush_timer.stop()
+        self.log_sink.close()
+        super().closeEvent(event)
 
 if __name__ == '__main__':
     app = QApplication(sys.argv)
@@ -0,0 +1,100 @@
+# sleepgen.py
+# GUI 없이(헤드리스) 설정 파일로 수면 음악 파이프라인을 실행하는 CLI 진입점입니다.
+#
+# 사용 예:
+#   python sleepgen.py --config sleepgen_config.example.json
+#   python sleepgen.py --config night01.json --stages convert,concat_stage,concat_final
+#   python sleepgen.py --config night01.json --regenerate 017_NREM1.wav   (기록된 시드로 세그먼트만 다시 생성)
+#   python sleepgen.py --config sleepgen_batch.example.json   ('jobs' 목록이 있으면 여러 밤을 배치로 함께 생성)
+#   (설정에 "progressive": true, "stream_port": 8080이면 생성 중에도 http://127.0.0.1:8080/stream.m3u8로 재생,
+#    배치 설정이면 작업 순서대로 8080, 8081, ... 포트에서 각 밤의 스트림을 내보냄)
+
+import sys
+import os
+import argparse
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(script_dir, 'scripts'))
+sys.path.append(os.path.join(script_dir, 'modules'))
+
+import utils
+from pipeline import SleepMusicPipeline, PIPELINE_STAGES
+from batch_runner import job_specs_from, run_batch
+from hls_stream import start_server, wait_until_interrupted
+from segment_cache import SegmentCache
+from stage_planner import stage_options_from
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='수면 음악 생성기 (헤드리스 실행)')
+    parser.add_argument('--config', required=True, help='작업 설정 JSON 파일 경로')
+    parser.add_argument('--stages', default=None,
+                        help=f"쉼표로 구분한 실행 단계 (기본값: 설정 파일 또는 {','.join(PIPELINE_STAGES)})")
+    parser.add_argument('--output-folder', default=None, help='설정 파일의 output_folder 덮어쓰기')
+    parser.add_argument('--regenerate', nargs='+', default=None, metavar='SEGMENT',
+                        help='매니페스트에 기록된 시드로 지정한 세그먼트만 다시 생성 (단계 실행 대신)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    config = utils.load_json(args.config)
+    if config is None:
+        return 2
+    if args.output_folder:
+        config['output_folder'] = args.output_folder
+
+    stages = args.stages.split(',') if args.stages else None
+
+    def log(message):
+        print(f"[{utils.get_current_timestamp('%H:%M:%S')}] {message}", flush=True)
+
+    if config.get('jobs') and not args.regenerate:
+        if stages:
+            config['stages'] = stages
+        servers = []
+        if config.get('progressive') and config.get('stream_port'):
+            for idx, spec in enumerate(job_specs_from(config)):
+                if spec.get('output_folder'):
+                    servers.append(start_server(spec['output_folder'], port=int(config['stream_port']) + idx,
+                                                log=log))
+        results = run_batch(config, log=log)
+        if servers:
+            log('배치가 끝났습니다. 스트림은 Ctrl+C를 누를 때까지 계속 내보냅니다.')
+            wait_until_interrupted(*servers)
+        return 0 if results and all(results.values()) else 1
+
+    segment_cache = None
+    if config.get('segment_cache_dir'):
+        max_bytes = int(float(config.get('segment_cache_max_gb', 20)) * 1024 ** 3)
+        segment_cache = SegmentCache(config['segment_cache_dir'], max_bytes=max_bytes)
+
+    pipeline = SleepMusicPipeline(log=log,
+                                  model_size=config.get('model_size', 'medium'),
+                                  segment_seconds=int(config.get('segment_seconds', 120)),
+                                  precision=config.get('precision', 'fp32'),
+                                  model_cache_dir=config.get('model_cache_dir'),
+                                  segment_cache=segment_cache,
+                                  reuse_stages=config.get('reuse_stages', []),
+                                  synthesis_mode=config.get('synthesis_mode', 'generate'),
+                                  loop_pool_size=int(config.get('loop_pool_size', 4)),
+                                  stage_options=stage_options_from(config),
+                                  pcm_store=bool(config.get('pcm_store', False)),
+                                  progressive=bool(config.get('progressive', False)))
+    if args.regenerate:
+        ok = all([pipeline.regenerate_segment(config.get('output_folder', ''), name) for name in args.regenerate])
+        return 0 if ok else 1
+
+    server = None
+    if config.get('progressive') and config.get('stream_port') and config.get('output_folder'):
+        server = start_server(config['output_folder'], port=int(config['stream_port']), log=log)
+    ok = pipeline.run(config, stages=stages)
+    if server is not None:
+        log('파이프라인이 끝났습니다. 스트림은 Ctrl+C를 누를 때까지 계속 내보냅니다.')
+        wait_until_interrupted(server)
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())